@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yarn_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -67,14 +68,6 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'knitmatch_project.wsgi.application'
 
-# База данных
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
-
 # Валидаторы паролей
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -143,6 +136,158 @@ if env_file.exists():
                     value = value.strip().strip('"').strip("'")
                     os.environ[key] = value
 
+# База данных
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Тестовая БД в файле: в памяти SQLite не дает писать из нескольких
+        # потоков, а тесты конкурентной записи их используют
+        'TEST': {'NAME': os.environ.get('SQLITE_TEST_PATH', BASE_DIR / 'test_db.sqlite3')},
+    }
+}
+
+# SQLite для продакшена: WAL (чтение не ждет запись), прагмы, постоянные
+# соединения и BEGIN IMMEDIATE. По умолчанию выключено: WAL - свойство
+# файла БД, и любая команда manage.py переключила бы в него db.sqlite3
+# разработчика (с файлами -wal/-shm рядом). На сервере включается в
+# окружении или .env: SQLITE_TUNED=True (и SQLITE_PATH вне репозитория)
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', 'False') == 'True'
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # мс ожидания блокировки записи
+SQLITE_MMAP_MB = int(os.environ.get('SQLITE_MMAP_MB', 256))
+SQLITE_CACHE_MB = int(os.environ.get('SQLITE_CACHE_MB', 64))  # кэш страниц на соединение
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 600))  # секунд жизни соединения (None - бессрочно)
+
+if SQLITE_TUNED:
+    DATABASES['default'].update({
+        'ENGINE': 'yarn_app.sqlite_backend',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT / 1000,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                # В WAL при NORMAL коммит не ждет fsync; БД остается целой при сбое питания
+                'synchronous': 'NORMAL',
+                'busy_timeout': SQLITE_BUSY_TIMEOUT,
+                'mmap_size': SQLITE_MMAP_MB * 2 ** 20,
+                'cache_size': -SQLITE_CACHE_MB * 1024,  # отрицательное - в КБ
+                'temp_store': 'MEMORY',
+            },
+        },
+    })
+
 # Настройки Ravelry API
 RAVELRY_USERNAME = os.environ.get('RAVELRY_USERNAME', '')
-RAVELRY_PERSONAL_ACCESS_TOKEN = os.environ.get('RAVELRY_PERSONAL_ACCESS_TOKEN', '')
\ No newline at end of file
+RAVELRY_PERSONAL_ACCESS_TOKEN = os.environ.get('RAVELRY_PERSONAL_ACCESS_TOKEN', '')
+# Клиент Ravelry: real - API, stub - заглушка, fake - ответы без сети,
+# auto - real при заданных учетных данных, иначе stub
+RAVELRY_BACKEND = os.environ.get('RAVELRY_BACKEND', 'auto')
+# Для бэкенда fake: адрес локального сервера тестовых фото (manage.py photo_fixture_server)
+RAVELRY_FAKE_PHOTO_BASE = os.environ.get('RAVELRY_FAKE_PHOTO_BASE', '')
+
+# Пул HTTP соединений к Ravelry API
+RAVELRY_POOL_SIZE = int(os.environ.get('RAVELRY_POOL_SIZE', 10))
+RAVELRY_MAX_RETRIES = int(os.environ.get('RAVELRY_MAX_RETRIES', 3))
+
+# Лимит запросов к Ravelry API (token bucket) - на каждый процесс: при N
+# веб-процессах и воркерах к Ravelry уходит до N * RAVELRY_RATE_LIMIT запросов/с
+RAVELRY_RATE_LIMIT = float(os.environ.get('RAVELRY_RATE_LIMIT', 5))
+RAVELRY_RATE_BURST = int(os.environ.get('RAVELRY_RATE_BURST', 10))
+
+# Постоянный кэш ответов Ravelry API (отдельная SQLite база)
+RAVELRY_CACHE_ENABLED = os.environ.get('RAVELRY_CACHE_ENABLED', 'True') == 'True'
+RAVELRY_CACHE_PATH = os.environ.get('RAVELRY_CACHE_PATH', str(BASE_DIR / '.ravelry_cache.sqlite3'))
+RAVELRY_CACHE_MAX_MB = int(os.environ.get('RAVELRY_CACHE_MAX_MB', 200))
+# Сколько секунд ответ свежий (0 - не кэшировать): страницы поиска, детали схемы, прочее
+RAVELRY_CACHE_TTL_SEARCH = int(os.environ.get('RAVELRY_CACHE_TTL_SEARCH', 3600))
+RAVELRY_CACHE_TTL_PATTERN = int(os.environ.get('RAVELRY_CACHE_TTL_PATTERN', 86400))
+RAVELRY_CACHE_TTL_DEFAULT = int(os.environ.get('RAVELRY_CACHE_TTL_DEFAULT', 0))
+# Сколько секунд после TTL устаревший ответ еще отдается, пока обновляется в фоне
+RAVELRY_CACHE_STALE = int(os.environ.get('RAVELRY_CACHE_STALE', 86400))
+
+# Бэкенд поиска схем (пусто - FTS5 для SQLite, icontains для остальных БД)
+PATTERN_SEARCH_BACKEND = os.environ.get('PATTERN_SEARCH_BACKEND', '')
+
+# Сколько готовых JSON-фрагментов схем держать в памяти процесса
+PATTERN_FRAGMENT_CACHE_SIZE = int(os.environ.get('PATTERN_FRAGMENT_CACHE_SIZE', 20000))
+
+# Сколько секунд браузер не перепроверяет страницы каталога (0 - перепроверять каждый раз по ETag)
+CATALOG_HTTP_MAX_AGE = int(os.environ.get('CATALOG_HTTP_MAX_AGE', 0))
+
+# Миниатюры фото схем: скачиваются при импорте, хранятся по хэшу содержимого
+# в THUMBNAIL_ROOT/<2 символа хэша>/<хэш>-<размер>.webp. Django отдает их
+# только при DEBUG; в продакшене THUMBNAIL_URL раздает веб-сервер: на
+# PythonAnywhere - запись Static files (URL /thumbs/ -> THUMBNAIL_ROOT),
+# в nginx - location /thumbs/ { alias <THUMBNAIL_ROOT>/; expires max; }
+# (WhiteNoise не подходит: он видит только файлы, существовавшие при старте)
+THUMBNAILS_ENABLED = os.environ.get('THUMBNAILS_ENABLED', 'True') == 'True'
+THUMBNAIL_ROOT = os.environ.get('THUMBNAIL_ROOT', str(BASE_DIR / 'media' / 'thumbs'))
+THUMBNAIL_URL = os.environ.get('THUMBNAIL_URL', '/thumbs/')
+# Размеры (по большей стороне, px): карточка в списках и страница схемы
+THUMBNAIL_SIZES = {
+    'card': int(os.environ.get('THUMBNAIL_CARD_SIZE', 400)),
+    'detail': int(os.environ.get('THUMBNAIL_DETAIL_SIZE', 1024)),
+}
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 80))  # качество WebP
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 8))  # параллельных загрузок
+THUMBNAIL_MAX_BYTES = int(os.environ.get('THUMBNAIL_MAX_BYTES', 15 * 2 ** 20))  # больше - не скачивать
+THUMBNAIL_RETRY_AFTER = int(os.environ.get('THUMBNAIL_RETRY_AFTER', 6 * 3600))  # повтор неудачной загрузки, с
+# Имя файла - хэш содержимого, поэтому миниатюру можно кэшировать "навсегда"
+THUMBNAIL_HTTP_MAX_AGE = int(os.environ.get('THUMBNAIL_HTTP_MAX_AGE', 365 * 24 * 3600))
+
+# Фоновые задачи (manage.py run_refresh_worker): воркер подает сигнал раз в
+# JOB_HEARTBEAT_INTERVAL с; задача без сигнала дольше JOB_STALE_AFTER с
+# возвращается в очередь, после JOB_MAX_ATTEMPTS запусков - ошибка
+JOB_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_HEARTBEAT_INTERVAL', 15))
+JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 120))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+
+# Метрики запросов по view: время ответа, SQL, вызовы Ravelry (отчет - /metrics/ и manage.py metrics_report)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 500))  # последних запросов на view для перцентилей
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 30))  # секунд между сбросами в общий кэш
+
+# Логирование: записи уходят в очередь, в stdout их пишет отдельный поток
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # text или json
+LOG_SAMPLE_RATE = int(os.environ.get('LOG_SAMPLE_RATE', 5))  # частых сообщений в секунду на ключ
+# Уровни отдельных логгеров: "yarn_app.ravelry_api=DEBUG,yarn_app.jobs=WARNING"
+LOG_LEVELS = dict(
+    item.strip().split('=', 1) for item in os.environ.get('LOG_LEVELS', '').split(',') if '=' in item
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'yarn_app.log.SamplingFilter',
+            'rate': LOG_SAMPLE_RATE,
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'yarn_app.log.NonBlockingQueueHandler',
+            'json': LOG_FORMAT == 'json',
+            'filters': ['sampling'],
+        },
+    },
+    'loggers': {
+        'yarn_app': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        **{name: {'level': level.upper()} for name, level in LOG_LEVELS.items()},
+    },
+}
+
+# Кэш: общий для всех воркеров gunicorn (избранное, счетчики, ответы Ravelry)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.django_cache')),
+    }
+}
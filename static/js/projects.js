@@ -158,13 +158,35 @@ function loadPatternsFromAPI() {
     })
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
-            showNotification(data.message, 'success');
+        if (data.success && data.status_url) {
+            showNotification(data.message, 'info');
+            pollRefreshStatus(data.status_url);
+        } else {
+            showNotification(data.error || 'Ошибка загрузки', 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Ошибка:', error);
+        showNotification('Ошибка загрузки схем', 'danger');
+    });
+}
+
+// Опрос статуса фоновой задачи обновления схем
+function pollRefreshStatus(statusUrl) {
+    fetch(statusUrl, {
+        headers: {'X-Requested-With': 'XMLHttpRequest'}
+    })
+    .then(response => response.json())
+    .then(job => {
+        if (job.status === 'done') {
+            showNotification(job.message, 'success');
             setTimeout(() => {
                 window.location.reload();
             }, 1500);
+        } else if (job.status === 'failed') {
+            showNotification(job.message || 'Ошибка загрузки', 'danger');
         } else {
-            showNotification(data.error || 'Ошибка загрузки', 'danger');
+            setTimeout(() => pollRefreshStatus(statusUrl), 2000);
         }
     })
     .catch(error => {
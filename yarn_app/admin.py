@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import UserYarn, Pattern, Project, ProjectYarn, Favorite
+from .models import UserYarn, Pattern, Project, ProjectYarn, Favorite, RefreshJob, UserStashSummary, UserRecommendations
 
 
 @admin.register(UserYarn)
@@ -8,6 +8,7 @@ class UserYarnAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'user', 'get_yarn_type_display', 
                     'color_display', 'amount', 'weight', 'created_at_short')
     list_filter = ('yarn_type', 'created_at', 'user')
+    list_select_related = ('user',)
     search_fields = ('name', 'color', 'manufacturer', 'user__username')
     list_per_page = 25
     ordering = ('-created_at',)
@@ -44,6 +45,7 @@ class ProjectAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'user', 'get_status_display', 
                     'progress_display', 'start_date', 'created_at_short')
     list_filter = ('status', 'start_date', 'user')
+    list_select_related = ('user',)
     search_fields = ('name', 'description', 'user__username')
     list_per_page = 25
     
@@ -67,6 +69,7 @@ class ProjectAdmin(admin.ModelAdmin):
 class ProjectYarnAdmin(admin.ModelAdmin):
     list_display = ('id', 'project', 'user_yarn', 'amount_used', 'notes_preview')
     list_filter = ('project__status', 'project__user')
+    list_select_related = ('project', 'user_yarn')
     search_fields = ('project__name', 'user_yarn__name', 'notes')
     list_per_page = 25
     
@@ -81,9 +84,37 @@ class ProjectYarnAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'pattern', 'added_at_short')
     list_filter = ('added_at', 'user')
+    list_select_related = ('user', 'pattern')
     search_fields = ('user__username', 'pattern__name')
     list_per_page = 30
     
     def added_at_short(self, obj):
         return obj.added_at.strftime('%d.%m.%Y %H:%M')
-    added_at_short.short_description = 'Добавлено'
\ No newline at end of file
+    added_at_short.short_description = 'Добавлено'
+
+
+@admin.register(RefreshJob)
+class RefreshJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'count', 'message',
+                    'requested_by', 'attempts', 'created_at', 'heartbeat_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    list_select_related = ('requested_by',)
+    list_per_page = 30
+    ordering = ('-created_at',)
+
+
+@admin.register(UserStashSummary)
+class UserStashSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total_yarns', 'total_motki', 'total_weight',
+                    'colors_count', 'types_count', 'updated_at')
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(UserRecommendations)
+class UserRecommendationsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'stash_version', 'computed_at')
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    readonly_fields = ('computed_at',)
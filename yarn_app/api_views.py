@@ -3,100 +3,97 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
 import json
-from .models import Pattern, Favorite
-from .ravelry_api import RavelryAPI, get_yarn_type_mapping
+from .models import Pattern
+from .jobs import enqueue_refresh
+from .ravelry_api import get_weight_codes
+from .search import search_patterns
+from . import favorites as favorites_cache
+from .pagination import CATALOG_ORDERING, InvalidCursor, offset_page, approximate_count, page_size
+from .snapshot import request_catalog_snapshot
+from .serializers import patterns_json_response
+from .http_cache import catalog_conditional, favorites_conditional
 
 @require_GET
+@catalog_conditional
 def api_patterns(request):
     """API endpoint для получения схем с пагинацией и фильтрацией"""
     try:
         # Параметры запроса
-        page = int(request.GET.get('page', 1))
-        per_page = int(request.GET.get('per_page', 12))
+        cursor = request.GET.get('cursor', '')
+        per_page = page_size(request.GET.get('per_page'), 12)
+        with_total = request.GET.get('with_total', 'false') == 'true'
         difficulty = request.GET.get('difficulty', '')
         yarn_weight = request.GET.get('yarn_weight', '')
         category = request.GET.get('category', '')
         free_only = request.GET.get('free_only', 'false') == 'true'
         search_query = request.GET.get('search', '')
         
-        # Сначала проверяем, есть ли схемы в базе
-        if not Pattern.objects.exists():
-            # Загружаем схемы из Ravelry API если база пуста
-            RavelryAPI.fetch_popular_patterns(count=20)
+        snapshot = request_catalog_snapshot(request)
         
-        # Базовый QuerySet
-        patterns_qs = Pattern.objects.all()
+        # Каталог пуст: загрузка из Ravelry - фоновой задачей, а не в запросе
+        if not len(snapshot):
+            enqueue_refresh('ravelry', 20)
         
-        # Применяем фильтры
-        if difficulty:
-            patterns_qs = patterns_qs.filter(difficulty=difficulty)
-        
-        if yarn_weight:
-            # Преобразуем наш тип пряжи в Ravelry weights
-            type_mapping = get_yarn_type_mapping()
-            ravelry_weights = type_mapping.get(yarn_weight, [])
-            
-            # Создаем Q объект для поиска по всем возможным весам
-            yarn_q = Q()
-            for weight in ravelry_weights:
-                yarn_q |= Q(yarn_weight__icontains=weight)
-            patterns_qs = patterns_qs.filter(yarn_q)
-        
-        if category:
-            patterns_qs = patterns_qs.filter(category=category)
-        
-        if free_only:
-            patterns_qs = patterns_qs.filter(is_free=True)
+        # Неизвестный тип и "другая" не соответствуют ни одной толщине:
+        # как и раньше, фильтр по толщине тогда не применяется
+        weight_codes = get_weight_codes(yarn_weight) or None
         
+        # Страница по курсору: каталог - по ключу из снимка, поиск - по
+        # смещению в ранжированной выдаче (см. pagination.offset_page)
         if search_query:
-            patterns_qs = patterns_qs.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(author__icontains=search_query)
-            )
-        
-        # Сортируем по рейтингу или дате создания
-        patterns_qs = patterns_qs.order_by('-rating', '-created_at')
-        
-        # Пагинация
-        paginator = Paginator(patterns_qs, per_page)
-        page_obj = paginator.get_page(page)
-        
-        # Подготавливаем данные для ответа
-        patterns_data = []
-        for pattern in page_obj:
-            patterns_data.append({
-                'id': str(pattern.id),
-                'name': pattern.name,
-                'author': pattern.author or 'Не указан',
-                'description': pattern.description or '',
-                'difficulty': pattern.difficulty,
-                'difficulty_display': pattern.get_difficulty_display(),
-                'yarn_weight': pattern.yarn_weight or 'Не указано',
-                'category': pattern.category or 'Не указано',
-                'craft': 'Спицы' if pattern.craft == 'knitting' else 'Крючок',
-                'is_free': pattern.is_free,
-                'rating': float(pattern.rating) if pattern.rating else 0,
-                'rating_count': pattern.rating_count or 0,
-                'photo_url': pattern.photo_url or '/static/images/pattern-placeholder.jpg',
-                'pattern_url': pattern.pattern_url or '#',
-                'created_at': pattern.created_at.strftime('%d.%m.%Y') if pattern.created_at else ''
-            })
+            # Полнотекстовый поиск - в БД
+            patterns_qs = Pattern.objects.all()
+            
+            # Применяем фильтры
+            if difficulty:
+                patterns_qs = patterns_qs.filter(difficulty=difficulty)
+            
+            if weight_codes is not None:
+                # Наш тип пряжи -> индексированный код толщины схемы
+                patterns_qs = patterns_qs.filter(weight_code__in=weight_codes)
+            
+            if category:
+                patterns_qs = patterns_qs.filter(category=category)
+            
+            if free_only:
+                patterns_qs = patterns_qs.filter(is_free=True)
+            
+            # Выдача по релевантности: курсор хранит позицию в выдаче
+            patterns_qs = search_patterns(patterns_qs.order_by(*CATALOG_ORDERING), search_query, ranked=True)
+            page_patterns, next_cursor = offset_page(patterns_qs, cursor, per_page)
+        else:
+            # Каталог целиком - из снимка в памяти, без запросов к БД
+            catalog_filters = {
+                'difficulty': difficulty,
+                'weight_codes': weight_codes,
+                'category': category,
+                'free_only': free_only,
+            }
+            page_patterns, next_cursor = snapshot.page(CATALOG_ORDERING, cursor, per_page, **catalog_filters)
         
         response_data = {
-            'patterns': patterns_data,
-            'page': page,
-            'total_pages': paginator.num_pages,
-            'total_patterns': paginator.count,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
         }
         
-        return JsonResponse(response_data)
+        # Общее количество - по запросу и приблизительно (из кэша)
+        if with_total:
+            if search_query:
+                response_data['total_patterns'] = approximate_count(patterns_qs, [
+                    difficulty, yarn_weight, category, free_only, search_query
+                ])
+            else:
+                response_data['total_patterns'] = snapshot.count(**catalog_filters)
+        
+        # Карточки схем - из готовых JSON-фрагментов
+        return patterns_json_response(response_data, page_patterns, version=snapshot.version)
         
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({
+            'error': str(e),
+            'patterns': []
+        }, status=400)
     except Exception as e:
         return JsonResponse({
             'error': str(e),
@@ -118,32 +115,24 @@ def api_favorites(request):
         
         pattern = Pattern.objects.get(id=pattern_id)
         
+        # Запись в БД и сразу в кэш: список избранного не перечитываем
         if action == 'add':
-            favorite, created = Favorite.objects.get_or_create(
-                user=request.user,
-                pattern=pattern
-            )
+            favorites, created = favorites_cache.add_favorite(request.user, pattern)
             message = 'Схема добавлена в избранное'
             
         elif action == 'remove':
-            Favorite.objects.filter(user=request.user, pattern=pattern).delete()
+            favorites = favorites_cache.remove_favorite(request.user, pattern)
             message = 'Схема удалена из избранного'
             created = False
             
         else:  # toggle
-            favorite, created = Favorite.objects.get_or_create(
-                user=request.user,
-                pattern=pattern
-            )
-            if not created:
-                favorite.delete()
-                message = 'Схема удалена из избранного'
-                created = False
-            else:
+            favorites, created = favorites_cache.toggle_favorite(request.user, pattern)
+            if created:
                 message = 'Схема добавлена в избранное'
+            else:
+                message = 'Схема удалена из избранного'
         
-        # Получаем обновленный список избранного
-        favorites = list(Favorite.objects.filter(user=request.user).values_list('pattern_id', flat=True))
+        favorites = sorted(favorites)
         
         return JsonResponse({
             'success': True,
@@ -160,11 +149,11 @@ def api_favorites(request):
 
 @login_required
 @require_GET
+@favorites_conditional
 def api_user_favorites(request):
     """API endpoint для получения избранного пользователя"""
     try:
-        favorites = Favorite.objects.filter(user=request.user)
-        favorites_data = list(favorites.values_list('pattern_id', flat=True))
+        favorites_data = sorted(favorites_cache.get_favorite_ids(request.user))
         
         return JsonResponse({
             'success': True,
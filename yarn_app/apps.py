@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class YarnAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'yarn_app'
-    verbose_name = 'Приложение для управления пряжей'
\ No newline at end of file
+    verbose_name = 'Приложение для управления пряжей'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import ensure_fts_index
+        post_migrate.connect(ensure_fts_index, sender=self)
@@ -0,0 +1,79 @@
+# catalog.py
+import threading
+from django.db import transaction
+from .models import YARN_WEIGHT_CODES, VersionCounter
+
+VERSION_KEY = 'catalog:version'
+
+_pending = threading.local()
+
+
+def _weight_key(code):
+    return f'catalog:version:{code}'
+
+
+def get_catalog_version():
+    """
+    Текущая версия каталога схем.
+
+    Версия хранится в БД (VersionCounter), поэтому все процессы видят ее
+    смену и перестраивают производные от каталога структуры.
+    """
+    return VersionCounter.get_many([VERSION_KEY]).get(VERSION_KEY, 1)
+
+
+def get_catalog_modified():
+    """Время последнего изменения каталога (None, если неизвестно)"""
+    return VersionCounter.objects.filter(key=VERSION_KEY).values_list('updated_at', flat=True).first()
+
+
+def get_weight_versions(weight_codes):
+    """Версии каталога по кодам толщины: {код: версия} (0 - изменений не было)"""
+    keys = {_weight_key(code): code for code in weight_codes}
+    found = VersionCounter.get_many(keys)
+    return {code: found.get(key, 0) for key, code in keys.items()}
+
+
+def bump_catalog_version(weight_codes=None):
+    """
+    Отмечает изменение каталога (импорт, обновление, удаление схем).
+
+    weight_codes - толщины затронутых схем; None - изменились все.
+    """
+    if weight_codes is None:
+        weight_codes = YARN_WEIGHT_CODES
+    with transaction.atomic():
+        for code in set(weight_codes):
+            if code in YARN_WEIGHT_CODES:
+                VersionCounter.bump(_weight_key(code))
+        return VersionCounter.bump(VERSION_KEY, initial=1)
+
+
+class _PendingBump:
+    """Отложенная до коммита смена версии каталога с накопленными толщинами"""
+
+    def __init__(self):
+        self.codes = set()
+
+    def __call__(self):
+        if getattr(_pending, 'bump', None) is self:
+            _pending.bump = None
+        bump_catalog_version(self.codes)
+
+
+def schedule_catalog_bump(weight_codes):
+    """
+    Меняет версию каталога после коммита транзакции - один раз на
+    транзакцию, сколько бы схем в ней ни изменилось (удаление QuerySet
+    шлет сигнал по каждой схеме).
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        bump_catalog_version(weight_codes)
+        return
+    bump = getattr(_pending, 'bump', None)
+    # При откате транзакции Django отбрасывает ее on_commit - нужна новая
+    if bump is None or not any(func is bump for _, func, _ in connection.run_on_commit):
+        bump = _pending.bump = _PendingBump()
+        transaction.on_commit(bump, robust=True)
+    bump.codes.update(weight_codes)
@@ -0,0 +1,148 @@
+# favorites.py
+import hashlib
+import random
+from array import array
+from django.core.cache import cache
+from django.db import transaction
+from .models import Favorite, VersionCounter
+
+CACHE_TIMEOUT = 60 * 60 * 24
+STATS_KEYS = ('hits', 'misses')
+# Счетчик попаданий пишется в кэш для одного обращения из STATS_SAMPLE
+STATS_SAMPLE = 50
+
+
+def _cache_key(user_id, version):
+    # Множество кэшируется под версией избранного: изменение Favorite
+    # меняет версию (signals.favorite_changed), старый ключ больше не читается
+    return f'favorites:{user_id}:{version}'
+
+
+def _count(name):
+    """
+    Счетчики попаданий/промахов (общие для процессов при общем кэше).
+    Выборочно: запись в кэш на каждом чтении избранного была бы дороже
+    самого чтения, поэтому считается каждое STATS_SAMPLE-е обращение.
+    """
+    if random.randrange(STATS_SAMPLE):
+        return
+    key = f'favorites_cache:{name}'
+    if not cache.add(key, STATS_SAMPLE, timeout=None):
+        try:
+            cache.incr(key, STATS_SAMPLE)
+        except ValueError:
+            cache.set(key, STATS_SAMPLE, timeout=None)
+
+
+def _pack(ids):
+    # Компактное хранение: отсортированные id как массив int64
+    return array('q', sorted(ids)).tobytes()
+
+
+def _unpack(raw):
+    ids = array('q')
+    ids.frombytes(raw)
+    return set(ids)
+
+
+def get_favorite_ids(user):
+    """Множество id избранных схем пользователя (из кэша, при промахе - из БД)"""
+    if not user.is_authenticated:
+        return set()
+
+    raw = cache.get(_cache_key(user.id, get_favorites_version(user.id)))
+    if raw is not None:
+        _count('hits')
+        return _unpack(raw)
+
+    _count('misses')
+    # Версия и множество - из одного снимка БД, иначе параллельное изменение
+    # попало бы в кэш под предыдущей версией
+    with transaction.atomic():
+        version = get_favorites_version(user.id)
+        ids = set(Favorite.objects.filter(user_id=user.id).values_list('pattern_id', flat=True))
+    cache.set(_cache_key(user.id, version), _pack(ids), CACHE_TIMEOUT)
+    return ids
+
+
+def favorites_digest(user):
+    """Отпечаток множества избранного (меняется при любом изменении)"""
+    return hashlib.md5(_pack(get_favorite_ids(user))).hexdigest()
+
+
+def _write_through(user_id, version, pattern_id, is_favorite):
+    """
+    Кэширует множество для новой версии, изменяя множество предыдущей: без
+    перечитывания Favorite. Версия меняется в той же транзакции, что и
+    Favorite, поэтому версии идут в порядке коммитов, и множество версии
+    N - 1 отличается от N ровно этим изменением. Если его нет в кэше
+    (вытеснено или еще не записано параллельным запросом), следующее
+    чтение возьмет множество из БД.
+    """
+    raw = cache.get(_cache_key(user_id, version - 1))
+    if raw is None:
+        return None
+    ids = _unpack(raw)
+    if is_favorite:
+        ids.add(pattern_id)
+    else:
+        ids.discard(pattern_id)
+    cache.set(_cache_key(user_id, version), _pack(ids), CACHE_TIMEOUT)
+    return ids
+
+
+def add_favorite(user, pattern):
+    """Добавляет схему в избранное. Возвращает (ids, created)"""
+    with transaction.atomic():
+        _, created = Favorite.objects.get_or_create(user=user, pattern=pattern)
+        version = get_favorites_version(user.id)
+    ids = _write_through(user.id, version, pattern.id, True) if created else None
+    return (get_favorite_ids(user) if ids is None else ids), created
+
+
+def remove_favorite(user, pattern):
+    """Удаляет схему из избранного. Возвращает ids"""
+    with transaction.atomic():
+        deleted, _ = Favorite.objects.filter(user=user, pattern=pattern).delete()
+        version = get_favorites_version(user.id)
+    ids = _write_through(user.id, version, pattern.id, False) if deleted else None
+    return get_favorite_ids(user) if ids is None else ids
+
+
+def toggle_favorite(user, pattern):
+    """Переключает избранное. Возвращает (ids, is_favorite)"""
+    ids, created = add_favorite(user, pattern)
+    if created:
+        return ids, True
+    return remove_favorite(user, pattern), False
+
+
+def _version_key(user_id):
+    return f'favorites_version:{user_id}'
+
+
+def get_favorites_version(user_id):
+    """Версия избранного пользователя (меняется при каждом изменении)"""
+    return VersionCounter.get_many([_version_key(user_id)]).get(_version_key(user_id), 0)
+
+
+def bump_favorites_version(user_id):
+    """
+    Новая версия избранного. Вызывается в транзакции изменения Favorite
+    (signals.favorite_changed) - в том числе каскадного удаления и
+    удаления из админки: закэшированное множество прежней версии больше
+    не читается.
+    """
+    return VersionCounter.bump(_version_key(user_id))
+
+
+def cache_stats():
+    """Попадания и промахи кэша избранного (оценка по выборке STATS_SAMPLE)"""
+    stats = {name: cache.get(f'favorites_cache:{name}', 0) for name in STATS_KEYS}
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 3) if total else 0
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([f'favorites_cache:{name}' for name in STATS_KEYS])
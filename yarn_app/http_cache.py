@@ -0,0 +1,65 @@
+# http_cache.py
+from functools import wraps
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from .favorites import get_favorites_version
+from .snapshot import request_catalog_snapshot
+
+# Условные GET (ETag / Last-Modified): версии берутся из счетчиков
+# VersionCounter и снимка каталога, поэтому ответ 304 отдается после
+# одного короткого запроса версии, до запросов самого view. Снимок
+# запоминается на request: view отдает ответ из того же снимка
+
+
+def catalog_etag(request, *args, **kwargs):
+    # Версия снимка, из которого будет собран ответ
+    return f'catalog-{request_catalog_snapshot(request).version}'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return request_catalog_snapshot(request).modified
+
+
+def favorites_etag(request, *args, **kwargs):
+    if not request.user.is_authenticated:
+        return None
+    return f'favorites-{request.user.id}-{get_favorites_version(request.user.id)}'
+
+
+def catalog_conditional(view):
+    """
+    ETag/Last-Modified по версии каталога и Cache-Control для страниц
+    каталога: ответ кэшируется и перепроверяется запросом с
+    If-None-Match (settings.CATALOG_HTTP_MAX_AGE - сколько секунд не
+    перепроверять).
+    """
+    conditional_view = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            # Анонимные страницы можно кэшировать и в общих прокси; с сессией -
+            # только в браузере (проверяем cookie, чтобы не загружать сессию)
+            visibility = 'private' if settings.SESSION_COOKIE_NAME in request.COOKIES else 'public'
+            patch_cache_control(
+                response, must_revalidate=True,
+                max_age=getattr(settings, 'CATALOG_HTTP_MAX_AGE', 0),
+                **{visibility: True},
+            )
+        return response
+    return wrapper
+
+
+def favorites_conditional(view):
+    """ETag по версии избранного; ответ личный и всегда перепроверяется"""
+    conditional_view = condition(etag_func=favorites_etag)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
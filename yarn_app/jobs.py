@@ -0,0 +1,294 @@
+# jobs.py
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .catalog import bump_catalog_version
+from .log import fields
+from .models import Pattern, RefreshJob, UserRecommendations
+from .ravelry_api import AsyncRavelryAPI, RavelryRateLimited
+from .pattern_import import get_random_patterns, save_real_patterns, create_test_patterns, upsert_patterns
+from .recommendations import refresh_stale
+
+logger = logging.getLogger(__name__)
+
+
+def requeue_stale_jobs():
+    """
+    Возвращает в очередь задачи, воркер которых перестал подавать сигнал
+    дольше JOB_STALE_AFTER секунд (убит при деплое, OOM). Задачи, которые
+    уже запускались JOB_MAX_ATTEMPTS раз, помечаются ошибкой.
+
+    Returns:
+        число возвращенных в очередь задач
+    """
+    now = timezone.now()
+    stale = RefreshJob.objects.filter(
+        status='running', heartbeat_at__lt=now - timedelta(seconds=settings.JOB_STALE_AFTER)
+    )
+    failed = stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status='failed', finished_at=now, message='Воркер остановился во время выполнения задачи'
+    )
+    requeued = stale.update(
+        status='queued', run_after=now, message='Воркер остановился, задача возвращена в очередь'
+    )
+    if failed or requeued:
+        logger.warning("Задачи зависших воркеров", extra=fields(requeued=requeued, failed=failed))
+    return requeued
+
+
+def enqueue_refresh(kind, count, user=None):
+    """
+    Ставит задачу обновления схем в очередь.
+
+    Если задача того же типа уже ждет или выполняется, новая не создается.
+    Задача умершего воркера сначала возвращается в очередь (requeue_stale_jobs).
+
+    Returns:
+        (job, created)
+    """
+    requeue_stale_jobs()
+    active = RefreshJob.objects.filter(kind=kind, status__in=RefreshJob.ACTIVE_STATUSES)
+    job = active.first()
+    if job:
+        if job.status == 'running' and kind in RERUN_JOBS:
+            # Изменение могло прийти после последнего прохода задачи:
+            # run_job поставит задачу еще раз после завершения
+            if not RefreshJob.objects.filter(id=job.id, status='running').update(rerun=True):
+                # Задача успела завершиться - нужна новая
+                return enqueue_refresh(kind, count, user)
+        return job, False
+
+    try:
+        with transaction.atomic():
+            return RefreshJob.objects.create(kind=kind, count=count, requested_by=user), True
+    except IntegrityError:
+        # Параллельный запрос успел создать задачу раньше
+        return active.get(), False
+
+
+def claim_next_job():
+    """Забирает из очереди следующую готовую к запуску задачу"""
+    requeue_stale_jobs()
+    now = timezone.now()
+    candidates = RefreshJob.objects.filter(
+        status='queued', run_after__lte=now
+    ).order_by('run_after', 'created_at').values_list('id', flat=True)[:10]
+
+    for job_id in candidates:
+        claimed = RefreshJob.objects.filter(id=job_id, status='queued').update(
+            status='running', started_at=now, heartbeat_at=now, progress=0, attempts=F('attempts') + 1,
+            rerun=False,
+        )
+        if claimed:
+            return RefreshJob.objects.get(id=job_id)
+    return None
+
+
+class Heartbeat:
+    """
+    Фоновый поток, который раз в JOB_HEARTBEAT_INTERVAL секунд обновляет
+    heartbeat_at выполняющейся задачи, пока обработчик работает
+    (загрузка из Ravelry и миниатюры могут идти минутами без прогресса).
+    """
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'job-heartbeat-{job.id}', daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+                RefreshJob.objects.filter(id=self.job_id, status='running').update(heartbeat_at=timezone.now())
+        except Exception as e:
+            logger.warning("Не удалось обновить сигнал задачи", extra=fields(job_id=self.job_id, error=str(e)))
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def _set_progress(job, progress, message):
+    job.progress = progress
+    job.message = message
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=['progress', 'message', 'heartbeat_at'])
+
+
+def _refresh_from_ravelry(job):
+    """Случайные схемы из Ravelry, при неудаче - тестовые"""
+    _set_progress(job, 10, 'Запрос к Ravelry')
+    try:
+        patterns_data = get_random_patterns(job.count)
+    except RavelryRateLimited:
+        raise
+    except Exception as api_error:
+        logger.warning("Ошибка Ravelry API, будут тестовые схемы", extra=fields(job_id=job.id, error=str(api_error)))
+        patterns_data = []
+
+    if patterns_data:
+        _set_progress(job, 60, f'Сохранение {len(patterns_data)} схем')
+        return save_real_patterns(patterns_data, job.count)
+
+    _set_progress(job, 60, 'Ravelry недоступен, создаю тестовые схемы')
+    return create_test_patterns(job.count)
+
+
+def _import_catalog(job):
+    """
+    Массовая загрузка job.count схем из Ravelry (manage.py import_catalog).
+    Страницы поиска запрашиваются параллельно (AsyncRavelryAPI), каждая
+    сохраняется пакетом сразу после загрузки. Лимит Ravelry задача ждет,
+    а не откладывается: загруженные страницы уже сохранены. Миниатюры -
+    отдельно, командой generate_thumbnails.
+    """
+    api = AsyncRavelryAPI()
+    pages = max(1, math.ceil(job.count / api.PAGE_SIZE))
+    totals = {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+    def save_page(patterns):
+        result = upsert_patterns(patterns)
+        for key in totals:
+            totals[key] += result[key]
+        saved = sum(totals.values())
+        _set_progress(job, 10 + 85 * min(saved, job.count) // job.count, f'Сохранено {saved} схем')
+
+    _set_progress(job, 5, f'Загрузка {pages} страниц из Ravelry')
+    try:
+        received = api.fetch_catalog(save_page, max_pages=pages)
+    finally:
+        api.close()
+
+    if not received:
+        message = 'Ravelry не вернул схем'
+    else:
+        message = f"Загружено {totals['inserted']} схем, обновлено {totals['updated']}"
+    return {'message': message, 'received': received, **totals}
+
+
+def _refresh_simple(job):
+    _set_progress(job, 10, 'Создание тестовых схем')
+    return create_test_patterns(job.count)
+
+
+def _refresh_force(job):
+    _set_progress(job, 10, 'Удаление всех схем')
+    Pattern.objects.all().delete()
+    bump_catalog_version()
+    _set_progress(job, 50, 'Создание тестовых схем')
+    return create_test_patterns(job.count)
+
+
+def _refresh_recommendations(job):
+    """
+    Пересчет устаревших рекомендаций. Повторяем проход, пока находятся
+    устаревшие; изменения после последнего прохода ставят задачу
+    повторно (RERUN_JOBS) или остаются отмеченными до следующей проверки
+    воркера (enqueue_dirty_recommendations).
+    """
+    refreshed = 0
+    for attempt in range(3):
+        _set_progress(job, 10 + attempt * 30, 'Проверка рекомендаций')
+        changed = refresh_stale()
+        refreshed += changed
+        if not changed:
+            break
+    return {
+        'message': f'Обновлено рекомендаций: {refreshed}',
+        'refreshed': refreshed,
+    }
+
+
+def enqueue_dirty_recommendations():
+    """
+    Ставит пересчет рекомендаций, если есть отмеченные пользователи
+    (recommendations.mark_dirty). Вызывается воркером, когда очередь
+    пуста: изменения запасов и избранного сами задачу не ставят.
+    """
+    if UserRecommendations.objects.filter(dirty_at__isnull=False).exists():
+        return enqueue_refresh('recommendations', 0)
+    return None
+
+
+JOB_HANDLERS = {
+    'ravelry': _refresh_from_ravelry,
+    'catalog': _import_catalog,
+    'simple': _refresh_simple,
+    'force': _refresh_force,
+    'recommendations': _refresh_recommendations,
+}
+
+# После изменения каталога рекомендации нужно перепроверить
+CATALOG_JOBS = ('ravelry', 'catalog', 'simple', 'force')
+
+# Задачи по изменившимся данным: запрос во время выполнения не присоединяется
+# к ней молча, а запускает задачу еще раз после завершения (enqueue_refresh)
+RERUN_JOBS = ('recommendations',)
+
+
+def _rerun_if_requested(job):
+    if job.kind in RERUN_JOBS and RefreshJob.objects.filter(id=job.id, rerun=True).exists():
+        enqueue_refresh(job.kind, job.count)
+
+
+def run_job(job):
+    """Выполняет задачу и сохраняет результат"""
+    handler = JOB_HANDLERS[job.kind]
+    started = time.perf_counter()
+    try:
+        with Heartbeat(job):
+            result = handler(job)
+    except (KeyboardInterrupt, SystemExit):
+        # Воркер останавливают (SIGTERM при деплое): задача вернется в очередь
+        RefreshJob.objects.filter(id=job.id, status='running').update(
+            status='queued', run_after=timezone.now(), message='Воркер остановлен, задача возвращена в очередь'
+        )
+        logger.warning("Воркер остановлен во время задачи", extra=fields(job_id=job.id, kind=job.kind))
+        raise
+    except RavelryRateLimited as limited:
+        # Откладываем задачу, воркер займется другими
+        job.status = 'queued'
+        job.run_after = timezone.now() + timedelta(seconds=limited.retry_after)
+        job.message = f'Лимит Ravelry, повтор через {limited.retry_after:.0f} с'
+        job.save(update_fields=['status', 'run_after', 'message'])
+        logger.info("Задача отложена до снятия лимита Ravelry", extra=fields(
+            job_id=job.id, kind=job.kind, retry_after_s=round(limited.retry_after)
+        ))
+        return job
+    except Exception as e:
+        logger.exception("Задача обновления схем не выполнена", extra=fields(
+            job_id=job.id, kind=job.kind, duration_ms=round((time.perf_counter() - started) * 1000, 1)
+        ))
+        job.status = 'failed'
+        job.message = str(e)[:255]
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'message', 'finished_at'])
+        _rerun_if_requested(job)
+        return job
+
+    job.status = 'done'
+    job.progress = 100
+    job.message = result.pop('message', '')
+    job.result = result
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'message', 'result', 'finished_at'])
+    logger.info("Задача выполнена", extra=fields(
+        job_id=job.id, kind=job.kind, duration_ms=round((time.perf_counter() - started) * 1000, 1)
+    ))
+    
+    _rerun_if_requested(job)
+    if job.kind in CATALOG_JOBS:
+        enqueue_refresh('recommendations', 0)
+    return job
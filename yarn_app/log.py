@@ -0,0 +1,119 @@
+# log.py
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+
+def fields(**values):
+    """
+    extra для записи лога со структурированными полями:
+    logger.info('Запрос выполнен', extra=fields(endpoint=endpoint, duration_ms=12.5))
+    """
+    return {'fields': values}
+
+
+def sampled(key, **values):
+    """
+    extra для частых однотипных сообщений (например, по каждой схеме):
+    SamplingFilter пропускает не больше LOG_SAMPLE_RATE таких записей
+    в секунду на ключ, остальные отбрасываются и считаются
+    """
+    return {'fields': values, 'sample': key}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Строка "время уровень логгер сообщение ключ=значение ..." или JSON
+    (json=True) с полями записи - удобно разбирать для анализа задержек.
+    """
+
+    def __init__(self, json=False, **kwargs):
+        super().__init__(**kwargs)
+        self.json = json
+
+    def format(self, record):
+        values = dict(getattr(record, 'fields', None) or {})
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            values['suppressed'] = suppressed
+        message = record.getMessage()
+        timestamp = self.formatTime(record, '%Y-%m-%dT%H:%M:%S')
+
+        if self.json:
+            data = {'time': timestamp, 'level': record.levelname, 'logger': record.name,
+                    'message': message, **values}
+            if record.exc_info:
+                data['exc'] = self.formatException(record.exc_info)
+            return json.dumps(data, ensure_ascii=False, default=str)
+
+        line = f'{timestamp} {record.levelname:<7} {record.name} {message}'
+        if values:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in values.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ограничивает частоту записей с ключом sample (см. sampled()): не больше
+    rate в секунду на ключ. Первая пропущенная после отбрасывания запись
+    получает поле suppressed - сколько записей было отброшено.
+    Предупреждения и ошибки не ограничиваются.
+    """
+
+    def __init__(self, rate=5, name=''):
+        super().__init__(name)
+        self.rate = rate
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        second = int(time.monotonic())
+        with self._lock:
+            window, passed, suppressed = self._windows.get(key, (second, 0, 0))
+            if window != second:
+                window, passed = second, 0
+            if passed >= self.rate:
+                self._windows[key] = (window, passed, suppressed + 1)
+                return False
+            self._windows[key] = (window, passed + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Отдает записи в ограниченную очередь, а пишет их в stdout отдельный
+    поток (QueueListener): запрос не ждет вывода. При переполнении очереди
+    записи отбрасываются и считаются в dropped, а не блокируют запрос.
+    """
+
+    def __init__(self, maxsize=10000, json=False, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(StructuredFormatter(json=json))
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Дописывает оставшиеся записи и останавливает поток вывода"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
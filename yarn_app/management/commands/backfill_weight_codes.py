@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from yarn_app.catalog import bump_catalog_version
+from yarn_app.jobs import enqueue_refresh
+from yarn_app.models import Pattern, normalize_yarn_weight
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Pattern.weight_code по полю yarn_weight'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        updated = 0
+        # Схема уходит из прежней толщины и появляется в новой
+        weight_codes = set()
+
+        patterns = Pattern.objects.only('id', 'yarn_weight', 'weight_code')
+        for pattern in patterns.iterator(chunk_size=batch_size):
+            weight_code = normalize_yarn_weight(pattern.yarn_weight)
+            if pattern.weight_code == weight_code:
+                continue
+            weight_codes.update((pattern.weight_code, weight_code))
+            pattern.weight_code = weight_code
+            batch.append(pattern)
+            if len(batch) >= batch_size:
+                Pattern.objects.bulk_update(batch, ['weight_code'])
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            Pattern.objects.bulk_update(batch, ['weight_code'])
+            updated += len(batch)
+
+        if updated:
+            # Код толщины участвует в фильтрах и подборе: снимок каталога,
+            # движок подбора и рекомендации пересчитываются
+            bump_catalog_version(weight_codes)
+            enqueue_refresh('recommendations', 0)
+        self.stdout.write(f'✅ Обновлено кодов толщины: {updated}')
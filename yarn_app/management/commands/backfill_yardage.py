@@ -0,0 +1,66 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from yarn_app.catalog import bump_catalog_version
+from yarn_app.jobs import enqueue_refresh
+from yarn_app.models import Pattern
+from yarn_app.pattern_import import pattern_yardage, sample_yardage
+from yarn_app.ravelry_api import RavelryRateLimited, get_ravelry_client
+
+
+class Command(BaseCommand):
+    help = ('Заполняет Pattern.yardage у схем без метража: схемы Ravelry - по деталям '
+            'из API, тестовые - тем же метражом, что дает create_test_patterns')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help='Не больше стольких схем Ravelry за запуск')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        missing = Pattern.objects.filter(Q(yardage__isnull=True) | Q(yardage__lte=0))
+        weight_codes = set()
+        updated = 0
+
+        batch = []
+        for pattern in missing.filter(source='test').only('id', 'ravelry_id', 'weight_code').iterator(chunk_size=batch_size):
+            pattern.yardage = sample_yardage(pattern.ravelry_id)
+            batch.append(pattern)
+        for start in range(0, len(batch), batch_size):
+            Pattern.objects.bulk_update(batch[start:start + batch_size], ['yardage'])
+        weight_codes.update(pattern.weight_code for pattern in batch)
+        updated += len(batch)
+        self.stdout.write(f'Тестовых схем: {len(batch)}')
+
+        client = get_ravelry_client()
+        ravelry = missing.exclude(source='test').values_list('id', 'ravelry_id', 'weight_code')
+        if options['limit']:
+            ravelry = ravelry[:options['limit']]
+        batch, unknown = [], 0
+        for pattern_id, ravelry_id, weight_code in list(ravelry):
+            while True:
+                try:
+                    details = client.get_pattern_details(ravelry_id)
+                    break
+                except RavelryRateLimited as limited:
+                    # Команда запускается вручную: ждать лимит можно
+                    time.sleep(limited.retry_after)
+            yardage = pattern_yardage(details) if details else 0
+            if not yardage:
+                unknown += 1
+                continue
+            batch.append(Pattern(id=pattern_id, yardage=yardage))
+            weight_codes.add(weight_code)
+            if len(batch) >= batch_size:
+                Pattern.objects.bulk_update(batch, ['yardage'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Pattern.objects.bulk_update(batch, ['yardage'])
+            updated += len(batch)
+
+        if updated:
+            # Метраж участвует в подборе: движок подбора и рекомендации пересчитываются
+            bump_catalog_version(weight_codes)
+            enqueue_refresh('recommendations', 0)
+        self.stdout.write(f'✅ Заполнен метраж: {updated}, метраж неизвестен у {unknown} схем Ravelry')
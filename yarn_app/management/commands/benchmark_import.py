@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from yarn_app.models import Pattern
+from yarn_app.pattern_import import pattern_fields_from_ravelry, upsert_patterns
+from yarn_app.ravelry_api import FakeRavelryAPI
+
+
+def _fake_patterns(count):
+    """Схемы в формате ответа Ravelry, как у тестового клиента"""
+    client = FakeRavelryAPI()
+    return [client._pattern(pattern_id) for pattern_id in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает импорт схем по одной (exists + create) и пакетный upsert_patterns '
+            'на 1k, 10k и 100k схем во временной БД')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Размеры импорта через запятую')
+        parser.add_argument('--per-row-max', type=int, default=10000,
+                            help='Импорт по одной схеме не замеряется для больших размеров (слишком долго)')
+        parser.add_argument('--changed', type=float, default=0.1,
+                            help='Доля схем с новым рейтингом при повторном импорте')
+        # Служебный режим дочернего процесса
+        parser.add_argument('--worker', type=int, default=0, help='(служебный) замерить импорт N схем')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.stdout.write(json.dumps(self.run_import(options['worker'], options)))
+
+        workdir = tempfile.mkdtemp(prefix='knitmatch-import-')
+        try:
+            self.compare(workdir, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _child(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), *args],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise RuntimeError(result.stderr[-2000:])
+        return result.stdout
+
+    def compare(self, workdir, options):
+        # Отдельная БД и кэш в памяти: рабочая БД не меняется
+        env = dict(
+            os.environ,
+            CACHE_BACKEND='django.core.cache.backends.locmem.LocMemCache',
+            LOG_LEVEL='WARNING', METRICS_ENABLED='False', THUMBNAILS_ENABLED='False',
+            SQLITE_TUNED='False',
+        )
+        template = os.path.join(workdir, 'template.sqlite3')
+        self._child(dict(env, SQLITE_PATH=template), 'migrate', '--verbosity', '0')
+
+        common = ['--per-row-max', str(options['per_row_max']), '--changed', str(options['changed'])]
+        self.stdout.write(f'{"схем":>8} {"по одной":>12} {"пакетом":>12} {"повтор":>10} {"обновление":>12}')
+        for size in (int(size) for size in options['sizes'].split(',')):
+            path = os.path.join(workdir, f'{size}.sqlite3')
+            shutil.copyfile(template, path)
+            output = self._child(dict(env, SQLITE_PATH=path), 'benchmark_import', '--worker', str(size), *common)
+            data = json.loads(output.strip().splitlines()[-1])
+            per_row = f'{data["per_row_s"]:.2f} с' if data['per_row_s'] is not None else '—'
+            self.stdout.write(
+                f'{size:>8} {per_row:>12} {data["bulk_s"]:>10.2f} с {data["unchanged_s"]:>8.2f} с '
+                f'{data["update_s"]:>10.2f} с  (обновлено {data["updated"]}, пропущено {data["skipped"]})'
+            )
+            if data['per_row_s']:
+                self.stdout.write(f'{"":>8} пакетный импорт быстрее в {data["per_row_s"] / data["bulk_s"]:.0f} раз')
+
+    def run_import(self, size, options):
+        patterns = _fake_patterns(size)
+        result = {'per_row_s': None}
+
+        if size <= options['per_row_max']:
+            # Прежний путь save_real_patterns: 2N запросов и N транзакций
+            started = time.perf_counter()
+            for pattern_data in patterns:
+                fields = pattern_fields_from_ravelry(pattern_data)
+                if not Pattern.objects.filter(ravelry_id=fields['ravelry_id']).exists():
+                    Pattern.objects.create(**fields)
+            result['per_row_s'] = time.perf_counter() - started
+            Pattern.objects.all().delete()
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        started = time.perf_counter()
+        upsert_patterns(patterns)
+        result['bulk_s'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        upsert_patterns(patterns)
+        result['unchanged_s'] = time.perf_counter() - started
+
+        step = max(int(1 / options['changed']), 1) if options['changed'] > 0 else len(patterns) + 1
+        for pattern_data in patterns[::step]:
+            pattern_data['rating']['average'] = round(pattern_data['rating']['average'] - 0.5, 2)
+        started = time.perf_counter()
+        stats = upsert_patterns(patterns)
+        result['update_s'] = time.perf_counter() - started
+        result.update(updated=stats['updated'], skipped=stats['skipped'])
+        return result
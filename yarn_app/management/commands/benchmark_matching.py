@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from yarn_app.matching import MatchEngine, stash_yards
+
+# Типичные запасы: несколько толщин в разном количестве
+SAMPLE_STASH = {
+    'dk': {'yarns': 4, 'skeins': 12, 'grams': 1200},
+    'worsted': {'yarns': 2, 'skeins': 5, 'grams': 500},
+    'fingering': {'yarns': 1, 'skeins': 2, 'grams': 0},
+}
+
+
+class Command(BaseCommand):
+    help = 'Замеряет построение движка подбора схем и ранжирование для одних запасов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Сколько раз ранжировать')
+        parser.add_argument('--limit', type=int, default=10, help='Размер топа для рекомендаций')
+
+    def _measure(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - started) / repeat * 1000, result
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        limit = options['limit']
+
+        started = time.perf_counter()
+        engine = MatchEngine.build()
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'Схем в движке: {len(engine)}, построение: {build_ms:.0f} мс')
+
+        yards = stash_yards(SAMPLE_STASH)
+        full_ms, ranked = self._measure(lambda: engine.rank(yards), repeat)
+        self.stdout.write(f'Полное ранжирование ({len(ranked)} схем): {full_ms:.1f} мс')
+
+        top_ms, _ = self._measure(lambda: engine.rank(yards, limit=limit), repeat)
+        self.stdout.write(f'Топ-{limit}: {top_ms:.2f} мс')
+
+        free_ms, _ = self._measure(
+            lambda: engine.rank(yards, limit=limit, difficulty='easy', free_only=True), repeat
+        )
+        self.stdout.write(f'Топ-{limit} (легкие, бесплатные): {free_ms:.2f} мс')
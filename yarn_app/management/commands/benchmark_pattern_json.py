@@ -0,0 +1,45 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from yarn_app.pagination import CATALOG_ORDERING
+from yarn_app.serializers import pattern_card, patterns_json_response
+from yarn_app.snapshot import get_catalog_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает сборку ответа api_patterns из словарей и из готовых JSON-фрагментов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-page', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def _measure(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            response = func()
+        return (time.perf_counter() - started) / repeat * 1_000_000, response
+
+    def handle(self, *args, **options):
+        snapshot = get_catalog_snapshot()
+        patterns, _ = snapshot.page(CATALOG_ORDERING, None, options['per_page'])
+        if not patterns:
+            self.stdout.write('Каталог пуст')
+            return
+        data = {'next_cursor': 'x', 'has_next': True}
+        repeat = options['repeat']
+
+        dict_us, expected = self._measure(
+            lambda: JsonResponse({'patterns': [pattern_card(pattern) for pattern in patterns], **data}),
+            repeat,
+        )
+        # Первый вызов заполняет кэш фрагментов
+        patterns_json_response(data, patterns, version=snapshot.version)
+        cached_us, response = self._measure(
+            lambda: patterns_json_response(data, patterns, version=snapshot.version), repeat
+        )
+
+        assert json.loads(response.content) == json.loads(expected.content)
+        self.stdout.write(f'Схем на странице: {len(patterns)}')
+        self.stdout.write(f'Словари + JsonResponse: {dict_us:.0f} мкс')
+        self.stdout.write(f'Готовые фрагменты: {cached_us:.0f} мкс ({dict_us / cached_us:.1f}x)')
@@ -0,0 +1,102 @@
+import gzip
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from yarn_app.ravelry_api import FakeRavelryAPI, RateLimiter, RavelryAPI
+
+ENDPOINT = 'patterns/search.json'
+
+
+def stub_server(handshake_delay):
+    """
+    Локальный сервер ответов поиска Ravelry (HTTP/1.1 keep-alive, gzip).
+    handshake_delay - задержка на каждое новое соединение: имитация
+    TCP + TLS рукопожатия с api.ravelry.com.
+    """
+    body = gzip.compress(json.dumps(FakeRavelryAPI()._fetch(ENDPOINT, {'page_size': 20})).encode())
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            # Заголовки и тело уходят отдельными пакетами: без TCP_NODELAY
+            # keep-alive соединение ждет отложенный ACK клиента (~40 мс)
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connections.append(1)
+            if handshake_delay:
+                time.sleep(handshake_delay)
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    return server, connections
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает запросы к Ravelry через новое соединение на каждый запрос (requests.get) '
+            'и через пул keep-alive соединений RavelryAPI на локальном тестовом сервере')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--handshake-ms', type=float, default=30,
+                            help='Задержка нового соединения, мс (TCP + TLS до api.ravelry.com)')
+
+    def _run(self, call, options):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(lambda _: call(), range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        if not all(results):
+            raise RuntimeError('Тестовый сервер вернул ошибку')
+        return elapsed / options['requests'] * 1000
+
+    def handle(self, *args, **options):
+        server, connections = stub_server(options['handshake_ms'] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+        # Учетные данные только для заголовка Authorization тестового сервера
+        with override_settings(RAVELRY_USERNAME='benchmark', RAVELRY_PERSONAL_ACCESS_TOKEN='benchmark'):
+            client = RavelryAPI(base_url=base_url, rate_limiter=RateLimiter(rate=10 ** 6, capacity=10 ** 6))
+        url = f'{base_url}/{ENDPOINT}'
+
+        try:
+            self.stdout.write(
+                f'{options["requests"]} запросов, {options["threads"]} потоков, '
+                f'рукопожатие {options["handshake_ms"]:.0f} мс\n'
+            )
+            rows = (
+                ('requests.get на каждый запрос',
+                 lambda: requests.get(url, headers=client.headers, timeout=client.REQUEST_TIMEOUT).json()),
+                ('RavelryAPI: пул keep-alive', lambda: client._fetch(ENDPOINT, {'page_size': 20})),
+            )
+            timings = []
+            for label, call in rows:
+                connections.clear()
+                per_request_ms = self._run(call, options)
+                timings.append(per_request_ms)
+                self.stdout.write(f'{label:<32} {per_request_ms:>7.2f} мс/запрос, соединений: {len(connections)}')
+            self.stdout.write(f'\nЭкономия на запрос: {timings[0] - timings[1]:.2f} мс (x{timings[0] / timings[1]:.1f})')
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from yarn_app.models import Pattern
+from yarn_app.pattern_import import create_test_patterns
+from yarn_app.search import IcontainsSearchBackend, SQLiteFTS5SearchBackend
+
+# Слово из названия, автор, префикс и запрос без совпадений
+QUERIES = ('sweater', 'andrea', 'mitt', 'mohair')
+
+BACKENDS = (
+    ('icontains', IcontainsSearchBackend(), False),
+    ('FTS5', SQLiteFTS5SearchBackend(), False),
+    ('FTS5 bm25', SQLiteFTS5SearchBackend(), True),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск схем через icontains (LIKE) и FTS5 на каталоге '
+            '1k, 10k и 100k схем во временной БД')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Размеры каталога через запятую')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--per-page', type=int, default=20)
+        # Служебный режим дочернего процесса
+        parser.add_argument('--worker', action='store_true', help='(служебный) выполнить замеры')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.run_search(options)
+
+        workdir = tempfile.mkdtemp(prefix='knitmatch-search-')
+        try:
+            # Отдельная БД: каталог растет до нужных размеров, рабочая БД не меняется
+            env = dict(
+                os.environ, SQLITE_PATH=os.path.join(workdir, 'search.sqlite3'),
+                CACHE_BACKEND='django.core.cache.backends.locmem.LocMemCache',
+                LOG_LEVEL='WARNING', METRICS_ENABLED='False', THUMBNAILS_ENABLED='False',
+            )
+            self._child(env, 'migrate', '--verbosity', '0')
+            output = self._child(env, 'benchmark_search', '--worker', '--sizes', options['sizes'],
+                                 '--repeat', str(options['repeat']), '--per-page', str(options['per_page']))
+            self.stdout.write(output.rstrip())
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _child(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), *args],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise RuntimeError(result.stderr[-2000:])
+        return result.stdout
+
+    def _measure(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - started) / repeat * 1000, result
+
+    def run_search(self, options):
+        repeat, per_page = options['repeat'], options['per_page']
+        catalog = Pattern.objects.order_by('-rating', '-created_at')
+
+        for size in (int(size) for size in options['sizes'].split(',')):
+            missing = size - Pattern.objects.count()
+            if missing > 0:
+                create_test_patterns(missing)
+            self.stdout.write(f'\nКаталог: {size} схем (мс на запрос: страница {per_page} схем + count)')
+            self.stdout.write(f'{"запрос":<10}' + ''.join(f'{label:>14}' for label, _, _ in BACKENDS))
+
+            for query in QUERIES:
+                cells = []
+                for label, backend, ranked in BACKENDS:
+                    def search():
+                        queryset = backend.search(catalog, query, ranked=ranked)
+                        return len(list(queryset[:per_page])), queryset.count()
+                    ms, (_, found) = self._measure(search, repeat)
+                    cells.append(f'{ms:>7.1f} ({found})')
+                self.stdout.write(f'{query:<10}' + ''.join(f'{cell:>14}' for cell in cells))
@@ -0,0 +1,167 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, connection
+from yarn_app.favorites import toggle_favorite
+from yarn_app.models import Favorite, Pattern
+from yarn_app.pattern_import import create_test_patterns
+
+MODES = (
+    ('обычный sqlite3', 'False'),
+    ('SQLITE_TUNED', 'True'),
+)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = ('Конкурентная нагрузка на SQLite: N потоков читают каталог и избранное '
+            'и переключают избранное; сравнивает обычный sqlite3 и SQLITE_TUNED')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Доля операций записи')
+        parser.add_argument('--patterns', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=50)
+        # Служебные режимы дочерних процессов
+        parser.add_argument('--seed', action='store_true', help='(служебный) заполнить БД')
+        parser.add_argument('--worker', action='store_true', help='(служебный) выполнить нагрузку')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            return self.seed(options)
+        if options['worker']:
+            return self.stdout.write(json.dumps(self.run_workload(options)))
+
+        workdir = tempfile.mkdtemp(prefix='knitmatch-sqlite-')
+        try:
+            self.compare(workdir, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _child(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), *args],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise RuntimeError(result.stderr[-2000:])
+        return result.stdout
+
+    def compare(self, workdir, options):
+        common = ['--threads', str(options['threads']), '--seconds', str(options['seconds']),
+                  '--write-ratio', str(options['write_ratio']),
+                  '--patterns', str(options['patterns']), '--users', str(options['users'])]
+        # Отдельная БД и кэш в памяти: замеряется только SQLite, рабочая БД не меняется
+        env = dict(
+            os.environ,
+            CACHE_BACKEND='django.core.cache.backends.locmem.LocMemCache',
+            LOG_LEVEL='WARNING', METRICS_ENABLED='False', THUMBNAILS_ENABLED='False',
+        )
+        template = os.path.join(workdir, 'template.sqlite3')
+        seed_env = dict(env, SQLITE_PATH=template, SQLITE_TUNED='False')
+        self.stdout.write(f'Подготовка БД: {options["patterns"]} схем, {options["users"]} пользователей...')
+        self._child(seed_env, 'migrate', '--verbosity', '0')
+        self._child(seed_env, 'benchmark_sqlite', '--seed', *common)
+
+        self.stdout.write(
+            f'{options["threads"]} потоков, {options["seconds"]} с, записей {options["write_ratio"]:.0%}\n'
+        )
+        results = {}
+        for label, tuned in MODES:
+            path = os.path.join(workdir, f'{tuned}.sqlite3')
+            shutil.copyfile(template, path)
+            output = self._child(dict(env, SQLITE_PATH=path, SQLITE_TUNED=tuned), 'benchmark_sqlite', '--worker', *common)
+            results[label] = data = json.loads(output.strip().splitlines()[-1])
+            self.stdout.write(
+                f'{label:<16} {data["ops_per_s"]:>8.0f} оп/с  (чтение {data["reads"]}, запись {data["writes"]}, '
+                f'ошибок "database is locked" {data["errors"]})  '
+                f'p95 чтения {data["read_p95_ms"]:.1f} мс, записи {data["write_p95_ms"]:.1f} мс'
+            )
+
+        plain, tuned = (results[label] for label, _ in MODES)
+        if plain['ops_per_s']:
+            self.stdout.write(f'\nПропускная способность: x{tuned["ops_per_s"] / plain["ops_per_s"]:.1f}')
+
+    def seed(self, options):
+        create_test_patterns(options['patterns'])
+        User.objects.bulk_create([
+            User(username=f'bench_{i}', password='!') for i in range(options['users'])
+        ])
+
+    def run_workload(self, options):
+        user_ids = list(User.objects.values_list('id', flat=True))
+        pattern_ids = list(Pattern.objects.values_list('id', flat=True))
+        connection.close()
+
+        deadline = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        read_times, write_times = [], []
+
+        def worker(seed):
+            rnd = random.Random(seed)
+            local = {'reads': 0, 'writes': 0, 'errors': 0}
+            local_reads, local_writes = [], []
+            while time.perf_counter() < deadline:
+                # Как запрос Django: с CONN_MAX_AGE=0 соединение закрывается после каждого
+                request_started.send(sender=self.__class__)
+                user_id = rnd.choice(user_ids)
+                write = rnd.random() < options['write_ratio']
+                started = time.perf_counter()
+                try:
+                    if write:
+                        toggle_favorite(User(id=user_id), Pattern(id=rnd.choice(pattern_ids)))
+                    else:
+                        offset = rnd.randint(0, max(len(pattern_ids) - 12, 0))
+                        list(Pattern.objects.order_by('-rating', '-created_at')[offset:offset + 12])
+                        list(Favorite.objects.filter(user_id=user_id).values_list('pattern_id', flat=True))
+                except OperationalError:
+                    local['errors'] += 1
+                else:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if write:
+                        local['writes'] += 1
+                        local_writes.append(elapsed)
+                    else:
+                        local['reads'] += 1
+                        local_reads.append(elapsed)
+                finally:
+                    request_finished.send(sender=self.__class__)
+            connection.close()
+            with lock:
+                for key, value in local.items():
+                    totals[key] += value
+                read_times.extend(local_reads)
+                write_times.extend(local_writes)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            **totals,
+            'ops_per_s': (totals['reads'] + totals['writes']) / elapsed,
+            'read_p95_ms': _percentile(read_times, 95),
+            'write_p95_ms': _percentile(write_times, 95),
+        }
@@ -0,0 +1,49 @@
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Выполняется в новом процессе: холодный старт, как у воркера gunicorn
+PROBE = """
+import os, time, importlib
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.conf import settings
+urls = importlib.import_module(settings.ROOT_URLCONF)
+from django.urls import get_resolver
+get_resolver().url_patterns
+finished = time.perf_counter()
+print((setup_done - started) * 1000, (finished - setup_done) * 1000)
+"""
+
+
+class Command(BaseCommand):
+    help = 'Время холодного старта: django.setup() и импорт URL (с views) в новом процессе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help='Сколько раз запускать процесс')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'knitmatch_project.settings'))
+        setup_times, url_times = [], []
+        for _ in range(options['repeat']):
+            result = subprocess.run(
+                [sys.executable, '-c', PROBE], cwd=settings.BASE_DIR, env=env,
+                capture_output=True, text=True, check=True
+            )
+            # Последняя строка - замер, выше может быть вывод при импорте
+            setup_ms, urls_ms = map(float, result.stdout.strip().splitlines()[-1].split())
+            setup_times.append(setup_ms)
+            url_times.append(urls_ms)
+            extra = result.stdout.strip().splitlines()[:-1]
+
+        total = [setup + urls for setup, urls in zip(setup_times, url_times)]
+        self.stdout.write(f'django.setup(): медиана {statistics.median(setup_times):.1f} мс')
+        self.stdout.write(f'Импорт URL и views: медиана {statistics.median(url_times):.1f} мс')
+        self.stdout.write(f'Всего: медиана {statistics.median(total):.1f} мс, минимум {min(total):.1f} мс')
+        if extra:
+            self.stdout.write(f'Вывод при импорте ({len(extra)} строк): {extra[0][:80]}')
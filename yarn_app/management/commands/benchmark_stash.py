@@ -0,0 +1,109 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from yarn_app.models import UserStashSummary, UserYarn
+
+# Запросов на страницу при любом объеме запасов: сессия, пользователь,
+# сводка и список пряжи (my_yarn) или одна пряжа (yarn_detail)
+QUERY_BUDGET = 4
+
+COLORS = ('#FF6B8B', '#8A4FFF', '#00D4AA', '#4FC3F7', '#FFA726', '#66BB6A', '#795548')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет my_yarn, yarn_detail и пересчет сводки запасов при 10, 1k и 50k '
+            'пряжи у пользователя во временной БД; проверяет бюджет запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,1000,50000', help='Пряжи у пользователя через запятую')
+        parser.add_argument('--repeat', type=int, default=5)
+        # Служебный режим дочернего процесса
+        parser.add_argument('--worker', action='store_true', help='(служебный) выполнить замеры')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.run_pages(options)
+
+        workdir = tempfile.mkdtemp(prefix='knitmatch-stash-')
+        try:
+            # Отдельная БД; DEBUG - статика без манифеста collectstatic
+            env = dict(
+                os.environ, SQLITE_PATH=os.path.join(workdir, 'stash.sqlite3'), DEBUG='True',
+                CACHE_BACKEND='django.core.cache.backends.locmem.LocMemCache',
+                LOG_LEVEL='WARNING', METRICS_ENABLED='False', THUMBNAILS_ENABLED='False',
+            )
+            self._child(env, 'migrate', '--verbosity', '0')
+            output = self._child(env, 'benchmark_stash', '--worker', '--sizes', options['sizes'],
+                                 '--repeat', str(options['repeat']))
+            self.stdout.write(output.rstrip())
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _child(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), *args],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise RuntimeError(result.stderr[-2000:])
+        return result.stdout
+
+    def _measure(self, func, repeat):
+        # CaptureQueriesContext не подходит: request_started сбрасывает connection.queries
+        queries = []
+        def count(execute, sql, *args):
+            queries.append(sql)
+            return execute(sql, *args)
+
+        with connection.execute_wrapper(count):
+            result = func()
+        if getattr(result, 'status_code', 200) != 200:
+            raise RuntimeError(f'Ответ {result.status_code}')
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1000, len(queries)
+
+    def seed(self, size):
+        user = User.objects.create_user(f'stash_{size}', password='!')
+        rnd = random.Random(size)
+        types = [code for code, _ in UserYarn.YARN_TYPES]
+        UserYarn.objects.bulk_create([
+            UserYarn(
+                user=user, name=f'Yarn {i}', yarn_type=rnd.choice(types), color=rnd.choice(COLORS),
+                amount=rnd.randint(1, 10), weight=rnd.choice((None, 50, 100)),
+            )
+            for i in range(size)
+        ], batch_size=2000)
+        return user
+
+    def run_pages(self, options):
+        repeat = options['repeat']
+        client = Client(HTTP_HOST='127.0.0.1')
+        self.stdout.write(f'{"пряжи":>7} {"сводка":>10} {"my_yarn":>16} {"yarn_detail":>16}  бюджет {QUERY_BUDGET}')
+
+        for size in (int(size) for size in options['sizes'].split(',')):
+            user = self.seed(size)
+            client.force_login(user)
+            yarn_id = UserYarn.objects.filter(user=user).values_list('id', flat=True).first()
+            detail_url = reverse('yarn_detail', args=[yarn_id])
+
+            rebuild_ms, _ = self._measure(lambda: UserStashSummary.rebuild(user.id), repeat)
+            list_ms, list_queries = self._measure(lambda: client.get(reverse('my_yarn')), repeat)
+            detail_ms, detail_queries = self._measure(lambda: client.get(detail_url), repeat)
+
+            within = '✅' if max(list_queries, detail_queries) <= QUERY_BUDGET else '❌'
+            self.stdout.write(
+                f'{size:>7} {rebuild_ms:>7.1f} мс {list_ms:>7.1f} мс ({list_queries:>2} з) '
+                f'{detail_ms:>7.1f} мс ({detail_queries:>2} з)  {within}'
+            )
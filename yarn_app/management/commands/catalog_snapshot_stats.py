@@ -0,0 +1,38 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from yarn_app.pagination import CATALOG_ORDERING, NEWEST_ORDERING
+from yarn_app.snapshot import CatalogSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Строит снимок каталога схем и показывает время построения, память и скорость страниц'
+
+    def handle(self, *args, **options):
+        tracemalloc.start()
+        started = time.perf_counter()
+        snapshot = CatalogSnapshot.build()
+        build_ms = (time.perf_counter() - started) * 1000
+        # Память снимка: все, что осталось занятым после построения
+        # (временные объекты из БД к этому моменту освобождены)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        count = len(snapshot)
+        self.stdout.write(f'Схем в снимке: {count}, построение: {build_ms:.0f} мс')
+        self.stdout.write(f'Память: {size / 2 ** 20:.1f} МБ (пик при построении {peak / 2 ** 20:.1f} МБ)')
+        if count:
+            per_100k = size / count * 100_000 / 2 ** 20
+            self.stdout.write(f'На 100 000 схем: ~{per_100k:.1f} МБ')
+
+        def measure(label, func, repeat=50):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            self.stdout.write(f'{label}: {(time.perf_counter() - started) / repeat * 1000:.2f} мс')
+
+        _, cursor = snapshot.page(CATALOG_ORDERING, None, 12)
+        measure('Первая страница каталога', lambda: snapshot.page(CATALOG_ORDERING, None, 12))
+        measure('Следующая страница по курсору', lambda: snapshot.page(CATALOG_ORDERING, cursor, 12))
+        measure('Новые бесплатные, страница', lambda: snapshot.page(NEWEST_ORDERING, None, 20, free_only=True))
+        measure('Подсчет легких бесплатных', lambda: snapshot.count(difficulty='easy', free_only=True), 10)
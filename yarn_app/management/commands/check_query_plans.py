@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from yarn_app.query_plans import ALLOWED_TEMP_SORTS, full_scans, hot_queries, query_plan, temp_sorts
+
+
+class Command(BaseCommand):
+    help = 'Проверяет через EXPLAIN QUERY PLAN, что горячие запросы используют индексы'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN поддерживается только для SQLite')
+
+        failed = 0
+        with connection.cursor() as cursor:
+            for name, queryset in hot_queries().items():
+                plan = query_plan(cursor, queryset)
+                scans = full_scans(plan)
+                sorts = temp_sorts(plan)
+
+                if scans:
+                    failed += 1
+                    self.stdout.write(f'❌ {name}')
+                    for detail in scans:
+                        self.stdout.write(f'   {detail}')
+                elif sorts and name in ALLOWED_TEMP_SORTS:
+                    self.stdout.write(f'✅ {name} (сортировка отобранных строк без индекса допустима)')
+                elif sorts:
+                    failed += 1
+                    self.stdout.write(f'❌ {name}: сортировка во временном B-tree')
+                else:
+                    self.stdout.write(f'✅ {name}')
+                if options['verbosity'] > 1:
+                    for row in plan:
+                        self.stdout.write(f'      {row[-1]}')
+
+        if failed:
+            raise CommandError(f'Запросов без индекса: {failed}')
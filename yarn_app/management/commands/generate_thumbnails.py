@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from yarn_app.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Делает локальные WebP-миниатюры фото схем, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Не больше стольких фото за запуск')
+        parser.add_argument('--workers', type=int, default=None, help='Параллельных загрузок (THUMBNAIL_WORKERS)')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Повторить и недавно неудавшиеся загрузки')
+
+    def handle(self, *args, **options):
+        stats = generate_thumbnails(
+            limit=options['limit'], workers=options['workers'], retry_failed=options['retry_failed']
+        )
+        self.stdout.write(
+            f'Фото обработано: {stats["processed"]}, ошибок: {stats["failed"]}, '
+            f'отложено после ошибок: {stats["skipped"]}'
+        )
+        if stats['processed']:
+            self.stdout.write(
+                f'Скачано {stats["bytes_in"] / 2 ** 20:.1f} МБ, миниатюры {stats["bytes_out"] / 2 ** 20:.1f} МБ, '
+                f'{stats["duration_ms"] / 1000:.1f} с'
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from yarn_app.jobs import enqueue_refresh
+
+
+class Command(BaseCommand):
+    help = ('Ставит в очередь массовую загрузку каталога Ravelry: страницы поиска '
+            'загружаются параллельно, выполняет воркер run_refresh_worker')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Сколько схем загрузить')
+
+    def handle(self, *args, **options):
+        if options['count'] <= 0:
+            raise CommandError('--count должен быть больше нуля')
+        job, created = enqueue_refresh('catalog', options['count'])
+        if created:
+            self.stdout.write(f'✅ Задача {job.id} поставлена в очередь: {job.count} схем')
+        else:
+            self.stdout.write(f'Загрузка каталога уже в очереди или выполняется: задача {job.id}')
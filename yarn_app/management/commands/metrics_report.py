@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from yarn_app import favorites
+from yarn_app.metrics import report
+
+SORT_FIELDS = ('p95_ms', 'p99_ms', 'p50_ms', 'avg_queries', 'max_queries',
+               'p95_db_ms', 'duplicate_queries', 'ravelry_calls', 'requests', 'errors')
+
+
+class Command(BaseCommand):
+    help = 'Самые медленные и "тяжелые" view по метрикам всех воркеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Сколько view показать')
+        parser.add_argument('--sort', choices=SORT_FIELDS, default='p95_ms', help='Поле сортировки')
+        parser.add_argument('--reset-favorites-stats', action='store_true',
+                            help='Обнулить счетчики кэша избранного после отчета')
+
+    def handle(self, *args, **options):
+        self.report_favorites_cache(options['reset_favorites_stats'])
+        views = report()
+        if not views:
+            self.stdout.write('Метрик пока нет: запросы не выполнялись или METRICS_ENABLED=False')
+            return
+
+        ordered = sorted(views.items(), key=lambda item: item[1][options['sort']], reverse=True)
+        self.stdout.write(
+            f'{"view":<32} {"запр.":>7} {"p50 мс":>8} {"p95 мс":>8} {"p99 мс":>8} '
+            f'{"SQL ср.":>8} {"SQL max":>8} {"БД p95":>8} {"повт.":>6} {"Ravelry":>8}'
+        )
+        for name, data in ordered[:options['top']]:
+            self.stdout.write(
+                f'{name[:32]:<32} {data["requests"]:>7} {data["p50_ms"]:>8} {data["p95_ms"]:>8} '
+                f'{data["p99_ms"]:>8} {data["avg_queries"]:>8} {data["max_queries"]:>8} '
+                f'{data["p95_db_ms"]:>8} {data["duplicate_queries"]:>6} {data["ravelry_calls"]:>8}'
+            )
+
+        duplicated = [(name, data) for name, data in ordered if data['duplicate_queries']]
+        if duplicated:
+            self.stdout.write('\nПовторяющиеся запросы (кандидаты на N+1):')
+            for name, data in duplicated[:options['top']]:
+                self.stdout.write(f'  {name}: {data["duplicate_queries"]} - {data["duplicate_sql"][:150]}')
+
+    def report_favorites_cache(self, reset):
+        stats = favorites.cache_stats()
+        self.stdout.write(
+            f'Кэш избранного: попаданий ~{stats["hits"]}, промахов ~{stats["misses"]}, '
+            f'доля попаданий {stats["hit_ratio"]:.0%}\n'
+        )
+        if reset:
+            favorites.reset_stats()
@@ -0,0 +1,69 @@
+import io
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw
+
+PHOTO_PATH = re.compile(r'^/(\d+)\.jpg$')
+
+
+def fixture_photo(number, side):
+    """Детерминированное тестовое фото JPEG: фон и фигуры, цвета зависят от номера"""
+    rnd = random.Random(number)
+    image = Image.new('RGB', (side, side), tuple(rnd.randint(0, 255) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rnd.randint(0, side), rnd.randint(0, side)
+        radius = rnd.randint(side // 20, side // 4)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=tuple(rnd.randint(0, 255) for _ in range(3)))
+    data = io.BytesIO()
+    image.save(data, 'JPEG', quality=90)
+    return data.getvalue()
+
+
+class Command(BaseCommand):
+    help = ('Локальный сервер тестовых фото схем (http://host:port/<номер>.jpg) '
+            'для проверки миниатюр без сети, вместе с RAVELRY_BACKEND=fake и RAVELRY_FAKE_PHOTO_BASE')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--side', type=int, default=1024, help='Размер фото, px')
+        parser.add_argument('--delay', type=float, default=0, help='Задержка ответа, с (имитация сети)')
+
+    def handle(self, *args, **options):
+        side, delay = options['side'], options['delay']
+        photos = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = PHOTO_PATH.match(self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                number = int(match.group(1))
+                if number not in photos:
+                    photos[number] = fixture_photo(number, side)
+                if delay:
+                    time.sleep(delay)
+                body = photos[number]
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(f'Тестовые фото: http://{options["host"]}:{server.server_port}/<номер>.jpg')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
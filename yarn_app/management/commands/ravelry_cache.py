@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from yarn_app.ravelry_cache import get_response_cache
+
+
+class Command(BaseCommand):
+    help = 'Статистика постоянного кэша ответов Ravelry API и его очистка'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Удалить ответы и счетчики')
+        parser.add_argument('--endpoint', default=None,
+                            help='С --clear: удалить только ответы endpoint с этим префиксом (например, patterns/search)')
+
+    def handle(self, *args, **options):
+        response_cache = get_response_cache()
+        if response_cache is None:
+            raise CommandError('Кэш ответов Ravelry выключен (RAVELRY_CACHE_ENABLED=False)')
+
+        if options['clear']:
+            deleted = response_cache.clear(options['endpoint'])
+            self.stdout.write(self.style.SUCCESS(f'Удалено ответов: {deleted}'))
+            return
+
+        stats = response_cache.stats()
+        self.stdout.write(f'Файл: {response_cache.path}')
+        self.stdout.write(
+            f'Ответов: {stats["entries"]}, объем {stats["bytes"] / 2 ** 20:.2f} '
+            f'из {stats["max_bytes"] / 2 ** 20:.0f} МБ'
+        )
+        for kind, data in sorted(stats['by_kind'].items()):
+            self.stdout.write(f'  {kind}: {data["entries"]} ответов, {data["bytes"] / 2 ** 10:.1f} КБ')
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, устаревших: {stats["stale_hits"]}, '
+            f'промахов: {stats["misses"]} (доля попаданий {stats["hit_rate"]:.1%})'
+        )
+        self.stdout.write(
+            f'Прочитано из кэша: {stats["bytes_read"] / 2 ** 20:.2f} МБ, '
+            f'записано: {stats["bytes_written"] / 2 ** 20:.2f} МБ'
+        )
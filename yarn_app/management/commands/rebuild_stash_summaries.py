@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from yarn_app.models import UserStashSummary
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводки запасов пряжи (UserStashSummary) для всех пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Пересчитать только для пользователя с этим id')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(id=options['user'])
+
+        rebuilt = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            UserStashSummary.rebuild(user_id)
+            rebuilt += 1
+
+        self.stdout.write(f'✅ Пересчитано сводок: {rebuilt}')
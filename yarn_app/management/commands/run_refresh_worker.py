@@ -0,0 +1,36 @@
+import signal
+import sys
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from yarn_app.jobs import claim_next_job, enqueue_dirty_recommendations, run_job
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи обновления схем из очереди RefreshJob'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить задачи, готовые сейчас, и завершиться')
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help='Пауза между проверками очереди (сек)')
+
+    def handle(self, *args, **options):
+        # SIGTERM (деплой) - как Ctrl+C: текущая задача возвращается в очередь
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.stdout.write('🧶 Воркер обновления схем запущен')
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None and enqueue_dirty_recommendations():
+                job = claim_next_job()
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'▶ Задача #{job.id}: {job.get_kind_display()} ({job.count})')
+            job = run_job(job)
+            self.stdout.write(f'   {job.get_status_display()}: {job.message}')
@@ -0,0 +1,242 @@
+# matching.py
+import heapq
+import threading
+from array import array
+from .catalog import get_catalog_version
+from .models import Pattern, UserStashSummary, YARN_WEIGHT_CODES
+from .ravelry_api import get_weight_codes
+
+# Толщины по возрастанию: соседние толщины частично взаимозаменяемы
+WEIGHT_ORDER = list(YARN_WEIGHT_CODES)
+
+# Примерный метраж 100 г пряжи каждой толщины (ярды)
+YARDS_PER_100G = {
+    'lace': 800,
+    'light fingering': 500,
+    'fingering': 400,
+    'sport': 300,
+    'dk': 240,
+    'worsted': 200,
+    'aran': 170,
+    'bulky': 120,
+    'super bulky': 80,
+    'jumbo': 40,
+}
+# Вес мотка, если он не указан
+DEFAULT_SKEIN_GRAMS = 50
+
+# Веса составляющих оценки (в сумме 1)
+W_WEIGHT = 0.45
+W_YARDAGE = 0.25
+W_RATING = 0.2
+W_EASE = 0.05
+W_FREE = 0.05
+
+EXACT_WEIGHT = 1.0
+ADJACENT_WEIGHT = 0.4
+UNKNOWN_YARDAGE_FIT = 0.5
+
+DIFFICULTY_EASE = {
+    'beginner': 1.0,
+    'easy': 0.75,
+    'intermediate': 0.5,
+    'experienced': 0.25,
+}
+DIFFICULTY_CODES = {name: code for code, name in enumerate(DIFFICULTY_EASE, start=1)}
+
+
+def stash_yards(by_type):
+    """
+    Доступный метраж по кодам толщины из сводки запасов
+    ({'dk': {'skeins': 5, 'grams': 500}, ...}).
+    """
+    yards = {}
+    for code in get_weight_codes(*by_type):
+        stats = by_type[code]
+        grams = stats.get('grams') or stats.get('skeins', 0) * DEFAULT_SKEIN_GRAMS
+        yards[code] = grams * YARDS_PER_100G.get(code, 0) / 100
+    return yards
+
+
+def yarn_yards(yarn):
+    """Доступный метраж одной позиции UserYarn"""
+    grams = (yarn.amount or 0) * (yarn.weight or DEFAULT_SKEIN_GRAMS)
+    return stash_yards({yarn.yarn_type: {'skeins': yarn.amount, 'grams': grams}})
+
+
+def candidate_codes(yards):
+    """
+    Толщины схем, подходящие к запасам:
+    {код толщины: (оценка толщины, доступный метраж)}
+    """
+    codes = {}
+    for code, available in yards.items():
+        codes[code] = (EXACT_WEIGHT, available)
+    for code, available in yards.items():
+        index = WEIGHT_ORDER.index(code)
+        for neighbour in WEIGHT_ORDER[max(index - 1, 0):index + 2]:
+            if neighbour not in yards:
+                _, best = codes.get(neighbour, (ADJACENT_WEIGHT, 0))
+                codes[neighbour] = (ADJACENT_WEIGHT, max(best, available))
+    return codes
+
+
+class MatchEngine:
+    """
+    Оценка схем каталога относительно запасов пряжи.
+
+    Признаки схем хранятся колонками в array (id, метраж, сложность,
+    бесплатность) и строятся один раз на версию каталога. Часть оценки,
+    не зависящая от пользователя (рейтинг, простота, бесплатность),
+    считается заранее; позиции сгруппированы по коду толщины и
+    отсортированы по ней, поэтому ранжирование обходит только схемы
+    подходящих толщин, а при limit останавливается, как только
+    оставшиеся схемы уже не могут попасть в топ.
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.ids = array('q')
+        self.yardage = array('l')
+        self.difficulty = array('b')
+        self.is_free = array('b')
+        self.base = array('d')
+
+        positions = {}
+        for pattern_id, weight_code, yardage, difficulty, is_free, rating in rows:
+            if weight_code not in YARDS_PER_100G:
+                continue
+            positions.setdefault(weight_code, []).append(len(self.ids))
+            self.ids.append(pattern_id)
+            self.yardage.append(yardage or 0)
+            self.difficulty.append(DIFFICULTY_CODES.get(difficulty, 0))
+            self.is_free.append(1 if is_free else 0)
+            self.base.append(
+                W_RATING * min(rating or 0, 5) / 5
+                + W_EASE * DIFFICULTY_EASE.get(difficulty, 0.5)
+                + W_FREE * (1 if is_free else 0)
+            )
+
+        base = self.base
+        self.by_code = {
+            code: array('l', sorted(rows, key=base.__getitem__, reverse=True))
+            for code, rows in positions.items()
+        }
+
+    @classmethod
+    def build(cls, version=None):
+        """Строит движок по текущему каталогу"""
+        rows = Pattern.objects.values_list(
+            'id', 'weight_code', 'yardage', 'difficulty', 'is_free', 'rating'
+        ).order_by().iterator(chunk_size=5000)
+        return cls(get_catalog_version() if version is None else version, rows)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rank(self, yards, limit=None, difficulty=None, free_only=False, allowed_ids=None):
+        """
+        Ранжирует схемы для доступного метража {код толщины: ярды}.
+
+        Args:
+            limit: сколько лучших схем вернуть (None - все подходящие)
+            difficulty: только схемы этой сложности
+            free_only: только бесплатные
+            allowed_ids: множество id, которыми ограничить выдачу (поиск)
+
+        Returns:
+            список (оценка, id схемы) по убыванию оценки
+        """
+        difficulty_code = DIFFICULTY_CODES.get(difficulty) if difficulty else None
+        if difficulty and difficulty_code is None:
+            return []
+
+        ids, yardage, base = self.ids, self.yardage, self.base
+        difficulties, is_free = self.difficulty, self.is_free
+        heap = []
+        scored = []
+
+        for code, (weight_score, available) in candidate_codes(yards).items():
+            positions = self.by_code.get(code)
+            if not positions:
+                continue
+            fixed = W_WEIGHT * weight_score
+            for position in positions:
+                if limit and len(heap) == limit and fixed + W_YARDAGE + base[position] <= heap[0][0]:
+                    # Дальше по этой толщине оценки только ниже
+                    break
+                if difficulty_code is not None and difficulties[position] != difficulty_code:
+                    continue
+                if free_only and not is_free[position]:
+                    continue
+                pattern_id = ids[position]
+                if allowed_ids is not None and pattern_id not in allowed_ids:
+                    continue
+
+                required = yardage[position]
+                fit = min(1.0, available / required) if required > 0 else UNKNOWN_YARDAGE_FIT
+                item = (fixed + W_YARDAGE * fit + base[position], pattern_id)
+
+                if not limit:
+                    scored.append(item)
+                elif len(heap) < limit:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        if limit:
+            return sorted(heap, reverse=True)
+        scored.sort(reverse=True)
+        return scored
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_match_engine():
+    """
+    Движок для текущей версии каталога.
+
+    Как и снимок каталога (snapshot.get_catalog_snapshot), новый движок
+    строит один поток; остальные тем временем ранжируют по предыдущему
+    и ждут только при самом первом построении.
+    """
+    global _engine
+    version = get_catalog_version()
+    engine = _engine
+    if engine is not None and engine.version == version:
+        return engine
+
+    if not _engine_lock.acquire(blocking=engine is None):
+        return engine
+    try:
+        if _engine is None or _engine.version != version:
+            _engine = MatchEngine.build(version)
+        return _engine
+    finally:
+        _engine_lock.release()
+
+
+def rank_pattern_ids(yards, limit=None, **filters):
+    """id схем, подходящих к доступному метражу, по убыванию оценки"""
+    if not yards:
+        return []
+    return [pattern_id for _, pattern_id in get_match_engine().rank(yards, limit, **filters)]
+
+
+def rank_for_user(user, limit=None, **filters):
+    """Подбор схем под все запасы пользователя"""
+    summary = UserStashSummary.for_user(user)
+    return rank_pattern_ids(stash_yards(summary.by_type), limit, **filters)
+
+
+def rank_for_yarn(yarn, limit=None, **filters):
+    """Подбор схем под одну позицию пряжи"""
+    return rank_pattern_ids(yarn_yards(yarn), limit, **filters)
+
+
+def patterns_by_ids(pattern_ids):
+    """Схемы в порядке pattern_ids (удаленные после построения движка пропускаются)"""
+    patterns = Pattern.objects.in_bulk(pattern_ids)
+    return [patterns[pattern_id] for pattern_id in pattern_ids if pattern_id in patterns]
@@ -0,0 +1,240 @@
+# metrics.py
+import os
+import socket
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+WORKERS_KEY = 'metrics:workers'
+RAVELRY_VIEW = 'ravelry_api'
+
+_local = threading.local()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def metrics_enabled():
+    return _setting('METRICS_ENABLED', True)
+
+
+class RequestStats:
+    """Счетчики одного запроса: SQL и вызовы Ravelry"""
+    __slots__ = ('queries', 'db_time', 'duplicates', 'duplicate_sql',
+                 'ravelry_calls', 'ravelry_time', '_seen')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.duplicates = 0
+        self.duplicate_sql = None
+        self.ravelry_calls = 0
+        self.ravelry_time = 0.0
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка connection.execute_wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            try:
+                key = (sql, tuple(params) if params else ())
+                hash(key)
+            except TypeError:
+                key = (sql, repr(params))
+            if key in self._seen:
+                self.duplicates += 1
+                self.duplicate_sql = sql
+            else:
+                self._seen.add(key)
+
+
+class ViewMetrics:
+    """Скользящее окно последних запросов к одному view"""
+
+    def __init__(self, window):
+        self.wall = deque(maxlen=window)
+        self.queries = deque(maxlen=window)
+        self.db_time = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.duplicates = 0
+        self.duplicate_sql = ''
+        self.ravelry_calls = 0
+        self.ravelry_time = 0.0
+
+    def record(self, wall, stats=None, error=False):
+        self.requests += 1
+        self.errors += error
+        self.wall.append(wall)
+        if stats is not None:
+            self.queries.append(stats.queries)
+            self.db_time.append(stats.db_time)
+            self.duplicates += stats.duplicates
+            if stats.duplicate_sql:
+                self.duplicate_sql = stats.duplicate_sql[:300]
+            self.ravelry_calls += stats.ravelry_calls
+            self.ravelry_time += stats.ravelry_time
+
+    def export(self):
+        return {
+            'wall': list(self.wall),
+            'queries': list(self.queries),
+            'db_time': list(self.db_time),
+            'requests': self.requests,
+            'errors': self.errors,
+            'duplicates': self.duplicates,
+            'duplicate_sql': self.duplicate_sql,
+            'ravelry_calls': self.ravelry_calls,
+            'ravelry_time': self.ravelry_time,
+        }
+
+
+class MetricsRegistry:
+    """Метрики процесса; периодически сбрасываются в общий кэш"""
+
+    def __init__(self):
+        self.views = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.worker_key = f'metrics:worker:{socket.gethostname()}:{os.getpid()}'
+
+    def _view(self, name):
+        metrics = self.views.get(name)
+        if metrics is None:
+            with self.lock:
+                metrics = self.views.setdefault(name, ViewMetrics(_setting('METRICS_WINDOW', 500)))
+        return metrics
+
+    def record(self, name, wall, stats=None, error=False):
+        metrics = self._view(name)
+        with self.lock:
+            metrics.record(wall, stats, error)
+        if time.monotonic() - self.last_flush >= _setting('METRICS_FLUSH_INTERVAL', 30):
+            self.flush()
+
+    def export(self):
+        with self.lock:
+            return {name: metrics.export() for name, metrics in self.views.items()}
+
+    def flush(self):
+        """Сохраняет окно процесса в кэш, чтобы отчет видел все воркеры"""
+        self.last_flush = time.monotonic()
+        timeout = _setting('METRICS_FLUSH_INTERVAL', 30) * 20
+        cache.set(self.worker_key, self.export(), timeout)
+        workers = cache.get(WORKERS_KEY) or []
+        if self.worker_key not in workers:
+            cache.set(WORKERS_KEY, workers[-50:] + [self.worker_key], None)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+registry = MetricsRegistry()
+
+
+def record_ravelry_call(duration, error=False):
+    """Вызов Ravelry API: в общие метрики и в счетчики текущего запроса"""
+    if not metrics_enabled():
+        return
+    registry.record(RAVELRY_VIEW, duration, error=error)
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.ravelry_calls += 1
+        stats.ravelry_time += duration
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, число и время SQL-запросов, повторяющиеся запросы и
+    вызовы Ravelry по каждому view (settings.METRICS_ENABLED).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_enabled():
+            return self.get_response(request)
+
+        stats = RequestStats()
+        _local.stats = stats
+        for alias in connections:
+            connections[alias].execute_wrappers.append(stats)
+        started = time.perf_counter()
+        error = True
+        try:
+            response = self.get_response(request)
+            error = response.status_code >= 500
+            return response
+        finally:
+            wall = time.perf_counter() - started
+            for alias in connections:
+                wrappers = connections[alias].execute_wrappers
+                if stats in wrappers:
+                    wrappers.remove(stats)
+            _local.stats = None
+            match = getattr(request, 'resolver_match', None)
+            registry.record(match.view_name if match else 'unresolved', wall, stats, error)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _merge(exports):
+    merged = {}
+    for export in exports:
+        for name, data in export.items():
+            target = merged.setdefault(name, {
+                'wall': [], 'queries': [], 'db_time': [], 'requests': 0, 'errors': 0,
+                'duplicates': 0, 'duplicate_sql': '', 'ravelry_calls': 0, 'ravelry_time': 0.0,
+            })
+            for field in ('wall', 'queries', 'db_time'):
+                target[field].extend(data[field])
+            for field in ('requests', 'errors', 'duplicates', 'ravelry_calls', 'ravelry_time'):
+                target[field] += data[field]
+            target['duplicate_sql'] = data['duplicate_sql'] or target['duplicate_sql']
+    return merged
+
+
+def report():
+    """
+    Сводка по всем воркерам: перцентили времени ответа (мс), SQL-запросы,
+    время БД, повторы запросов и вызовы Ravelry для каждого view.
+    """
+    registry.flush()
+    workers = cache.get(WORKERS_KEY) or []
+    exports = [export for export in cache.get_many(workers).values() if export]
+
+    result = {}
+    for name, data in _merge(exports).items():
+        wall, queries, db_time = data['wall'], data['queries'], data['db_time']
+        samples = len(queries) or 1
+        result[name] = {
+            'requests': data['requests'],
+            'errors': data['errors'],
+            'p50_ms': round(_percentile(wall, 50) * 1000, 2),
+            'p95_ms': round(_percentile(wall, 95) * 1000, 2),
+            'p99_ms': round(_percentile(wall, 99) * 1000, 2),
+            'avg_queries': round(sum(queries) / samples, 1),
+            'max_queries': max(queries, default=0),
+            'p95_db_ms': round(_percentile(db_time, 95) * 1000, 2),
+            'duplicate_queries': data['duplicates'],
+            'duplicate_sql': data['duplicate_sql'],
+            'ravelry_calls': data['ravelry_calls'],
+            'ravelry_ms': round(data['ravelry_time'] * 1000, 1),
+        }
+    return result
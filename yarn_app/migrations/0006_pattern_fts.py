@@ -0,0 +1,66 @@
+from django.db import migrations
+
+FTS_COLUMNS = 'name, author, description, category'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS yarn_app_pattern_fts USING fts5(
+        {FTS_COLUMNS},
+        content='yarn_app_pattern',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS yarn_app_pattern_fts_ai AFTER INSERT ON yarn_app_pattern BEGIN
+        INSERT INTO yarn_app_pattern_fts(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.name, new.author, new.description, new.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS yarn_app_pattern_fts_ad AFTER DELETE ON yarn_app_pattern BEGIN
+        INSERT INTO yarn_app_pattern_fts(yarn_app_pattern_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.name, old.author, old.description, old.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS yarn_app_pattern_fts_au
+    AFTER UPDATE OF {FTS_COLUMNS} ON yarn_app_pattern BEGIN
+        INSERT INTO yarn_app_pattern_fts(yarn_app_pattern_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.name, old.author, old.description, old.category);
+        INSERT INTO yarn_app_pattern_fts(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.name, new.author, new.description, new.category);
+    END
+    """,
+    # Индексируем уже существующие схемы
+    "INSERT INTO yarn_app_pattern_fts(yarn_app_pattern_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS yarn_app_pattern_fts_ai",
+    "DROP TRIGGER IF EXISTS yarn_app_pattern_fts_ad",
+    "DROP TRIGGER IF EXISTS yarn_app_pattern_fts_au",
+    "DROP TABLE IF EXISTS yarn_app_pattern_fts",
+]
+
+
+def run_sql(statements):
+    def apply(apps, schema_editor):
+        # FTS5 есть только в SQLite, на других БД поиск работает через icontains
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0005_refreshjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sql(CREATE_SQL), run_sql(DROP_SQL)),
+    ]
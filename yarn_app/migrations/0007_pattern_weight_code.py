@@ -0,0 +1,48 @@
+# Generated by Django 4.2.10 on 2026-10-17 17:22
+
+import re
+
+from django.db import migrations, models
+
+# Копия сопоставления из models.py на момент миграции: миграция не должна
+# зависеть от того, как код толщины считается в будущих версиях модели
+WEIGHT_CODES = {
+    'lace', 'light fingering', 'fingering', 'sport', 'dk',
+    'worsted', 'aran', 'bulky', 'super bulky', 'jumbo',
+}
+
+
+def normalize_yarn_weight(yarn_weight):
+    if not yarn_weight:
+        return ''
+    name = re.sub(r'\s*\(.*?\)', '', yarn_weight).strip().lower()
+    return name if name in WEIGHT_CODES else 'other'
+
+
+def backfill_weight_codes(apps, schema_editor):
+    Pattern = apps.get_model('yarn_app', 'Pattern')
+    batch = []
+    for pattern in Pattern.objects.only('id', 'yarn_weight').iterator(chunk_size=2000):
+        pattern.weight_code = normalize_yarn_weight(pattern.yarn_weight)
+        batch.append(pattern)
+        if len(batch) >= 2000:
+            Pattern.objects.bulk_update(batch, ['weight_code'])
+            batch = []
+    if batch:
+        Pattern.objects.bulk_update(batch, ['weight_code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0006_pattern_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pattern',
+            name='weight_code',
+            field=models.CharField(blank=True, db_index=True, max_length=20, verbose_name='Код толщины пряжи'),
+        ),
+        migrations.RunPython(backfill_weight_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-17 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0007_pattern_weight_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pattern',
+            name='weight_code',
+            field=models.CharField(blank=True, max_length=20, verbose_name='Код толщины пряжи'),
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['-rating', '-created_at'], name='pattern_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['difficulty', '-rating', '-created_at'], name='pattern_difficulty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['is_free', '-rating', '-created_at'], name='pattern_free_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['weight_code', '-rating'], name='pattern_weight_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['-created_at'], name='pattern_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', '-created_at'], name='project_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useryarn',
+            index=models.Index(fields=['user', '-created_at'], name='useryarn_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-17 17:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('yarn_app', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStashSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('by_type', models.JSONField(blank=True, default=dict)),
+                ('total_yarns', models.IntegerField(default=0)),
+                ('total_motki', models.IntegerField(default=0)),
+                ('total_weight', models.IntegerField(default=0)),
+                ('colors_count', models.IntegerField(default=0)),
+                ('types_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stash_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-17 17:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('yarn_app', '0009_userstashsummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='refreshjob',
+            name='kind',
+            field=models.CharField(choices=[('ravelry', 'Загрузка из Ravelry'), ('simple', 'Тестовые схемы'), ('force', 'Полная перезагрузка'), ('recommendations', 'Пересчет рекомендаций')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='UserRecommendations',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pattern_ids', models.JSONField(blank=True, default=list)),
+                ('stash_version', models.DateTimeField(blank=True, null=True)),
+                ('favorites_digest', models.CharField(blank=True, max_length=32)),
+                ('catalog_stamp', models.JSONField(blank=True, default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
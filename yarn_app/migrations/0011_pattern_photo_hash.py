@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0010_userrecommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pattern',
+            name='photo_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Хэш фото'),
+        ),
+    ]
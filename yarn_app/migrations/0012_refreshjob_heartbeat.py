@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0011_pattern_photo_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshjob',
+            name='attempts',
+            field=models.IntegerField(default=0, verbose_name='Запусков'),
+        ),
+        migrations.AddField(
+            model_name='refreshjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний сигнал воркера'),
+        ),
+    ]
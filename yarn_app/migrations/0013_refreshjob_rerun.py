@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0012_refreshjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshjob',
+            name='rerun',
+            field=models.BooleanField(default=False, verbose_name='Повторить после выполнения'),
+        ),
+    ]
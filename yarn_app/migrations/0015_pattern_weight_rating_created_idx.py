@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0014_versioncounter'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pattern',
+            name='pattern_weight_rating_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['weight_code', '-rating', '-created_at'], name='pattern_weight_rating_idx'),
+        ),
+    ]
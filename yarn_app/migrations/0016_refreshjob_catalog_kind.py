@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0015_pattern_weight_rating_created_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='refreshjob',
+            name='kind',
+            field=models.CharField(choices=[('ravelry', 'Загрузка из Ravelry'), ('catalog', 'Массовая загрузка каталога Ravelry'), ('simple', 'Тестовые схемы'), ('force', 'Полная перезагрузка'), ('recommendations', 'Пересчет рекомендаций')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0016_refreshjob_catalog_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userrecommendations',
+            name='dirty_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.10 on 2026-10-17 19:05
+
+import re
+
+from django.db import migrations
+from django.db.models import F
+
+# Копия сопоставления из models.py на момент миграции (см. 0007)
+WEIGHT_CODES = {
+    'lace', 'light fingering', 'fingering', 'sport', 'dk',
+    'worsted', 'aran', 'bulky', 'super bulky', 'jumbo',
+}
+
+
+def normalize_yarn_weight(yarn_weight):
+    if not yarn_weight:
+        return ''
+    name = re.sub(r'\s*\(.*?\)', '', yarn_weight).strip().lower()
+    for part in name.split('/'):
+        if part.strip() in WEIGHT_CODES:
+            return part.strip()
+    return 'other'
+
+
+def recode_compound_weights(apps, schema_editor):
+    """Составные толщины ("DK / Sport") были 'other' - код первой части"""
+    Pattern = apps.get_model('yarn_app', 'Pattern')
+    VersionCounter = apps.get_model('yarn_app', 'VersionCounter')
+    batch = []
+    compound = Pattern.objects.filter(weight_code='other', yarn_weight__contains='/')
+    for pattern in compound.only('id', 'yarn_weight').iterator(chunk_size=2000):
+        pattern.weight_code = normalize_yarn_weight(pattern.yarn_weight)
+        if pattern.weight_code != 'other':
+            batch.append(pattern)
+    Pattern.objects.bulk_update(batch, ['weight_code'], batch_size=2000)
+    if batch:
+        # Снимки каталога, движок подбора и рекомендации перестраиваются
+        VersionCounter.objects.filter(key__startswith='catalog:version').update(value=F('value') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yarn_app', '0017_userrecommendations_dirty_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(recode_compound_weights, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,70 @@
-from django.db import models
+import re
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+# Канонические коды толщины пряжи и соответствующие названия Ravelry
+YARN_WEIGHT_CODES = {
+    'lace': 'Lace',
+    'light fingering': 'Light Fingering',
+    'fingering': 'Fingering',
+    'sport': 'Sport',
+    'dk': 'DK',
+    'worsted': 'Worsted',
+    'aran': 'Aran',
+    'bulky': 'Bulky',
+    'super bulky': 'Super Bulky',
+    'jumbo': 'Jumbo',
+}
+_RAVELRY_WEIGHT_TO_CODE = {name.lower(): code for code, name in YARN_WEIGHT_CODES.items()}
+
+
+def normalize_yarn_weight(yarn_weight):
+    """
+    Приводит название толщины Ravelry ("DK (11 wpi)", "Light Fingering")
+    к каноническому коду. Составные толщины ("DK / Sport", "Aran / Worsted")
+    получают код первой известной части. Неизвестные значения - 'other',
+    пустые - ''.
+    """
+    if not yarn_weight:
+        return ''
+    name = re.sub(r'\s*\(.*?\)', '', yarn_weight).strip().lower()
+    for part in name.split('/'):
+        code = _RAVELRY_WEIGHT_TO_CODE.get(part.strip())
+        if code:
+            return code
+    return 'other'
+
+
+def thumbnail_url(photo_hash, size):
+    """
+    URL локальной миниатюры фото ('card' или 'detail') по хэшу содержимого.
+    Повторяет раскладку файлов в THUMBNAIL_ROOT, чтобы веб-сервер отдавал
+    их напрямую.
+    """
+    return f'{settings.THUMBNAIL_URL}{photo_hash[:2]}/{photo_hash}-{size}.webp'
+
+class UserYarnQuerySet(models.QuerySet):
+    """Расчеты по пряже выполняются в SQL, а не в цикле Python"""
+    
+    def with_total_weight(self):
+        """Добавляет weight_total = amount * weight (0, если вес не указан)"""
+        return self.annotate(weight_total=Coalesce(F('amount') * F('weight'), 0))
+    
+    def stash_stats(self):
+        """Статистика запасов одним запросом"""
+        return self.aggregate(
+            total_yarns=Count('id'),
+            total_motki=Coalesce(Sum('amount'), 0),
+            total_weight=Coalesce(Sum(F('amount') * F('weight')), 0),
+            colors_count=Count('color', distinct=True),
+            types_count=Count('yarn_type', distinct=True),
+        )
+
 
 class UserYarn(models.Model):
     YARN_TYPES = [
@@ -21,9 +86,20 @@ class UserYarn(models.Model):
     notes = models.TextField(blank=True, null=True, verbose_name="Примечания")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = UserYarnQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Список пряжи пользователя (my_yarn)
+            models.Index(fields=['user', '-created_at'], name='useryarn_user_created_idx'),
+        ]
+    
     @property
     def total_weight(self):
         """Возвращает общий вес всех мотков этой пряжи"""
+        # Уже посчитан в SQL через with_total_weight()
+        if 'weight_total' in self.__dict__:
+            return self.weight_total
         if self.weight:
             return self.amount * self.weight
         return 0
@@ -38,7 +114,12 @@ class Pattern(models.Model):
     ravelry_id = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=200)
     yarn_weight = models.CharField(max_length=50)
+    weight_code = models.CharField(max_length=20, blank=True,
+                                   verbose_name="Код толщины пряжи")
     photo_url = models.URLField(blank=True)
+    # sha256 исходного фото; пусто - миниатюры еще не сделаны (thumbnails.py)
+    photo_hash = models.CharField(max_length=64, blank=True, default='',
+                                  verbose_name="Хэш фото")
     source = models.CharField(max_length=20, default='ravelry')
     pattern_url = models.URLField(blank=True, verbose_name="Ссылка на схему")
     difficulty = models.CharField(max_length=20, blank=True, 
@@ -62,10 +143,24 @@ class Pattern(models.Model):
     
     class Meta:
         ordering = ['-rating']
+        indexes = [
+            # Каталог: сортировка по рейтингу и фильтры сложность/бесплатные
+            models.Index(fields=['-rating', '-created_at'], name='pattern_rating_idx'),
+            models.Index(fields=['difficulty', '-rating', '-created_at'], name='pattern_difficulty_idx'),
+            models.Index(fields=['is_free', '-rating', '-created_at'], name='pattern_free_idx'),
+            # Подбор по толщине пряжи
+            models.Index(fields=['weight_code', '-rating', '-created_at'], name='pattern_weight_rating_idx'),
+            # Новые схемы (projects, load_more_patterns)
+            models.Index(fields=['-created_at'], name='pattern_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        self.weight_code = normalize_yarn_weight(self.yarn_weight)
+        super().save(*args, **kwargs)
+    
     @property
     def difficulty_display(self):
         difficulty_dict = {
@@ -86,6 +181,15 @@ class Pattern(models.Model):
             'experienced': 4
         }
         return mapping.get(self.difficulty, 1)
+    
+    @property
+    def card_photo_url(self):
+        """Фото для карточки: локальная миниатюра, пока ее нет - исходное фото"""
+        return thumbnail_url(self.photo_hash, 'card') if self.photo_hash else self.photo_url
+    
+    @property
+    def detail_photo_url(self):
+        return thumbnail_url(self.photo_hash, 'detail') if self.photo_hash else self.photo_url
 
 
 class Project(models.Model):
@@ -108,11 +212,25 @@ class Project(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='project_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.get_status_display()})"
 
 
+class ProjectYarnQuerySet(models.QuerySet):
+    """Итоги по использованной в проектах пряже считаются в SQL"""
+    
+    def used_stats(self):
+        """Использованные мотки и граммы одним запросом"""
+        return self.aggregate(
+            total_motki=Coalesce(Sum('amount_used'), 0),
+            total_weight=Coalesce(Sum(F('amount_used') * F('user_yarn__weight')), 0),
+        )
+
+
 class ProjectYarn(models.Model):
     """Связь проекта с используемой пряжей"""
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='project_yarns')
@@ -120,6 +238,8 @@ class ProjectYarn(models.Model):
     amount_used = models.IntegerField(verbose_name="Использовано мотков")
     notes = models.TextField(blank=True, verbose_name="Примечания по использованию")
     
+    objects = ProjectYarnQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['project', 'user_yarn']
 
@@ -133,4 +253,186 @@ class Favorite(models.Model):
         unique_together = ['user', 'pattern']
     
     def __str__(self):
-        return f"{self.user.username} - {self.pattern.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.pattern.name}"
+
+class RefreshJob(models.Model):
+    """Фоновая задача обновления схем (очередь в БД)"""
+    KIND_CHOICES = [
+        ('ravelry', 'Загрузка из Ravelry'),
+        ('catalog', 'Массовая загрузка каталога Ravelry'),
+        ('simple', 'Тестовые схемы'),
+        ('force', 'Полная перезагрузка'),
+        ('recommendations', 'Пересчет рекомендаций'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+    ACTIVE_STATUSES = ['queued', 'running']
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    count = models.IntegerField(default=6, verbose_name="Количество схем")
+    progress = models.IntegerField(default=0, verbose_name="Прогресс (%)")
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Не раньше")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Воркер обновляет во время выполнения; давно не обновлялось - воркер умер
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Последний сигнал воркера")
+    attempts = models.IntegerField(default=0, verbose_name="Запусков")
+    # Во время выполнения пришел новый запрос: после завершения нужен еще проход
+    rerun = models.BooleanField(default=False, verbose_name="Повторить после выполнения")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Одновременно может быть только одна активная задача каждого типа,
+            # повторные запросы присоединяются к ней
+            models.UniqueConstraint(
+                fields=['kind'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_refresh_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='refreshjob_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.get_status_display()})"
+    
+    def as_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'attempts': self.attempts,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class UserStashSummary(models.Model):
+    """Сводка по запасам пряжи пользователя (обновляется сигналами)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stash_summary')
+    # {'dk': {'yarns': 2, 'skeins': 5, 'grams': 500}, ...}
+    by_type = models.JSONField(default=dict, blank=True)
+    total_yarns = models.IntegerField(default=0)
+    total_motki = models.IntegerField(default=0)
+    total_weight = models.IntegerField(default=0)
+    colors_count = models.IntegerField(default=0)
+    types_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Сводка {self.user.username}: {self.total_yarns} пряж"
+    
+    def as_stats(self):
+        return {
+            'total_yarns': self.total_yarns,
+            'total_motki': self.total_motki,
+            'total_weight': self.total_weight,
+            'colors_count': self.colors_count,
+            'types_count': self.types_count,
+        }
+    
+    @classmethod
+    def rebuild(cls, user_id):
+        """
+        Пересчитывает сводку пользователя по таблице UserYarn.
+
+        Подсчет и запись - в одной транзакции, которая начинается с записи
+        (INSERT, пропускаемого при существующей сводке) и строки сводки
+        под select_for_update: параллельный пересчет ждет коммита этого и
+        считает уже по новым данным, поэтому более старый подсчет не может
+        записаться последним. В SQLite первая запись берет блокировку записи
+        (с ожиданием busy_timeout) и при обычном BEGIN.
+        """
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(user_id=user_id)], ignore_conflicts=True)
+            summary = cls.objects.select_for_update().get(user_id=user_id)
+
+            yarns = UserYarn.objects.filter(user_id=user_id)
+            rows = yarns.values('yarn_type').annotate(
+                yarns=Count('id'),
+                skeins=Coalesce(Sum('amount'), 0),
+                grams=Coalesce(Sum(F('amount') * F('weight')), 0),
+            ).order_by()
+            summary.by_type = {
+                row['yarn_type']: {'yarns': row['yarns'], 'skeins': row['skeins'], 'grams': row['grams']}
+                for row in rows
+            }
+            for field, value in yarns.stash_stats().items():
+                setattr(summary, field, value)
+            summary.save()
+        return summary
+    
+    @classmethod
+    def for_user(cls, user):
+        """Сводка пользователя; создается при первом обращении"""
+        summary = cls.objects.filter(user=user).first()
+        if summary is None:
+            summary = cls.rebuild(user.id)
+        return summary
+
+
+class UserRecommendations(models.Model):
+    """Готовые рекомендации схем для пользователя (пересчитываются в фоне)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='recommendations')
+    pattern_ids = models.JSONField(default=list, blank=True)
+    # Версии входных данных, по которым посчитаны рекомендации
+    stash_version = models.DateTimeField(null=True, blank=True)
+    favorites_digest = models.CharField(max_length=32, blank=True)
+    catalog_stamp = models.JSONField(default=dict, blank=True)
+    # Запасы или избранное изменились после расчета (recommendations.mark_dirty)
+    dirty_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Рекомендации {self.user.username}: {len(self.pattern_ids)} схем"
+
+
+class VersionCounter(models.Model):
+    """
+    Счетчик версии производных данных: каталога, толщины в каталоге,
+    избранного пользователя. Хранится в БД, а не в кэше: файловый кэш
+    вытесняет записи при переполнении и увеличивает счетчик не атомарно.
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name='Ключ')
+    value = models.BigIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='Изменен')
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
+
+    @classmethod
+    def get_many(cls, keys):
+        """{ключ: версия} для существующих счетчиков"""
+        return dict(cls.objects.filter(key__in=keys).values_list('key', 'value'))
+
+    @classmethod
+    def bump(cls, key, initial=0):
+        """
+        Увеличивает счетчик одним UPDATE value = value + 1 (атомарно для
+        параллельных процессов) и возвращает новое значение. Отсутствующий
+        счетчик создается со значением initial - тем, что читатели
+        подставляли для него до сих пор.
+        """
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(key=key, value=initial)], ignore_conflicts=True)
+            cls.objects.filter(key=key).update(value=F('value') + 1, updated_at=timezone.now())
+            return cls.objects.filter(key=key).values_list('value', flat=True).get()
@@ -0,0 +1,72 @@
+# pagination.py
+import base64
+import hashlib
+import json
+from django.core.cache import cache
+
+# Порядок каталога: рейтинг, дата добавления, id (id делает ключ уникальным)
+CATALOG_ORDERING = ('-rating', '-created_at', '-id')
+NEWEST_ORDERING = ('-created_at', '-id')
+
+APPROX_COUNT_TIMEOUT = 300
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или получен для другой сортировки"""
+
+
+def page_size(value, default, maximum=MAX_PAGE_SIZE):
+    """
+    Размер страницы из параметра запроса, приведенный к 1..maximum.
+    Не число - ValueError (ответ 400, как для плохого курсора).
+    """
+    if value in (None, ''):
+        return default
+    return max(1, min(int(value), maximum))
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Некорректный курсор') from e
+
+
+def offset_page(queryset, cursor=None, limit=12):
+    """
+    Страница по смещению внутри курсора - для выдачи, отсортированной
+    по релевантности поиска, где ключа сортировки в модели нет.
+
+    Ограничение: страница N стоит O(найденных схем), а не O(limit).
+    Ранжирование bm25 и так сортирует все совпадения на каждый запрос,
+    поэтому курсор по ключу (rank, ...) не избавил бы от этой работы,
+    только от пропуска OFFSET строк после сортировки. Для каталога без
+    поиска страницы по ключу отдает CatalogSnapshot.page.
+    """
+    offset = 0
+    if cursor:
+        data = decode_cursor(cursor)
+        if not isinstance(data, dict) or not isinstance(data.get('n'), int):
+            raise InvalidCursor('Курсор получен для другой сортировки')
+        offset = max(0, data['n'])
+
+    items = list(queryset[offset:offset + limit + 1])
+    if len(items) <= limit:
+        return items, None
+    return items[:limit], encode_cursor({'n': offset + limit})
+
+
+def approximate_count(queryset, cache_key_parts):
+    """
+    Приблизительное количество строк из кэша: COUNT(*) выполняется
+    не чаще раза в APPROX_COUNT_TIMEOUT секунд для одного набора фильтров.
+    """
+    digest = hashlib.md5(json.dumps(cache_key_parts, sort_keys=True).encode()).hexdigest()
+    return cache.get_or_set(f'pattern_count:{digest}', queryset.count, APPROX_COUNT_TIMEOUT)
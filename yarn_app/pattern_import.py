@@ -0,0 +1,362 @@
+# pattern_import.py
+import logging
+import random
+import time
+from django.conf import settings
+from django.db import transaction
+from .catalog import bump_catalog_version
+from .log import fields as log_fields, sampled
+from .models import Pattern, normalize_yarn_weight
+from .serializers import pattern_summary
+from .thumbnails import generate_thumbnails
+from .ravelry_api import get_ravelry_client
+
+# Поля, которые обновляются у уже сохраненной схемы при повторном импорте
+UPDATE_FIELDS = [
+    'name', 'author', 'yarn_weight', 'weight_code', 'difficulty', 'is_free',
+    'rating', 'pattern_url', 'photo_url', 'yardage',
+]
+
+# SQLite ограничивает число параметров в одном запросе
+IN_QUERY_CHUNK = 900
+
+logger = logging.getLogger(__name__)
+
+
+def convert_difficulty(rating):
+    """Конвертирует рейтинг сложности Ravelry в значение модели"""
+    rating = rating or 0
+    if rating <= 1.5:
+        return 'beginner'
+    elif rating <= 2.5:
+        return 'easy'
+    elif rating <= 3.5:
+        return 'intermediate'
+    else:
+        return 'experienced'
+
+
+def get_best_photo_url(photo_data):
+    """
+    Возвращает URL фото максимального качества - источник для локальных
+    миниатюр (thumbnails.py); в карточки большое фото не отдается.
+    """
+    if not isinstance(photo_data, dict):
+        return ''
+
+    # Порядок приоритета: от лучшего к худшему
+    quality_order = [
+        'large2_url',    # 1024x1024 (лучшее)
+        'large_url',     # 600x600
+        'medium2_url',   # 500x500
+        'medium_url',    # 300x300 (минимально приемлемое)
+        'small_url',     # 150x150 (плохое)
+        'square_url',    # 75x75 (очень плохое)
+        'thumbnail_url', # миниатюра
+    ]
+
+    for quality in quality_order:
+        url = photo_data.get(quality)
+        if url and isinstance(url, str) and url.startswith('http'):
+            return url
+
+    # Если ничего не нашли
+    return ''
+
+
+def create_ravelry_url(pattern_data, ravelry_id):
+    """Создает правильный URL для схемы на Ravelry"""
+    permalink = pattern_data.get('permalink')
+
+    if permalink and isinstance(permalink, str):
+        permalink = permalink.strip()
+
+        # Если это уже полный URL
+        if permalink.startswith('http'):
+            return permalink
+
+        # Если это путь Ravelry (начинается с /patterns/)
+        if permalink.startswith('/'):
+            return f'https://www.ravelry.com{permalink}'
+
+        # Путь без ведущего слэша
+        if '/' in permalink:
+            return f'https://www.ravelry.com/{permalink}'
+
+        # Просто slug (например "ultimate-mittens")
+        return f'https://www.ravelry.com/patterns/library/{permalink}'
+
+    if ravelry_id:
+        return f'https://www.ravelry.com/patterns/library/{ravelry_id}'
+
+    # Запасной вариант
+    return 'https://www.ravelry.com/patterns/search'
+
+
+def pattern_yardage(pattern_data):
+    """
+    Метраж схемы (ярды) из ответа Ravelry: yardage - для наименьшего
+    размера, yardage_max - для наибольшего. 0 - метраж неизвестен.
+    """
+    for key in ('yardage', 'yardage_max'):
+        try:
+            yardage = int(pattern_data.get(key) or 0)
+        except (TypeError, ValueError):
+            continue
+        if yardage > 0:
+            return yardage
+    return 0
+
+
+def sample_yardage(ravelry_id):
+    """Метраж тестовой схемы: постоянный для одного ravelry_id"""
+    return random.Random(ravelry_id).randrange(150, 1600, 50)
+
+
+def pattern_fields_from_ravelry(pattern_data):
+    """
+    Преобразует схему из ответа Ravelry в поля модели Pattern.
+    Возвращает None, если данных недостаточно.
+    """
+    if not isinstance(pattern_data, dict):
+        return None
+
+    name = pattern_data.get('name')
+    ravelry_id = pattern_data.get('id')
+    if not name or not ravelry_id:
+        return None
+
+    designer_data = pattern_data.get('designer', {})
+    author = designer_data.get('name', 'Неизвестно') if isinstance(designer_data, dict) else 'Неизвестно'
+
+    yarn_weight_data = pattern_data.get('yarn_weight', {})
+    yarn_weight = yarn_weight_data.get('name', '') if isinstance(yarn_weight_data, dict) else ''
+
+    rating_data = pattern_data.get('rating', {})
+    rating = rating_data.get('average', 0) if isinstance(rating_data, dict) else 0
+
+    return {
+        'ravelry_id': str(ravelry_id),
+        'name': name[:200],
+        'author': (author or 'Неизвестно')[:200],
+        'yarn_weight': (yarn_weight or '')[:50],
+        'weight_code': normalize_yarn_weight(yarn_weight),
+        'difficulty': convert_difficulty(pattern_data.get('difficulty_average', 0)),
+        'is_free': bool(pattern_data.get('free', False)),
+        'rating': rating or 0,
+        'pattern_url': create_ravelry_url(pattern_data, ravelry_id),
+        'photo_url': get_best_photo_url(pattern_data.get('first_photo', {})),
+        'yardage': pattern_yardage(pattern_data),
+        'craft': 'knitting',
+        'source': 'ravelry',
+    }
+
+
+def _existing_patterns(ravelry_ids):
+    """Текущие значения обновляемых полей для уже сохраненных схем"""
+    existing = {}
+    ravelry_ids = list(ravelry_ids)
+    for start in range(0, len(ravelry_ids), IN_QUERY_CHUNK):
+        chunk = ravelry_ids[start:start + IN_QUERY_CHUNK]
+        rows = Pattern.objects.filter(ravelry_id__in=chunk).values('ravelry_id', 'photo_hash', *UPDATE_FIELDS)
+        for row in rows:
+            existing[row.pop('ravelry_id')] = row
+    return existing
+
+
+def upsert_patterns(patterns_data):
+    """
+    Пакетно сохраняет схемы из Ravelry.
+
+    Уже существующие ravelry_id определяются запросами IN, новые и
+    изменившиеся схемы записываются одним bulk_create(update_conflicts=True)
+    в одной транзакции. Неизменившиеся и некорректные схемы пропускаются.
+
+    Returns:
+        dict: inserted, updated, skipped и ravelry_ids записанных схем
+    """
+    started = time.perf_counter()
+    incoming = {}
+    skipped = 0
+    for pattern_data in patterns_data:
+        fields = pattern_fields_from_ravelry(pattern_data)
+        if fields is None or fields['ravelry_id'] in incoming:
+            skipped += 1
+            logger.debug("Схема пропущена", extra=sampled(
+                'import.skipped', ravelry_id=pattern_data.get('id') if isinstance(pattern_data, dict) else None,
+                reason='некорректная' if fields is None else 'повтор',
+            ))
+            continue
+        incoming[fields['ravelry_id']] = fields
+
+    inserted, updated = [], []
+    with transaction.atomic():
+        existing = _existing_patterns(incoming.keys())
+
+        to_write = []
+        for ravelry_id, fields in incoming.items():
+            current = existing.get(ravelry_id)
+            if current is None:
+                inserted.append(ravelry_id)
+            elif any(current[field] != fields[field] for field in UPDATE_FIELDS):
+                updated.append(ravelry_id)
+            else:
+                skipped += 1
+                continue
+            # Миниатюры остаются, пока не сменилось исходное фото
+            keep_photo = current is not None and current['photo_url'] == fields['photo_url']
+            to_write.append(Pattern(**fields, photo_hash=current['photo_hash'] if keep_photo else ''))
+
+        if to_write:
+            Pattern.objects.bulk_create(
+                to_write,
+                update_conflicts=True,
+                unique_fields=['ravelry_id'],
+                update_fields=UPDATE_FIELDS + ['photo_hash'],
+            )
+
+    if to_write:
+        bump_catalog_version({pattern.weight_code for pattern in to_write})
+
+    logger.info("Импорт схем", extra=log_fields(
+        received=len(patterns_data), inserted=len(inserted), updated=len(updated), skipped=skipped,
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+    ))
+    return {
+        'inserted': len(inserted),
+        'updated': len(updated),
+        'skipped': skipped,
+        'ravelry_ids': inserted + updated,
+    }
+
+
+def get_random_patterns(count):
+    """Получает случайные схемы из Ravelry"""
+    # Параметры для поиска с разными запросами
+    search_queries = [
+        '',  # Пустой запрос
+        'sweater', 'shawl', 'hat', 'socks',
+        'mittens', 'scarf', 'cardigan', 'blanket',
+        'baby', 'cable', 'lace', 'colorwork'
+    ]
+
+    yarn_weights = [
+        '',  # Любая пряжа
+        'fingering', 'sport', 'dk', 'worsted', 'bulky'
+    ]
+
+    # Выбираем случайные параметры
+    query = random.choice(search_queries)
+    yarn_weight = random.choice(yarn_weights)
+    page = random.randint(1, 10)  # Берем со случайной страницы
+
+    params = {
+        'page_size': min(count, 50),
+        'page': page,
+        'craft': 'knitting'
+    }
+
+    if query:
+        params['query'] = query
+    if yarn_weight:
+        params['weight'] = yarn_weight
+
+    # Делаем запрос к API
+    data = get_ravelry_client()._make_request('patterns/search.json', params)
+
+    if not data or 'patterns' not in data:
+        return []
+
+    patterns = data.get('patterns', [])
+
+    # Перемешиваем результаты
+    random.shuffle(patterns)
+
+    return patterns[:count]
+
+
+def save_real_patterns(patterns_data, count):
+    """Сохраняет реальные схемы одним пакетом"""
+    result = upsert_patterns(patterns_data[:count])
+
+    # Новые и обновленные схемы
+    saved_patterns = Pattern.objects.filter(ravelry_id__in=result['ravelry_ids'])
+    if settings.THUMBNAILS_ENABLED and result['ravelry_ids']:
+        generate_thumbnails(saved_patterns)
+
+    if result['inserted'] or result['updated']:
+        message = f"Загружено {result['inserted']} схем, обновлено {result['updated']}"
+    else:
+        message = 'Нет новых схем'
+
+    return {
+        'message': message,
+        'patterns': [pattern_summary(pattern) for pattern in saved_patterns],
+        'inserted': result['inserted'],
+        'updated': result['updated'],
+        'skipped': result['skipped'],
+    }
+
+
+def get_pattern_url_from_ravelry(ravelry_id):
+    """Создает корректный URL для схемы на Ravelry"""
+    if not ravelry_id:
+        return '#'
+
+    # Проверяем, является ли ravelry_id числом
+    try:
+        pattern_id = int(ravelry_id)
+        return f'https://www.ravelry.com/patterns/library/{pattern_id}'
+    except (ValueError, TypeError):
+        # Если это не число (например, test_1234), используем альтернативный формат
+        return f'https://www.ravelry.com/patterns/search#pattern={ravelry_id}'
+
+
+def create_test_patterns(count):
+    """Создает тестовые схемы"""
+    yarn_weights = ['Worsted', 'DK', 'Fingering', 'Sport', 'Bulky']
+    designers = ['Nora Gaughan', 'Andrea Mowry', 'Stephen West', 'Tin Can Knits']
+    pattern_names = ['Cozy Sweater', 'Lace Shawl', 'Cable Hat', 'Colorwork Mittens']
+
+    new_patterns = {}
+    for i in range(1, count + 1):
+        ravelry_id = f"test_{i}_{random.randint(1000, 9999)}"
+        yarn_weight = random.choice(yarn_weights)
+        new_patterns[ravelry_id] = Pattern(
+            ravelry_id=ravelry_id,
+            name=f'{random.choice(pattern_names)} {i}',
+            author=random.choice(designers),
+            yarn_weight=yarn_weight,
+            weight_code=normalize_yarn_weight(yarn_weight),
+            difficulty=random.choice(['beginner', 'easy', 'intermediate']),
+            is_free=random.choice([True, False]),
+            rating=round(random.uniform(3.5, 5.0), 1),
+            yardage=sample_yardage(ravelry_id),
+            pattern_url=get_pattern_url_from_ravelry(ravelry_id),
+            photo_url='',
+            craft='knitting',
+            source='test'
+        )
+
+    with transaction.atomic():
+        taken = set(
+            Pattern.objects.filter(ravelry_id__in=new_patterns.keys())
+            .values_list('ravelry_id', flat=True)
+        )
+        Pattern.objects.bulk_create(
+            [pattern for ravelry_id, pattern in new_patterns.items() if ravelry_id not in taken]
+        )
+    bump_catalog_version({pattern.weight_code for pattern in new_patterns.values()})
+
+    created = Pattern.objects.filter(
+        ravelry_id__in=[ravelry_id for ravelry_id in new_patterns if ravelry_id not in taken]
+    )
+    test_patterns = [pattern_summary(pattern) for pattern in created]
+
+    return {
+        'message': f'Создано {len(test_patterns)} тестовых схем',
+        'patterns': test_patterns,
+        'inserted': len(test_patterns),
+        'updated': 0,
+        'skipped': count - len(test_patterns),
+    }
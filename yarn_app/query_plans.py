@@ -0,0 +1,48 @@
+# query_plans.py
+from .models import UserYarn, Pattern, Project, Favorite
+
+# Условный пользователь: план запроса не зависит от конкретного id
+USER_ID = 1
+
+# Сортировка во временном B-tree допустима только здесь: сортируется уже
+# отобранное по индексу подмножество (избранное одного пользователя), а
+# индекс по рейтингу через соединение с Favorite не применим
+ALLOWED_TEMP_SORTS = {'favorites: схемы из избранного'}
+
+
+def hot_queries():
+    """Запросы из view, которым нужен индекс"""
+    catalog = Pattern.objects.order_by('-rating', '-created_at')
+    return {
+        'api_patterns: каталог по рейтингу': catalog[:12],
+        'api_patterns: фильтр по сложности': catalog.filter(difficulty='easy')[:12],
+        'api_patterns: только бесплатные': catalog.filter(is_free=True)[:12],
+        'api_patterns: фильтр по толщине': catalog.filter(weight_code='dk')[:12],
+        'projects / load_more_patterns: новые схемы': Pattern.objects.order_by('-created_at')[:20],
+        'my_yarn: пряжа пользователя': UserYarn.objects.filter(user_id=USER_ID).order_by('-created_at'),
+        'projects: проекты пользователя': Project.objects.filter(user_id=USER_ID).order_by('-created_at'),
+        'избранное пользователя': Favorite.objects.filter(
+            user_id=USER_ID, pattern_id__in=[1, 2, 3]
+        ).values_list('pattern_id', flat=True),
+        'favorites: схемы из избранного': Pattern.objects.filter(favorite__user_id=USER_ID),
+    }
+
+
+def query_plan(cursor, queryset):
+    """Строки EXPLAIN QUERY PLAN (SQLite) для запроса QuerySet"""
+    sql, params = queryset.query.sql_with_params()
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    return cursor.fetchall()
+
+
+def full_scans(plan_rows):
+    """Строки плана с полным сканированием таблицы (без индекса)"""
+    return [
+        row[-1] for row in plan_rows
+        if row[-1].startswith('SCAN') and 'INDEX' not in row[-1]
+    ]
+
+
+def temp_sorts(plan_rows):
+    """Сортировки во временном B-tree"""
+    return [row[-1] for row in plan_rows if 'USE TEMP B-TREE' in row[-1]]
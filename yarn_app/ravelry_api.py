@@ -2,22 +2,164 @@
 import requests
 import base64
 import time
-import json
+import random
+import logging
+import math
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from .log import fields, sampled
+from .metrics import record_ravelry_call
+from .ravelry_cache import get_response_cache
 from .models import Pattern
 
+logger = logging.getLogger(__name__)
+
+class RavelryRateLimited(Exception):
+    """Запрос к Ravelry отложен: исчерпан лимит запросов"""
+    
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Лимит запросов Ravelry, повторите через {retry_after:.0f} с")
+
+
+class RateLimiter:
+    """
+    Token bucket с общим бюджетом запросов к Ravelry.
+    
+    Никогда не блокирует поток: если токенов нет или Ravelry ответил 429,
+    acquire() возвращает время ожидания, а вызывающий код откладывает работу.
+    
+    Токены - в памяти процесса: каждый веб-процесс и воркер тратит свой
+    бюджет rate, и суммарная нагрузка на Ravelry - rate, умноженный на число
+    процессов (RAVELRY_RATE_LIMIT задается с учетом этого). Пауза после 429
+    общая: она пишется в кэш, и остальные процессы тоже ждут, пока лимит
+    аккаунта не восстановится.
+    """
+    
+    BACKOFF_BASE = 2
+    BACKOFF_MAX = 300
+    # Время (time.time()), до которого все процессы не обращаются к Ravelry
+    BLOCKED_KEY = 'ravelry:blocked_until'
+    
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)          # токенов в секунду
+        self.capacity = float(capacity)  # максимальный размер пачки запросов
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._failures = 0
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+    
+    def _shared_wait(self):
+        """Сколько секунд осталось до конца паузы после 429 в любом процессе"""
+        return max(0.0, (cache.get(self.BLOCKED_KEY) or 0) - time.time())
+    
+    def acquire(self):
+        """Забирает токен. Возвращает 0 при успехе или сколько секунд ждать"""
+        shared_wait = self._shared_wait()
+        if shared_wait > 0:
+            return shared_wait
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+    
+    def record_rate_limited(self, retry_after=None):
+        """
+        Учитывает ответ 429: экспоненциальный backoff с jitter,
+        либо ровно Retry-After, если Ravelry его прислал.
+        """
+        with self._lock:
+            self._failures += 1
+            if retry_after is None:
+                delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** (self._failures - 1))
+                retry_after = delay / 2 + random.uniform(0, delay / 2)
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._tokens = 0
+            self._updated = now
+        blocked_until = time.time() + retry_after
+        if blocked_until > (cache.get(self.BLOCKED_KEY) or 0):
+            cache.set(self.BLOCKED_KEY, blocked_until, timeout=math.ceil(retry_after) + 1)
+        return retry_after
+    
+    def status(self):
+        """Текущее состояние лимитера (для мониторинга)"""
+        shared_wait = self._shared_wait()
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'tokens': round(self._tokens, 2),
+                'capacity': self.capacity,
+                'rate_per_second': self.rate,
+                'blocked_for': round(max(self._blocked_until - now, shared_wait, 0.0), 1),
+                'consecutive_429': self._failures,
+            }
+
+
+def parse_retry_after(value):
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# Общий бюджет запросов для всех клиентов процесса (токены - на процесс,
+# пауза после 429 - на все процессы, см. RateLimiter)
+ravelry_rate_limiter = RateLimiter(
+    rate=getattr(settings, 'RAVELRY_RATE_LIMIT', 5),
+    capacity=getattr(settings, 'RAVELRY_RATE_BURST', 10),
+)
+
+
 class RavelryAPI:
     """Класс для работы с реальным Ravelry API"""
     
     BASE_URL = 'https://api.ravelry.com'
+    REQUEST_TIMEOUT = 15
     
-    def __init__(self, use_personal=True):
+    def __init__(self, use_personal=True, rate_limiter=None, base_url=None):
         """
         Инициализация API
         
         Args:
             use_personal: True - использовать personal доступ, False - read-only
+            rate_limiter: RateLimiter, по умолчанию общий ravelry_rate_limiter
+            base_url: адрес API (для локального тестового сервера)
         """
+        self.rate_limiter = rate_limiter or ravelry_rate_limiter
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        
         if use_personal:
             self.username = settings.RAVELRY_USERNAME
             self.access_token = settings.RAVELRY_PERSONAL_ACCESS_TOKEN
@@ -37,15 +179,67 @@ class RavelryAPI:
         self.headers = {
             'Authorization': self.auth_header,
             'Content-Type': 'application/json',
-            'User-Agent': f'KnitMatch/1.0 (PoliaP)'
+            'User-Agent': f'KnitMatch/1.0 (PoliaP)',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
         }
         
-        print(f"🔑 Использую {self.access_type} доступ")
-        print(f"   Username: {self.username}")
+        # Общий пул соединений: один адаптер на весь клиент, поэтому
+        # TCP/TLS соединения с api.ravelry.com переиспользуются между запросами
+        self.pool_size = getattr(settings, 'RAVELRY_POOL_SIZE', 10)
+        self.max_retries = getattr(settings, 'RAVELRY_MAX_RETRIES', 3)
+        self._adapter = self._build_adapter()
+        self._local = threading.local()
+        
+        logger.info("Клиент Ravelry API создан", extra=fields(access=self.access_type, username=self.username))
+    
+    def _build_adapter(self):
+        """Создает HTTP адаптер с пулом keep-alive соединений и повторами"""
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            backoff_factor=0.5,
+            # 429 обрабатывается в _make_request, здесь только ошибки сервера
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        return HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+    
+    @property
+    def session(self):
+        """
+        Возвращает requests.Session текущего потока.
+        
+        Session не потокобезопасна (cookies, состояние заголовков), поэтому
+        у каждого потока gunicorn своя сессия, но все они используют общий
+        адаптер, и пул соединений разделяется между потоками.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
+    
+    def rate_limit_status(self):
+        """Насколько близко мы к лимиту запросов Ravelry"""
+        return self.rate_limiter.status()
+    
+    def close(self):
+        """Закрывает все соединения пула"""
+        self._adapter.close()
     
     def test_connection(self):
         """Тестирует подключение к API"""
-        print(f"🔌 Тестирую подключение к Ravelry API ({self.access_type})...")
+        logger.info("Проверка подключения к Ravelry API", extra=fields(access=self.access_type))
         
         # Простой запрос для проверки
         params = {
@@ -54,59 +248,105 @@ class RavelryAPI:
             'craft': 'knitting'
         }
         
-        data = self._make_request('patterns/search.json', params)
+        # Мимо кэша: проверяем именно доступность API
+        data = self._fetch('patterns/search.json', params)
         
         if data and 'patterns' in data:
             total = data.get('paginator', {}).get('results', 0)
             patterns = data.get('patterns', [])
             
-            print(f"✅ Подключение успешно!")
-            print(f"   Доступно схем: {total}")
-            
-            if patterns:
-                print("   Примеры схем:")
-                for i, pattern in enumerate(patterns[:3], 1):
-                    name = pattern.get('name', 'Без названия')[:50]
-                    print(f"   {i}. {name}")
-            
+            logger.info("Подключение к Ravelry API успешно", extra=fields(
+                total=total,
+                examples=[pattern.get('name', 'Без названия')[:50] for pattern in patterns[:3]],
+            ))
             return True
         else:
-            print("❌ Не удалось подключиться к API")
+            logger.error("Не удалось подключиться к Ravelry API")
             return False
     
     def _make_request(self, endpoint, params=None):
-        """Делает запрос к Ravelry API с обработкой ошибок"""
-        url = f"{self.BASE_URL}/{endpoint}"
+        """
+        Запрос к Ravelry API через постоянный кэш ответов (ravelry_cache).
+        
+        Устаревший ответ отдается сразу и обновляется в фоне; промах идет
+        в сеть, успешный ответ сохраняется в кэш.
+        
+        Raises:
+            RavelryRateLimited: лимит исчерпан, запрос нужно повторить позже
+        """
+        response_cache = get_response_cache()
+        if response_cache is None:
+            return self._fetch(endpoint, params)
+        
+        data, fresh = response_cache.get(endpoint, params)
+        if data is not None:
+            if not fresh:
+                response_cache.revalidate(endpoint, params, self._fetch)
+            return data
         
+        data = self._fetch(endpoint, params)
+        if data is not None:
+            response_cache.set(endpoint, params, data)
+        return data
+    
+    def _fetch(self, endpoint, params=None):
+        """
+        Делает запрос к Ravelry API с обработкой ошибок
+        
+        Raises:
+            RavelryRateLimited: лимит исчерпан, запрос нужно повторить позже
+        """
+        url = f"{self.base_url}/{endpoint}"
+        
+        wait = self.rate_limiter.acquire()
+        if wait:
+            logger.warning("Лимит запросов: запрос отложен", extra=fields(endpoint=endpoint, wait_s=round(wait, 1)))
+            raise RavelryRateLimited(wait)
+        
+        started = time.perf_counter()
         try:
-            print(f"🌐 Запрос: {endpoint}")
-            if params:
-                print(f"   Параметры: {json.dumps(params, ensure_ascii=False)[:100]}...")
-            
-            response = requests.get(url, headers=self.headers, params=params, timeout=15)
-            
-            if response.status_code == 200:
-                print(f"   ✅ Успешно")
-                return response.json()
-            elif response.status_code == 401:
-                print(f"❌ Ошибка 401: Неверные учетные данные для {self.access_type}")
-                return None
-            elif response.status_code == 429:
-                print("⚠ Ошибка 429: Лимит запросов. Жду 60 секунд...")
-                time.sleep(60)
-                return self._make_request(endpoint, params)
-            else:
-                print(f"❌ Ошибка {response.status_code}: {response.reason}")
-                print(f"   URL: {url}")
-                if response.text:
-                    print(f"   Ответ: {response.text[:200]}")
+            response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            duration = time.perf_counter() - started
+            record_ravelry_call(duration, error=True)
+            message = "Таймаут запроса" if isinstance(e, requests.exceptions.Timeout) else "Ошибка сети"
+            logger.error(message, extra=fields(
+                endpoint=endpoint, duration_ms=round(duration * 1000, 1), error=str(e)
+            ))
+            return None
+        
+        duration = time.perf_counter() - started
+        record_ravelry_call(duration, error=response.status_code != 200)
+        # Одинаковые поля у всех запросов: по ним строится распределение задержек
+        timing = {
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'bytes': len(response.content),
+        }
+        
+        if response.status_code == 200:
+            self.rate_limiter.record_success()
+            try:
+                data = response.json()
+            except ValueError as e:
+                logger.error("Некорректный JSON от Ravelry API", extra=fields(error=str(e), **timing))
                 return None
-                
-        except requests.exceptions.Timeout:
-            print("❌ Таймаут запроса")
+            logger.info("Запрос к Ravelry", extra=sampled('ravelry.request', **timing))
+            return data
+        elif response.status_code == 401:
+            logger.error("Неверные учетные данные Ravelry", extra=fields(access=self.access_type, **timing))
             return None
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Ошибка сети: {e}")
+        elif response.status_code == 429:
+            retry_after = self.rate_limiter.record_rate_limited(
+                parse_retry_after(response.headers.get('Retry-After'))
+            )
+            logger.warning("Лимит запросов Ravelry (429)", extra=fields(retry_after_s=round(retry_after), **timing))
+            raise RavelryRateLimited(retry_after)
+        else:
+            logger.error("Ошибка Ravelry API", extra=fields(
+                reason=response.reason, url=url, response=response.text[:200], **timing
+            ))
             return None
     
     def fetch_popular_patterns(self, count=10):
@@ -117,33 +357,26 @@ class RavelryAPI:
             'craft': 'knitting'
         }
         
-        print(f"📊 Загружаю {count} популярных схем...")
-        print(f"   Параметры запроса: {params}")
-
         data = self._make_request('patterns/search.json', params)
         
         if not data:
-            print("❌ Нет данных от API")
+            logger.warning("Нет данных от Ravelry API", extra=fields(count=count))
             return []
         
-        print(f"📦 Ответ от API получен. Ключи в ответе: {list(data.keys())}")
-        
         if 'patterns' not in data:
-            print(f"❌ Неожиданный формат ответа: {data.keys()}")
-            print(f"   Полный ответ (первые 500 символов): {str(data)[:500]}")
+            logger.error("Неожиданный формат ответа Ravelry", extra=fields(
+                keys=list(data.keys()), response=str(data)[:500]
+            ))
             return []
         
         patterns = data.get('patterns', [])
-        print(f"✅ Получено {len(patterns)} схем")
-        
         if patterns:
-            print("   Примеры полученных схем:")
-            for i, pattern in enumerate(patterns[:3], 1):
-                name = pattern.get('name', 'Без названия')[:50]
-                pattern_id = pattern.get('id', 'N/A')
-                print(f"   {i}. ID:{pattern_id} - {name}")
-            else:
-                print("⚠ В ответе есть ключ 'patterns', но он пустой")
+            logger.info("Получены популярные схемы", extra=fields(
+                requested=count, received=len(patterns),
+                examples=[pattern.get('id', 'N/A') for pattern in patterns[:3]],
+            ))
+        else:
+            logger.warning("В ответе есть ключ 'patterns', но он пустой", extra=fields(requested=count))
 
         return patterns[:count]
     
@@ -173,7 +406,7 @@ class RavelryAPI:
         if free_only:
             params['availability'] = 'free'
         
-        print(f"🔍 Поиск схем: {params}")
+        logger.debug("Поиск схем", extra=fields(**params))
         
         data = self._make_request('patterns/search.json', params)
         
@@ -188,49 +421,301 @@ class RavelryAPI:
         data = self._make_request(endpoint)
         
         if not data or 'pattern' not in data:
-            print(f"❌ Не удалось получить информацию о схеме {pattern_id}")
+            logger.warning("Не удалось получить информацию о схеме", extra=fields(pattern_id=pattern_id))
             return None
         
         return data['pattern']
 
-# Инициализация синглтон экземпляра
-try:
-    ravelry_personal = RavelryAPI(use_personal=True)
-    print("✅ RavelryAPI инициализирован")
-except Exception as e:
-    print(f"⚠ Ошибка инициализации RavelryAPI: {e}")
-    # Создаем заглушку для разработки
-    class RavelryAPIStub:
-        def __init__(self, *args, **kwargs):
-            print("🛠 Использую RavelryAPIStub (заглушка)")
-        
-        def test_connection(self):
-            print("✅ Заглушка: подключение тестовое")
-            return True
+class AsyncRavelryAPI:
+    """
+    Асинхронный клиент для массовой загрузки каталога.
+    
+    Запросы выполняет синхронный RavelryAPI (общий пул соединений и лимитер)
+    в пуле потоков, а asyncio раздает страницы и детали схем параллельно,
+    не более concurrency запросов одновременно.
+    """
+    
+    SEARCH_ENDPOINT = 'patterns/search.json'
+    PAGE_SIZE = 100  # Ravelry максимум 100
+    
+    def __init__(self, client=None, concurrency=8):
+        self.client = client or get_ravelry_client()
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        # consumer обычно пишет в БД: ORM нельзя вызывать из event loop,
+        # поэтому он работает в отдельном потоке, строго последовательно
+        self._consumer_executor = ThreadPoolExecutor(max_workers=1)
+        self._semaphore = None
+    
+    async def _get(self, endpoint, params=None):
+        """Один запрос; при лимите ждет без блокировки event loop"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            while True:
+                try:
+                    return await loop.run_in_executor(
+                        self._executor, self.client._make_request, endpoint, params
+                    )
+                except RavelryRateLimited as limited:
+                    await asyncio.sleep(limited.retry_after)
+    
+    async def _fan_out(self, requests_args):
+        """Запускает запросы параллельно и отдает ответы по мере готовности"""
+        tasks = [asyncio.ensure_future(self._get(*args)) for args in requests_args]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def iter_search_pages(self, params=None, max_pages=None):
+        """
+        Отдает страницы поиска (списки схем) по мере загрузки.
+        
+        Первая страница запрашивается отдельно, чтобы узнать page_count,
+        остальные - параллельно.
+        """
+        base_params = dict(params or {})
+        base_params.setdefault('craft', 'knitting')
+        base_params['page_size'] = self.PAGE_SIZE
         
-        def fetch_popular_patterns(self, count=10):
-            print(f"🛠 Заглушка: возвращаю тестовые схемы ({count})")
-            # Возвращаем тестовые данные
-            return [
-                {
-                    'id': i,
-                    'name': f'Тестовая схема {i}',
-                    'designer': {'name': 'Тестовый дизайнер'},
-                    'difficulty_average': 2.5,
-                    'yarn_weight': {'name': 'Worsted'},
-                    'yardage': 200 + i * 50,
-                    'free': i % 2 == 0,
-                    'rating': {'average': 4.0 + i * 0.1},
-                    'permalink': f'#pattern{i}',
-                    'first_photo': {'square_url': ''},
-                    'craft': {'name': 'knitting'},
-                    'notes': f'Тестовое описание схемы {i}',
-                    'published': '2024-01-01'
-                }
-                for i in range(1, count + 1)
-            ]
-    
-    ravelry_personal = RavelryAPIStub()
+        first = await self._get(self.SEARCH_ENDPOINT, {**base_params, 'page': 1})
+        if not first or 'patterns' not in first:
+            return
+        yield first['patterns']
+        
+        page_count = first.get('paginator', {}).get('page_count', 1)
+        if max_pages:
+            page_count = min(page_count, max_pages)
+        
+        pages = (
+            (self.SEARCH_ENDPOINT, {**base_params, 'page': page})
+            for page in range(2, page_count + 1)
+        )
+        async for data in self._fan_out(pages):
+            if data and 'patterns' in data:
+                yield data['patterns']
+    
+    async def iter_pattern_details(self, pattern_ids):
+        """Отдает детальную информацию о схемах по мере загрузки"""
+        endpoints = ((f'patterns/{pattern_id}.json',) for pattern_id in pattern_ids)
+        async for data in self._fan_out(endpoints):
+            if data and 'pattern' in data:
+                yield data['pattern']
+    
+    async def import_catalog(self, consumer, params=None, max_pages=None):
+        """
+        Передает каждую загруженную страницу схем в consumer(patterns).
+        Возвращает общее количество полученных схем.
+        """
+        loop = asyncio.get_running_loop()
+        total = 0
+        async for patterns in self.iter_search_pages(params, max_pages):
+            await loop.run_in_executor(self._consumer_executor, consumer, patterns)
+            total += len(patterns)
+        return total
+    
+    def fetch_catalog(self, consumer, params=None, max_pages=None):
+        """Синхронная обертка над import_catalog (для management команд)"""
+        try:
+            return asyncio.run(self.import_catalog(consumer, params, max_pages))
+        finally:
+            self._semaphore = None
+    
+    def close(self):
+        self._executor.shutdown(wait=False)
+        # Соединение с БД, открытое consumer в его потоке, закрывается там же
+        self._consumer_executor.submit(connections.close_all)
+        self._consumer_executor.shutdown(wait=True)
+
+
+class RavelryAPIStub:
+    """Заглушка без сети: тестовые схемы, поиск и детали пусты"""
+    
+    access_type = "stub"
+    
+    def __init__(self, *args, **kwargs):
+        self.rate_limiter = ravelry_rate_limiter
+    
+    def test_connection(self):
+        logger.info("Заглушка: подключение тестовое")
+        return True
+    
+    def rate_limit_status(self):
+        return self.rate_limiter.status()
+    
+    def close(self):
+        pass
+    
+    def _make_request(self, endpoint, params=None):
+        # Нет ответа - вызывающий код переходит на тестовые схемы
+        return None
+    
+    def search_patterns(self, *args, **kwargs):
+        return []
+    
+    def get_pattern_details(self, pattern_id):
+        return None
+    
+    def fetch_popular_patterns(self, count=10):
+        logger.info("Заглушка: тестовые схемы", extra=fields(count=count))
+        # Возвращаем тестовые данные
+        return [
+            {
+                'id': i,
+                'name': f'Тестовая схема {i}',
+                'designer': {'name': 'Тестовый дизайнер'},
+                'difficulty_average': 2.5,
+                'yarn_weight': {'name': 'Worsted'},
+                'yardage': 200 + i * 50,
+                'free': i % 2 == 0,
+                'rating': {'average': 4.0 + i * 0.1},
+                'permalink': f'#pattern{i}',
+                'first_photo': {'square_url': ''},
+                'craft': {'name': 'knitting'},
+                'notes': f'Тестовое описание схемы {i}',
+                'published': '2024-01-01'
+            }
+            for i in range(1, count + 1)
+        ]
+
+
+class FakeRavelryAPI(RavelryAPI):
+    """
+    Клиент без сети с ответами в формате Ravelry: детерминированные
+    страницы поиска и детали схем (для разработки и нагрузочных тестов).
+    Разбор ответов, лимитер и метрики - как у настоящего клиента.
+    """
+    
+    TOTAL_PATTERNS = 10000
+    WEIGHTS = ('Lace', 'Fingering', 'Sport', 'DK', 'Worsted', 'Aran', 'Bulky')
+    PHOTO_VARIANTS = 200
+    
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        self.rate_limiter = rate_limiter or ravelry_rate_limiter
+        self.base_url = 'fake://ravelry'
+        self.access_type = "fake"
+    
+    def close(self):
+        pass
+    
+    def _make_request(self, endpoint, params=None):
+        # Ответы и так мгновенные: без кэша ответов
+        return self._fetch(endpoint, params)
+    
+    def _photo(self, pattern_id):
+        # Фото с локального сервера тестовых фото (RAVELRY_FAKE_PHOTO_BASE);
+        # PHOTO_VARIANTS разных фото, чтобы одинаковые скачивались один раз
+        base = getattr(settings, 'RAVELRY_FAKE_PHOTO_BASE', '').rstrip('/')
+        if not base:
+            return {'square_url': ''}
+        return {'large2_url': f'{base}/{pattern_id % self.PHOTO_VARIANTS}.jpg'}
+    
+    def _pattern(self, pattern_id):
+        rnd = random.Random(pattern_id)
+        return {
+            'id': pattern_id,
+            'name': f'Fake pattern {pattern_id}',
+            'designer': {'name': f'Designer {pattern_id % 97}'},
+            'difficulty_average': round(rnd.uniform(1, 5), 2),
+            'yarn_weight': {'name': rnd.choice(self.WEIGHTS)},
+            'yardage': rnd.randint(100, 2000),
+            'free': rnd.random() < 0.3,
+            'rating': {'average': round(rnd.uniform(3, 5), 2)},
+            'rating_count': rnd.randint(0, 500),
+            'permalink': f'fake-pattern-{pattern_id}',
+            'first_photo': self._photo(pattern_id),
+            'craft': {'name': 'knitting'},
+            'notes': f'Fake description {pattern_id}',
+            'published': '2024-01-01',
+        }
+    
+    def _fetch(self, endpoint, params=None):
+        params = params or {}
+        started = time.perf_counter()
+        if endpoint == 'patterns/search.json':
+            page_size = min(int(params.get('page_size', 20)), 100)
+            page = max(int(params.get('page', 1)), 1)
+            page_count = -(-self.TOTAL_PATTERNS // page_size)
+            first = (page - 1) * page_size + 1
+            last = min(first + page_size, self.TOTAL_PATTERNS + 1)
+            data = {
+                'patterns': [self._pattern(pattern_id) for pattern_id in range(first, last)],
+                'paginator': {'page': page, 'page_count': page_count, 'results': self.TOTAL_PATTERNS},
+            }
+        elif endpoint.startswith('patterns/') and endpoint[len('patterns/'):-len('.json')].isdigit():
+            data = {'pattern': self._pattern(int(endpoint[len('patterns/'):-len('.json')]))}
+        else:
+            data = None
+        record_ravelry_call(time.perf_counter() - started, error=data is None)
+        return data
+
+
+# Клиенты по имени бэкенда (settings.RAVELRY_BACKEND)
+RAVELRY_BACKENDS = {
+    'real': RavelryAPI,
+    'stub': RavelryAPIStub,
+    'fake': FakeRavelryAPI,
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def register_ravelry_backend(name, factory):
+    """Добавляет бэкенд: factory() возвращает клиент с интерфейсом RavelryAPI"""
+    RAVELRY_BACKENDS[name] = factory
+
+
+def _create_client():
+    backend = getattr(settings, 'RAVELRY_BACKEND', 'auto')
+    if backend != 'auto':
+        try:
+            factory = RAVELRY_BACKENDS[backend]
+        except KeyError:
+            raise ValueError(f"Неизвестный бэкенд Ravelry: {backend} (есть: {', '.join(RAVELRY_BACKENDS)})")
+        return factory()
+    
+    # auto: настоящий API, если заданы учетные данные, иначе заглушка
+    try:
+        return RavelryAPI(use_personal=True)
+    except ValueError as e:
+        logger.warning("RavelryAPI недоступен, используется заглушка", extra=fields(error=str(e)))
+        return RavelryAPIStub()
+
+
+def get_ravelry_client():
+    """
+    Общий клиент Ravelry процесса.
+    
+    Создается при первом обращении, а не при импорте модуля: manage.py
+    и воркеры стартуют без проверки учетных данных и сетевых объектов.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def reset_ravelry_client():
+    """Закрывает клиент; следующий get_ravelry_client создаст новый (смена настроек)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def __getattr__(name):
+    # Совместимость: ravelry_personal раньше создавался при импорте
+    if name == 'ravelry_personal':
+        return get_ravelry_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_yarn_type_mapping():
@@ -247,4 +732,13 @@ def get_yarn_type_mapping():
         'super bulky': ['Super Bulky'],
         'jumbo': ['Jumbo'],
         'other': []  # Для типа "другая"
-    }
\ No newline at end of file
+    }
+
+
+def get_weight_codes(*yarn_types):
+    """
+    Коды Pattern.weight_code, подходящие нашим типам пряжи.
+    Для типа "другая" подходящих толщин нет.
+    """
+    type_mapping = get_yarn_type_mapping()
+    return [yarn_type for yarn_type in yarn_types if type_mapping.get(yarn_type)]
@@ -0,0 +1,232 @@
+# ravelry_cache.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from django.conf import settings
+from .log import fields
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def endpoint_kind(endpoint):
+    """Вид запроса для TTL: поиск, схема или прочее"""
+    if endpoint.startswith('patterns/search'):
+        return 'search'
+    if endpoint.startswith('patterns/'):
+        return 'pattern'
+    return 'default'
+
+
+def cache_key(endpoint, params=None):
+    """Ключ: endpoint + параметры в каноническом виде (порядок и типы не важны)"""
+    normalized = {str(name): str(value) for name, value in (params or {}).items() if value is not None}
+    return endpoint + '?' + json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+
+class RavelryResponseCache:
+    """
+    Постоянный кэш ответов Ravelry API в отдельной SQLite базе.
+
+    - TTL по виду запроса (settings.RAVELRY_CACHE_TTL_SEARCH / _PATTERN / _DEFAULT),
+      TTL 0 - не кэшировать;
+    - после TTL ответ еще RAVELRY_CACHE_STALE секунд отдается устаревшим,
+      а обновляется в фоне (stale-while-revalidate);
+    - объем ограничен RAVELRY_CACHE_MAX_MB, вытесняются давно не читавшиеся (LRU).
+
+    Ответы хранятся сжатыми. Ошибки самого кэша не ломают запросы: они
+    считаются промахом.
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.RAVELRY_CACHE_PATH)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._revalidating = set()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def ttl(self, endpoint):
+        kind = endpoint_kind(endpoint).upper()
+        return getattr(settings, f'RAVELRY_CACHE_TTL_{kind}', 0)
+
+    def _count(self, connection, **counts):
+        """Счетчики попаданий и объема - в той же базе, их видят все процессы"""
+        connection.executemany(
+            'INSERT INTO counters (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            counts.items()
+        )
+
+    def get(self, endpoint, params=None):
+        """
+        Ответ из кэша.
+
+        Returns:
+            (data, fresh): fresh=False - ответ устарел и его нужно обновить;
+            (None, False) - ответа нет
+        """
+        ttl = self.ttl(endpoint)
+        if not ttl:
+            return None, False
+        key = cache_key(endpoint, params)
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                'SELECT body, size, stored_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            age = time.time() - row[2] if row else None
+            if row is None or age > ttl + settings.RAVELRY_CACHE_STALE:
+                with connection:
+                    self._count(connection, misses=1)
+                return None, False
+            body, size, _ = row
+            data = json.loads(zlib.decompress(body))
+            fresh = age <= ttl
+            with connection:
+                connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+                self._count(connection, **{'hits' if fresh else 'stale_hits': 1, 'bytes_read': size})
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            logger.warning("Кэш ответов Ravelry недоступен", extra=fields(endpoint=endpoint, error=str(e)))
+            return None, False
+        return data, fresh
+
+    def set(self, endpoint, params, data):
+        if not self.ttl(endpoint):
+            return
+        body = zlib.compress(json.dumps(data, ensure_ascii=False).encode())
+        now = time.time()
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO responses (key, endpoint, body, size, stored_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (cache_key(endpoint, params), endpoint, body, len(body), now, now)
+                )
+                self._count(connection, bytes_written=len(body))
+                self._evict(connection)
+        except sqlite3.Error as e:
+            logger.warning("Не удалось сохранить ответ Ravelry в кэш", extra=fields(endpoint=endpoint, error=str(e)))
+
+    def _evict(self, connection):
+        """Удаляет давно не читавшиеся ответы, пока объем больше лимита"""
+        limit = settings.RAVELRY_CACHE_MAX_MB * 2 ** 20
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= limit:
+            return
+        # Освобождаем с запасом 10%, чтобы не вытеснять на каждой записи
+        excess = total - limit * 0.9
+        freed = 0
+        keys = []
+        for key, size in connection.execute('SELECT key, size FROM responses ORDER BY accessed_at'):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        connection.executemany('DELETE FROM responses WHERE key = ?', keys)
+
+    def revalidate(self, endpoint, params, fetch):
+        """
+        Обновляет устаревший ответ в фоновом потоке, не более одного
+        обновления на ключ одновременно. fetch(endpoint, params) -> data или None
+        """
+        key = cache_key(endpoint, params)
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                data = fetch(endpoint, params)
+                if data is not None:
+                    self.set(endpoint, params, data)
+            except Exception as e:
+                # В том числе RavelryRateLimited: устаревший ответ остается
+                logger.warning("Фоновое обновление ответа Ravelry не удалось", extra=fields(endpoint=endpoint, error=str(e)))
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=run, name='ravelry-revalidate', daemon=True).start()
+
+    def clear(self, endpoint_prefix=None):
+        """
+        Удаляет все ответы и счетчики (или только ответы для endpoint
+        с префиксом). Возвращает число удаленных ответов
+        """
+        connection = self._connection()
+        with connection:
+            if endpoint_prefix:
+                cursor = connection.execute('DELETE FROM responses WHERE endpoint LIKE ?', (endpoint_prefix + '%',))
+            else:
+                cursor = connection.execute('DELETE FROM responses')
+                connection.execute('DELETE FROM counters')
+        return cursor.rowcount
+
+    def stats(self):
+        """Попадания, промахи и объем кэша, число ответов по видам запросов"""
+        connection = self._connection()
+        counters = dict(connection.execute('SELECT name, value FROM counters'))
+        kinds = {}
+        for endpoint, size in connection.execute('SELECT endpoint, size FROM responses'):
+            kind = kinds.setdefault(endpoint_kind(endpoint), {'entries': 0, 'bytes': 0})
+            kind['entries'] += 1
+            kind['bytes'] += size
+
+        hits, stale_hits, misses = (counters.get(name, 0) for name in ('hits', 'stale_hits', 'misses'))
+        lookups = hits + stale_hits + misses
+        return {
+            'hits': hits,
+            'stale_hits': stale_hits,
+            'misses': misses,
+            'hit_rate': round((hits + stale_hits) / lookups, 3) if lookups else 0,
+            'bytes_read': counters.get('bytes_read', 0),
+            'bytes_written': counters.get('bytes_written', 0),
+            'entries': sum(kind['entries'] for kind in kinds.values()),
+            'bytes': sum(kind['bytes'] for kind in kinds.values()),
+            'max_bytes': settings.RAVELRY_CACHE_MAX_MB * 2 ** 20,
+            'by_kind': kinds,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Общий для процесса кэш ответов (None, если выключен RAVELRY_CACHE_ENABLED)"""
+    global _cache
+    if not getattr(settings, 'RAVELRY_CACHE_ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RavelryResponseCache()
+    return _cache
@@ -0,0 +1,119 @@
+# recommendations.py
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .catalog import get_catalog_version, get_weight_versions
+from .favorites import get_favorite_ids, favorites_digest
+from .matching import candidate_codes, rank_pattern_ids, stash_yards
+from .models import YARN_WEIGHT_CODES, UserStashSummary, UserRecommendations, VersionCounter
+
+RECOMMENDATIONS_SIZE = 10
+# Версия каталога, для которой отпечатки уже сверены (_refresh_catalog_stale)
+CHECKED_CATALOG_KEY = 'recommendations:catalog_checked'
+
+
+def _stamps(user, summary, yards):
+    """Версии входных данных: запасы, избранное и каталог нужных толщин"""
+    return {
+        'stash_version': summary.updated_at,
+        'favorites_digest': favorites_digest(user),
+        'catalog_stamp': get_weight_versions(candidate_codes(yards)),
+    }
+
+
+def mark_dirty(user_id):
+    """
+    Отмечает, что запасы или избранное пользователя изменились: фоновая
+    задача пересчитает только отмеченных (воркер ставит ее сам, когда
+    находит отметки, - run_refresh_worker).
+    """
+    UserRecommendations.objects.filter(user_id=user_id).update(dirty_at=timezone.now())
+
+
+def compute(user, summary=None):
+    """
+    Пересчитывает рекомендации пользователя.
+
+    Лучшие по оценке соответствия запасам схемы; схемы из избранного,
+    подходящие к запасам, идут первыми.
+    """
+    summary = summary or UserStashSummary.for_user(user)
+    yards = stash_yards(summary.by_type)
+    stamps = _stamps(user, summary, yards)
+
+    favorite_ids = get_favorite_ids(user)
+    ranked = rank_pattern_ids(yards, RECOMMENDATIONS_SIZE + len(favorite_ids))
+    ranked.sort(key=lambda pattern_id: pattern_id not in favorite_ids)
+
+    values = {'pattern_ids': ranked[:RECOMMENDATIONS_SIZE], **stamps}
+    if not UserRecommendations.objects.filter(user=user).update(**values):
+        try:
+            with transaction.atomic():
+                return UserRecommendations.objects.create(user=user, **values)
+        except IntegrityError:
+            UserRecommendations.objects.filter(user=user).update(**values)
+    return UserRecommendations.objects.get(user=user)
+
+
+def _refresh_dirty():
+    """Пересчет отмеченных пользователей. Возвращает число пересчитанных"""
+    refreshed = 0
+    dirty = UserRecommendations.objects.filter(dirty_at__isnull=False).select_related('user')
+    for recommendations in dirty:
+        compute(recommendations.user)
+        # Изменение во время расчета сдвинуло отметку - она остается
+        UserRecommendations.objects.filter(
+            id=recommendations.id, dirty_at=recommendations.dirty_at
+        ).update(dirty_at=None)
+        refreshed += 1
+    return refreshed
+
+
+def _refresh_catalog_stale():
+    """
+    Пересчет пользователей, у которых изменились схемы нужных толщин.
+    Версии толщин читаются одним запросом и сравниваются с отпечатками
+    в памяти; проход пропускается, если каталог не менялся с прошлого.
+    """
+    version = get_catalog_version()
+    checked = VersionCounter.get_many([CHECKED_CATALOG_KEY]).get(CHECKED_CATALOG_KEY)
+    if checked == version:
+        return 0
+
+    current = get_weight_versions(YARN_WEIGHT_CODES)
+    stale = [
+        user_id
+        for user_id, stamp in UserRecommendations.objects.values_list('user_id', 'catalog_stamp')
+        if any(current.get(code, 0) != stamp_version for code, stamp_version in stamp.items())
+    ]
+    for user in User.objects.filter(id__in=stale):
+        compute(user)
+    VersionCounter.objects.update_or_create(key=CHECKED_CATALOG_KEY, defaults={'value': version})
+    return len(stale)
+
+
+def refresh_stale():
+    """
+    Пересчитывает устаревшие рекомендации: отмеченных пользователей
+    (mark_dirty) и тех, для кого изменился каталог.
+
+    Returns:
+        число пересчитанных
+    """
+    return _refresh_dirty() + _refresh_catalog_stale()
+
+
+def get_recommended_ids(user):
+    """
+    id рекомендованных схем одним запросом.
+
+    Пока фоновая задача не пересчитала рекомендации, отдаются
+    предыдущие; при первом обращении они считаются сразу.
+    """
+    pattern_ids = UserRecommendations.objects.filter(user=user).values_list(
+        'pattern_ids', flat=True
+    ).first()
+    if pattern_ids is None:
+        pattern_ids = compute(user).pattern_ids
+    return pattern_ids
+
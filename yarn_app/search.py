@@ -0,0 +1,150 @@
+# search.py
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+FTS_TABLE = 'yarn_app_pattern_fts'
+FTS_COLUMNS = 'name, author, description, category'
+FTS_TRIGGERS = ('yarn_app_pattern_fts_ai', 'yarn_app_pattern_fts_ad', 'yarn_app_pattern_fts_au')
+
+FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {FTS_COLUMNS},
+        content='yarn_app_pattern',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS yarn_app_pattern_fts_ai AFTER INSERT ON yarn_app_pattern BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.name, new.author, new.description, new.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS yarn_app_pattern_fts_ad AFTER DELETE ON yarn_app_pattern BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.name, old.author, old.description, old.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS yarn_app_pattern_fts_au
+    AFTER UPDATE OF {FTS_COLUMNS} ON yarn_app_pattern BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.name, old.author, old.description, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.name, new.author, new.description, new.category);
+    END
+    """,
+]
+
+# Слова запроса: буквы/цифры любого алфавита
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class IcontainsSearchBackend:
+    """Поиск через LIKE '%...%' (работает на любой БД, но сканирует таблицу)"""
+
+    def search(self, queryset, query, ranked=False):
+        if not query:
+            return queryset
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(author__icontains=query) |
+            Q(category__icontains=query)
+        )
+
+
+class SQLiteFTS5SearchBackend:
+    """
+    Полнотекстовый поиск через SQLite FTS5.
+
+    Индекс yarn_app_pattern_fts (name, author, description, category)
+    поддерживается триггерами на yarn_app_pattern, см. миграцию 0006.
+    Каждое слово запроса ищется по префиксу, все слова обязательны.
+    """
+
+    # Веса bm25 для колонок name, author, description, category
+    RANK_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+
+    def build_match(self, query):
+        """Превращает пользовательский запрос в безопасное выражение MATCH"""
+        tokens = TOKEN_RE.findall(query or '')
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, queryset, query, ranked=False):
+        match = self.build_match(query)
+        if not match:
+            return queryset
+
+        if not ranked:
+            return queryset.filter(id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]
+            ))
+
+        # Для ранжирования нужен JOIN с индексом: bm25() доступен только
+        # в самом запросе MATCH (коррелированный подзапрос на каждую строку
+        # выполнял бы полнотекстовый поиск заново)
+        weights = ', '.join(str(weight) for weight in self.RANK_WEIGHTS)
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = yarn_app_pattern.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            # bm25 отрицательный: чем меньше, тем релевантнее
+            select={'search_rank': f'bm25({FTS_TABLE}, {weights})'},
+        ).order_by('search_rank', *ordering)
+
+
+def ensure_fts_index(using='default', **kwargs):
+    """
+    Восстанавливает FTS5 индекс и его триггеры (обработчик post_migrate).
+
+    SQLite-миграции, пересоздающие таблицу yarn_app_pattern (AddField,
+    AlterField), удаляют вместе с ней и триггеры, и индекс перестает
+    обновляться. Если триггеров нет, создаем их и перестраиваем индекс.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'yarn_app_pattern'"
+        )
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+            FTS_TRIGGERS,
+        )
+        if cursor.fetchone()[0] == len(FTS_TRIGGERS):
+            return
+        for statement in FTS_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """
+    Бэкенд поиска схем из settings.PATTERN_SEARCH_BACKEND.
+    По умолчанию FTS5 для SQLite, для остальных БД - icontains.
+    """
+    backend_path = getattr(settings, 'PATTERN_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5SearchBackend()
+    return IcontainsSearchBackend()
+
+
+def search_patterns(queryset, query, ranked=False):
+    """Фильтрует queryset схем по поисковому запросу"""
+    return get_search_backend().search(queryset, query, ranked=ranked)
@@ -0,0 +1,116 @@
+# serializers.py
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from .catalog import get_catalog_version
+
+
+def pattern_card(pattern):
+    """Карточка схемы для api_patterns"""
+    return {
+        'id': str(pattern.id),
+        'name': pattern.name,
+        'author': pattern.author or 'Не указан',
+        'description': pattern.description or '',
+        'difficulty': pattern.difficulty,
+        'difficulty_display': pattern.get_difficulty_display(),
+        'yarn_weight': pattern.yarn_weight or 'Не указано',
+        'category': pattern.category or 'Не указано',
+        'craft': 'Спицы' if pattern.craft == 'knitting' else 'Крючок',
+        'is_free': pattern.is_free,
+        'rating': float(pattern.rating) if pattern.rating else 0,
+        'rating_count': pattern.rating_count or 0,
+        'photo_url': pattern.card_photo_url or '/static/images/pattern-placeholder.jpg',
+        'photo_detail_url': pattern.detail_photo_url or '',
+        'pattern_url': pattern.pattern_url or '#',
+        'created_at': pattern.created_at.strftime('%d.%m.%Y') if pattern.created_at else ''
+    }
+
+
+def pattern_summary(pattern):
+    """Краткое описание схемы (load_more_patterns, результаты обновления)"""
+    return {
+        'id': pattern.id,
+        'name': pattern.name,
+        'designer': pattern.author,
+        'yarn_weight': pattern.yarn_weight,
+        'photo_url': pattern.card_photo_url,
+        'difficulty': pattern.get_difficulty_display(),
+        'is_free': pattern.is_free,
+        'rating': float(pattern.rating) if pattern.rating else 0,
+        'pattern_url': pattern.pattern_url,
+    }
+
+
+SERIALIZERS = {
+    'card': pattern_card,
+    'summary': pattern_summary,
+}
+
+
+def _dumps(data):
+    # Те же параметры, что у JsonResponse
+    return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+class FragmentCache:
+    """
+    Готовые JSON-фрагменты схем в памяти процесса.
+
+    Ключ - (формат, id схемы), фрагменты действительны для одной версии
+    каталога: при ее смене кэш очищается. Размер ограничен
+    settings.PATTERN_FRAGMENT_CACHE_SIZE, при переполнении кэш
+    начинается заново.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.fragments = {}
+
+    def encode(self, patterns, fmt, version=None):
+        if version is None:
+            version = get_catalog_version()
+        if version != self.version:
+            self.fragments = {}
+            self.version = version
+        fragments = self.fragments
+        maxsize = getattr(settings, 'PATTERN_FRAGMENT_CACHE_SIZE', 20000)
+        serialize = SERIALIZERS[fmt]
+
+        encoded = []
+        for pattern in patterns:
+            key = (fmt, pattern.id)
+            fragment = fragments.get(key)
+            if fragment is None:
+                fragment = _dumps(serialize(pattern)).encode()
+                if len(fragments) >= maxsize:
+                    fragments = self.fragments = {}
+                fragments[key] = fragment
+            encoded.append(fragment)
+        return b'[' + b', '.join(encoded) + b']'
+
+
+fragment_cache = FragmentCache()
+
+
+def encode_patterns(patterns, fmt='card', version=None):
+    """
+    JSON-массив схем из закэшированных фрагментов.
+    version - версия каталога, если она уже известна (например, снимка)
+    """
+    return fragment_cache.encode(patterns, fmt, version)
+
+
+def patterns_json_response(data, patterns, fmt='card', version=None, key='patterns', status=200):
+    """
+    JsonResponse с массивом схем под ключом key: остальные поля data
+    сериализуются как обычно, массив собирается из готовых фрагментов.
+    """
+    body = b'{"' + key.encode() + b'": ' + encode_patterns(patterns, fmt, version)
+    rest = _dumps(data).encode()
+    if rest != b'{}':
+        body += b', ' + rest[1:]
+    else:
+        body += b'}'
+    return HttpResponse(body, content_type='application/json', status=status)
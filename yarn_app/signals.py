@@ -0,0 +1,53 @@
+# signals.py
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .catalog import schedule_catalog_bump
+from .favorites import bump_favorites_version
+from .recommendations import mark_dirty
+from .models import UserYarn, ProjectYarn, Pattern, Favorite, UserStashSummary
+
+
+def schedule_summary_rebuild(user_id):
+    """Пересчитывает сводку запасов после коммита транзакции"""
+    if user_id is None:
+        return
+
+    def rebuild():
+        # Пользователь мог быть удален вместе со всей своей пряжей
+        if User.objects.filter(id=user_id).exists():
+            UserStashSummary.rebuild(user_id)
+            mark_dirty(user_id)
+
+    # Сводка - производные данные: ошибка пересчета не должна ломать
+    # уже закоммиченный запрос (восстановление - rebuild_stash_summaries)
+    transaction.on_commit(rebuild, robust=True)
+
+
+@receiver([post_save, post_delete], sender=UserYarn)
+def user_yarn_changed(sender, instance, **kwargs):
+    schedule_summary_rebuild(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=ProjectYarn)
+def project_yarn_changed(sender, instance, **kwargs):
+    # Использование пряжи в проекте меняет остаток мотков
+    user_id = UserYarn.objects.filter(id=instance.user_yarn_id).values_list('user_id', flat=True).first()
+    schedule_summary_rebuild(user_id)
+
+
+@receiver([post_save, post_delete], sender=Pattern)
+def pattern_changed(sender, instance, **kwargs):
+    # Сохранение и удаление схемы (в том числе из админки и QuerySet.delete);
+    # bulk_create и update сигналов не шлют - там версия меняется явно
+    schedule_catalog_bump([instance.weight_code])
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+def favorite_changed(sender, instance, **kwargs):
+    # Версия меняется в транзакции изменения: она задает ключ кэша множества
+    # избранного (favorites.get_favorite_ids) и ETag api_user_favorites
+    bump_favorites_version(instance.user_id)
+    # Избранное влияет на рекомендации пользователя
+    mark_dirty(instance.user_id)
@@ -0,0 +1,286 @@
+# snapshot.py
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .catalog import get_catalog_version, get_catalog_modified
+from .models import YARN_WEIGHT_CODES, Pattern, thumbnail_url
+from .pagination import CATALOG_ORDERING, NEWEST_ORDERING, InvalidCursor, decode_cursor, encode_cursor
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+DIFFICULTY_DISPLAY = dict(Pattern._meta.get_field('difficulty').choices)
+
+NUMERIC_FIELDS = ('id', 'rating', 'rating_count', 'is_free', 'created_at')
+TEXT_FIELDS = ('name', 'author', 'description', 'difficulty', 'yarn_weight',
+               'weight_code', 'category', 'craft', 'photo_url', 'photo_hash', 'pattern_url')
+# Поля с небольшим числом разных значений: каждая строка хранится один раз
+SHARED_FIELDS = {'author', 'difficulty', 'yarn_weight', 'weight_code', 'category', 'craft'}
+
+
+class PatternRow:
+    """Схема из снимка каталога: поля для отображения, как у Pattern"""
+    __slots__ = NUMERIC_FIELDS + TEXT_FIELDS
+
+    def get_difficulty_display(self):
+        return DIFFICULTY_DISPLAY.get(self.difficulty, self.difficulty)
+
+    @property
+    def difficulty_display(self):
+        return DIFFICULTY_DISPLAY.get(self.difficulty, 'Не указано')
+
+    @property
+    def card_photo_url(self):
+        return thumbnail_url(self.photo_hash, 'card') if self.photo_hash else self.photo_url
+
+    @property
+    def detail_photo_url(self):
+        return thumbnail_url(self.photo_hash, 'detail') if self.photo_hash else self.photo_url
+
+
+class CatalogSnapshot:
+    """
+    Неизменяемый снимок каталога схем в памяти процесса.
+
+    Числовые поля хранятся колонками в array, строковые - кортежами,
+    повторяющиеся значения (автор, толщина, сложность) - одним объектом.
+    Порядки каталога (CATALOG_ORDERING, NEWEST_ORDERING) вычисляются при
+    построении, поэтому фильтрация и страницы по курсору обходятся без SQL.
+    Курсор хранит значения полей сортировки последней отданной схемы
+    (keyset), поэтому любая страница стоит столько же, сколько первая.
+    """
+
+    def __init__(self, version, rows, modified=None):
+        self.version = version
+        self.modified = modified
+        self.ids = array('q')
+        self.rating = array('d')
+        self.rating_count = array('l')
+        self.is_free = array('b')
+        self.created = array('q')  # микросекунды от начала эпохи (UTC)
+        text = {field: [] for field in TEXT_FIELDS}
+
+        shared = {}
+        for pattern_id, rating, rating_count, is_free, created_at, *values in rows:
+            self.ids.append(pattern_id)
+            self.rating.append(rating or 0)
+            self.rating_count.append(rating_count or 0)
+            self.is_free.append(1 if is_free else 0)
+            self.created.append((created_at - EPOCH) // MICROSECOND)
+            for field, value in zip(TEXT_FIELDS, values):
+                if field in SHARED_FIELDS:
+                    value = shared.setdefault(value, value)
+                text[field].append(value)
+        self.text = {field: tuple(values) for field, values in text.items()}
+
+        ids, rating, created = self.ids, self.rating, self.created
+        positions = range(len(ids))
+        self.orders = {
+            CATALOG_ORDERING: array('l', sorted(
+                positions, key=lambda p: (rating[p], created[p], ids[p]), reverse=True
+            )),
+            NEWEST_ORDERING: array('l', sorted(
+                positions, key=lambda p: (created[p], ids[p]), reverse=True
+            )),
+        }
+        present = set(self.text['weight_code'])
+        self._weight_codes = [code for code in YARN_WEIGHT_CODES if code in present]
+
+    @classmethod
+    def build(cls, version=None):
+        """Строит снимок по текущему каталогу"""
+        rows = Pattern.objects.values_list(*NUMERIC_FIELDS, *TEXT_FIELDS).order_by().iterator(chunk_size=5000)
+        modified = get_catalog_modified()
+        return cls(get_catalog_version() if version is None else version, rows, modified)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, position):
+        row = PatternRow()
+        row.id = self.ids[position]
+        row.rating = self.rating[position]
+        row.rating_count = self.rating_count[position]
+        row.is_free = bool(self.is_free[position])
+        row.created_at = EPOCH + self.created[position] * MICROSECOND
+        for field in TEXT_FIELDS:
+            setattr(row, field, self.text[field][position])
+        return row
+
+    def weight_codes(self):
+        """Коды толщины, которые есть в каталоге, от тонкой к толстой (для фильтра)"""
+        return self._weight_codes
+
+    def _key(self, ordering, position):
+        if ordering == CATALOG_ORDERING:
+            return (self.rating[position], self.created[position], self.ids[position])
+        return (self.created[position], self.ids[position])
+
+    def _cursor_key(self, ordering, cursor):
+        data = decode_cursor(cursor)
+        if not isinstance(data, dict) or data.get('o') != list(ordering):
+            raise InvalidCursor('Курсор получен для другой сортировки')
+        try:
+            *head, created, pattern_id = data['k']
+            created = (datetime.fromisoformat(created) - EPOCH) // MICROSECOND
+            return (*(float(value) for value in head), created, int(pattern_id))
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidCursor('Некорректный курсор') from e
+
+    def _encode_cursor(self, ordering, position):
+        key = self._key(ordering, position)
+        created = (EPOCH + key[-2] * MICROSECOND).isoformat()
+        return encode_cursor({'o': list(ordering), 'k': [*key[:-2], created, key[-1]]})
+
+    def _start(self, ordering, cursor):
+        """Индекс в порядке ordering, с которого начинается страница после курсора"""
+        if not cursor:
+            return 0
+        key = self._cursor_key(ordering, cursor)
+        order = self.orders[ordering]
+        # Порядок убывающий: ищем первую позицию с ключом меньше курсора
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(ordering, order[middle]) < key:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def _checks(self, difficulty=None, weight_codes=None, category=None,
+                free_only=False, with_photos=False, min_rating=None):
+        """Проверки позиции по фильтрам"""
+        checks = []
+        text = self.text
+        if difficulty:
+            difficulties = text['difficulty']
+            checks.append(lambda p: difficulties[p] == difficulty)
+        if weight_codes is not None:
+            codes = set(weight_codes)
+            weights = text['weight_code']
+            checks.append(lambda p: weights[p] in codes)
+        if category:
+            categories = text['category']
+            checks.append(lambda p: categories[p] == category)
+        if free_only:
+            is_free = self.is_free
+            checks.append(lambda p: is_free[p])
+        if with_photos:
+            photos = text['photo_url']
+            checks.append(lambda p: bool(photos[p]))
+        if min_rating is not None:
+            rating = self.rating
+            checks.append(lambda p: rating[p] >= min_rating)
+        return checks
+
+    def _matcher(self, **filters):
+        """Одна проверка по всем фильтрам (None, если фильтров нет)"""
+        checks = self._checks(**filters)
+        if not checks:
+            return None
+        if len(checks) == 1:
+            return checks[0]
+        return lambda p: all(check(p) for check in checks)
+
+    def select(self, ordering, **filters):
+        """Позиции схем, прошедших фильтры, в порядке ordering"""
+        positions = self.orders[ordering]
+        checks = self._checks(**filters)
+        if not checks:
+            return positions
+        # Фильтры по очереди: каждый следующий проверяет меньше позиций
+        for check in checks:
+            positions = filter(check, positions)
+        return array('l', positions)
+
+    def count(self, **filters):
+        return len(self.select(NEWEST_ORDERING, **filters))
+
+    def page(self, ordering, cursor=None, limit=12, **filters):
+        """
+        Страница после курсора: позиция находится двоичным поиском по
+        ключу сортировки, без COUNT и OFFSET.
+
+        Returns:
+            (список PatternRow, курсор следующей страницы или None)
+        """
+        order = self.orders[ordering]
+        matches = self._matcher(**filters)
+        found = []
+        for index in range(self._start(ordering, cursor), len(order)):
+            position = order[index]
+            if matches is None or matches(position):
+                found.append(position)
+                if len(found) > limit:
+                    break
+
+        next_cursor = None
+        if len(found) > limit:
+            found = found[:limit]
+            next_cursor = self._encode_cursor(ordering, found[-1])
+        return [self.row(position) for position in found], next_cursor
+
+    def rows(self, positions):
+        """Последовательность схем по позициям (для Paginator)"""
+        return SnapshotRows(self, positions)
+
+
+class SnapshotRows:
+    """Ленивая последовательность PatternRow: объекты создаются только для страницы"""
+
+    def __init__(self, snapshot, positions):
+        self.snapshot = snapshot
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def count(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.snapshot.row(position) for position in self.positions[index]]
+        return self.snapshot.row(self.positions[index])
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_snapshot():
+    """
+    Снимок для текущей версии каталога.
+
+    Новый снимок строится один раз и подменяет старый целиком; пока он
+    строится, остальные потоки продолжают читать предыдущий.
+    """
+    global _snapshot
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    if not _snapshot_lock.acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = CatalogSnapshot.build(version)
+        return _snapshot
+    finally:
+        _snapshot_lock.release()
+
+
+def request_catalog_snapshot(request):
+    """
+    Снимок каталога, один на HTTP-запрос.
+
+    ETag, Last-Modified и сам ответ строятся из одного снимка: версия
+    каталога читается из БД один раз, и ETag не расходится с телом,
+    если каталог сменился посреди запроса.
+    """
+    snapshot = getattr(request, '_catalog_snapshot', None)
+    if snapshot is None:
+        snapshot = request._catalog_snapshot = get_catalog_snapshot()
+    return snapshot
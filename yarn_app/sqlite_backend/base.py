@@ -0,0 +1,34 @@
+# sqlite_backend/base.py
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite для продакшена (settings.SQLITE_TUNED).
+
+    Дополнительные OPTIONS:
+        pragmas: {имя: значение} - выполняются для каждого нового соединения
+            (journal_mode=WAL, synchronous, mmap_size, cache_size, busy_timeout);
+        transaction_mode: 'IMMEDIATE' - транзакции сразу берут блокировку записи.
+            С обычным BEGIN транзакция, которая сначала читает, а потом пишет
+            (get_or_create), при конкурентной записи сразу получает
+            "database is locked" без ожидания busy_timeout.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,78 @@
+# stash.py
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from .models import UserYarn, Project, ProjectYarn
+from .signals import schedule_summary_rebuild
+
+
+class InsufficientYarn(Exception):
+    """Мотков в запасах меньше, чем запрошено для проекта"""
+
+    def __init__(self, yarn_ids):
+        self.yarn_ids = yarn_ids
+        super().__init__('Недостаточно пряжи в запасах')
+
+
+def parse_yarn_allocations(data, user_yarn_ids):
+    """
+    Разбирает поля yarn_<id> из POST.
+
+    Returns:
+        {id пряжи: количество мотков} только для пряжи пользователя
+        и положительных количеств
+    """
+    allocations = {}
+    for yarn_id in user_yarn_ids:
+        try:
+            amount = int(data.get(f'yarn_{yarn_id}') or 0)
+        except (TypeError, ValueError):
+            continue
+        if amount > 0:
+            allocations[yarn_id] = amount
+    return allocations
+
+
+def deduct_yarn(user, allocations):
+    """
+    Списывает мотки со всех позиций одним условным UPDATE.
+
+    Строка обновляется, только если мотков хватает (amount >= списания),
+    поэтому параллельные запросы не уйдут в минус: если обновлено меньше
+    строк, чем запрошено, вызывается InsufficientYarn и внешняя
+    транзакция откатывается.
+    """
+    if not allocations:
+        return
+    used = Case(
+        *[When(id=yarn_id, then=Value(amount)) for yarn_id, amount in allocations.items()],
+        output_field=IntegerField(),
+    )
+    updated = UserYarn.objects.filter(
+        user=user, id__in=list(allocations), amount__gte=used
+    ).update(amount=F('amount') - used)
+
+    if updated != len(allocations):
+        short = UserYarn.objects.filter(
+            user=user, id__in=list(allocations), amount__lt=used
+        ).values_list('id', flat=True)
+        raise InsufficientYarn(list(short))
+
+
+def create_project_with_yarn(user, allocations, **fields):
+    """
+    Создает проект, привязывает пряжу и списывает ее из запасов атомарно.
+
+    Raises:
+        InsufficientYarn: если какой-то пряжи не хватает (ничего не создается)
+    """
+    with transaction.atomic():
+        deduct_yarn(user, allocations)
+        project = Project.objects.create(user=user, **fields)
+        ProjectYarn.objects.bulk_create([
+            ProjectYarn(project=project, user_yarn_id=yarn_id, amount_used=amount)
+            for yarn_id, amount in allocations.items()
+        ])
+        # bulk_create и update() не отправляют сигналы
+        if allocations:
+            schedule_summary_rebuild(user.id)
+    return project
@@ -0,0 +1,669 @@
+import io
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import call_command
+from yarn_app import matching, serializers, snapshot
+from yarn_app.api_views import api_patterns
+from yarn_app.catalog import get_catalog_version
+from yarn_app.favorites import add_favorite, get_favorite_ids, get_favorites_version, remove_favorite
+from yarn_app.jobs import (
+    JOB_HANDLERS, claim_next_job, enqueue_dirty_recommendations, enqueue_refresh, requeue_stale_jobs, run_job,
+)
+from yarn_app.matching import MatchEngine
+from yarn_app.models import (
+    Favorite, Pattern, Project, ProjectYarn, RefreshJob, UserRecommendations, UserStashSummary, UserYarn,
+    normalize_yarn_weight, thumbnail_url,
+)
+from yarn_app.pattern_import import upsert_patterns
+from yarn_app.query_plans import ALLOWED_TEMP_SORTS, full_scans, hot_queries, query_plan, temp_sorts
+from yarn_app.recommendations import compute, refresh_stale
+from yarn_app.ravelry_api import RateLimiter
+from yarn_app.stash import InsufficientYarn, create_project_with_yarn
+from yarn_app.thumbnails import thumbnail_path
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def ravelry_pattern(pattern_id, **values):
+    """Схема в формате ответа Ravelry"""
+    return {
+        'id': pattern_id,
+        'name': f'Pattern {pattern_id}',
+        'designer': {'name': 'Designer'},
+        'difficulty_average': 2,
+        'yarn_weight': {'name': 'DK'},
+        'free': True,
+        'rating': {'average': 4.5},
+        'permalink': f'pattern-{pattern_id}',
+        **values,
+    }
+
+
+class CatalogTestCase(TestCase):
+    """
+    Снимок каталога, движок подбора и JSON-фрагменты живут в памяти процесса
+    и привязаны к версии каталога, а БД (и счетчики версий в ней) после
+    каждого теста откатывается: тест начинает с пустого кэша и без
+    построенных структур.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        snapshot._snapshot = None
+        matching._engine = None
+        serializers.fragment_cache = serializers.FragmentCache()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class YardageTests(CatalogTestCase):
+
+    def test_import_maps_yardage(self):
+        upsert_patterns([
+            ravelry_pattern(1, yardage=450, yardage_max=900),
+            ravelry_pattern(2, yardage=None, yardage_max=700),
+            ravelry_pattern(3),
+        ])
+        yardage = dict(Pattern.objects.values_list('ravelry_id', 'yardage'))
+        self.assertEqual(yardage, {'1': 450, '2': 700, '3': 0})
+
+        result = upsert_patterns([ravelry_pattern(3, yardage=1200)])
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(Pattern.objects.get(ravelry_id='3').yardage, 1200)
+
+    def test_yardage_changes_order(self):
+        # Схемы отличаются только метражом: 600 ярдов DK хватает только на первую
+        upsert_patterns([ravelry_pattern(1, yardage=500), ravelry_pattern(2, yardage=3000)])
+        ids = dict(Pattern.objects.values_list('ravelry_id', 'id'))
+        ranked = [pattern_id for _, pattern_id in MatchEngine.build().rank({'dk': 600})]
+        self.assertEqual(ranked, [ids['1'], ids['2']])
+
+        upsert_patterns([ravelry_pattern(1, yardage=3000), ravelry_pattern(2, yardage=500)])
+        ranked = [pattern_id for _, pattern_id in MatchEngine.build().rank({'dk': 600})]
+        self.assertEqual(ranked, [ids['2'], ids['1']])
+
+
+@override_settings(CACHES=LOCMEM_CACHE, JOB_STALE_AFTER=60, JOB_MAX_ATTEMPTS=2)
+class StaleJobTests(CatalogTestCase):
+
+    def claim_and_abandon(self):
+        """Воркер забрал задачу и умер: сигнал старше JOB_STALE_AFTER"""
+        job = claim_next_job()
+        RefreshJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=61))
+        return job
+
+    def test_running_job_of_dead_worker_is_requeued(self):
+        job, created = enqueue_refresh('ravelry', 6)
+        self.claim_and_abandon()
+
+        again, created = enqueue_refresh('ravelry', 6)
+        self.assertEqual((again.id, again.status, created), (job.id, 'queued', False))
+        claimed = claim_next_job()
+        self.assertEqual((claimed.id, claimed.attempts), (job.id, 2))
+
+    def test_fresh_running_job_is_not_requeued(self):
+        enqueue_refresh('ravelry', 6)
+        job = claim_next_job()
+        self.assertEqual(enqueue_refresh('ravelry', 6)[0].status, 'running')
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(RefreshJob.objects.get(id=job.id).attempts, 1)
+
+    def test_job_fails_after_max_attempts(self):
+        job, _ = enqueue_refresh('ravelry', 6)
+        self.claim_and_abandon()
+        requeue_stale_jobs()
+        self.claim_and_abandon()
+
+        new_job, created = enqueue_refresh('ravelry', 6)
+        self.assertTrue(created)
+        self.assertEqual(RefreshJob.objects.get(id=job.id).status, 'failed')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RecommendationsJobTests(CatalogTestCase):
+
+    def test_change_during_last_pass_runs_job_again(self):
+        def handler(job):
+            # Запасы изменились после последней проверки, до отметки "готово"
+            self.assertFalse(enqueue_refresh('recommendations', 0)[1])
+            return {'message': 'ok'}
+
+        job, _ = enqueue_refresh('recommendations', 0)
+        with mock.patch.dict(JOB_HANDLERS, recommendations=handler):
+            run_job(claim_next_job())
+
+        self.assertEqual(RefreshJob.objects.get(id=job.id).status, 'done')
+        rerun = RefreshJob.objects.get(kind='recommendations', status='queued')
+        self.assertNotEqual(rerun.id, job.id)
+
+    def make_users(self, count):
+        users = []
+        for _ in range(count):
+            user = User.objects.create_user(f'knitter{User.objects.count()}', password='pass')
+            UserYarn.objects.create(user=user, yarn_type='dk', color='red', amount=10, weight=50)
+            compute(user)
+            users.append(user)
+        refresh_stale()  # отпечатки каталога сверены
+        return users
+
+    def test_favorite_change_recomputes_only_that_user(self):
+        upsert_patterns([ravelry_pattern(i, yardage=300) for i in range(1, 6)])
+        for count in (2, 6):
+            users = self.make_users(count)
+            add_favorite(users[0], Pattern.objects.first())
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(refresh_stale(), 1)
+            if count == 2:
+                expected = len(queries)
+            # Число запросов не зависит от числа пользователей
+            self.assertEqual(len(queries), expected)
+            self.assertEqual(refresh_stale(), 0)
+            self.assertIsNone(UserRecommendations.objects.get(user=users[0]).dirty_at)
+
+    def test_favorite_change_does_not_enqueue_job(self):
+        user = self.make_users(1)[0]
+        upsert_patterns([ravelry_pattern(1, yardage=300)])
+        with self.captureOnCommitCallbacks(execute=True):
+            add_favorite(user, Pattern.objects.get())
+        self.assertFalse(RefreshJob.objects.exists())
+        # Воркер находит отметку и ставит задачу сам
+        job, created = enqueue_dirty_recommendations()
+        self.assertTrue(created)
+
+    def test_catalog_change_recomputes_users_of_changed_weight(self):
+        users = self.make_users(3)
+        upsert_patterns([ravelry_pattern(1, yardage=300)])
+        self.assertEqual(refresh_stale(), 3)
+        self.assertEqual(refresh_stale(), 0)
+        upsert_patterns([ravelry_pattern(2, yardage=300, yarn_weight={'name': 'Lace'})])
+        self.assertEqual(refresh_stale(), 0)
+        self.assertEqual(UserRecommendations.objects.get(user=users[0]).pattern_ids,
+                         list(Pattern.objects.filter(ravelry_id='1').values_list('id', flat=True)))
+
+    def test_no_rerun_without_new_changes(self):
+        enqueue_refresh('recommendations', 0)
+        with mock.patch.dict(JOB_HANDLERS, recommendations=lambda job: {'message': 'ok'}):
+            run_job(claim_next_job())
+        self.assertFalse(RefreshJob.objects.filter(status__in=RefreshJob.ACTIVE_STATUSES).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PatternDeleteTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('knitter', password='pass'))
+        upsert_patterns([ravelry_pattern(1), ravelry_pattern(2), ravelry_pattern(3)])
+
+    def load_more(self):
+        return self.client.get(reverse('load_more_patterns'), {'limit': 10}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_deleted_pattern_leaves_catalog(self):
+        before = self.load_more()
+        self.assertIn('Pattern 1', [pattern['name'] for pattern in before.json()['patterns']])
+        with self.captureOnCommitCallbacks(execute=True):
+            Pattern.objects.get(ravelry_id='1').delete()
+        after = self.load_more()
+
+        self.assertNotEqual(before['ETag'], after['ETag'])
+        self.assertNotIn('Pattern 1', [pattern['name'] for pattern in after.json()['patterns']])
+
+    def test_non_positive_limit(self):
+        for limit in (0, -3):
+            response = self.client.get(reverse('load_more_patterns'), {'limit': limit},
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['count'], 1)
+
+    def test_queryset_delete_bumps_version_once(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Pattern.objects.filter(ravelry_id__in=['1', '2']).delete()
+        self.assertEqual(get_catalog_version(), version + 1)
+        self.assertEqual([pattern['name'] for pattern in self.load_more().json()['patterns']], ['Pattern 3'])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MatchEngineRebuildTests(CatalogTestCase):
+
+    def test_rebuild_in_progress_serves_previous_engine(self):
+        upsert_patterns([ravelry_pattern(1)])
+        old = matching.get_match_engine()
+        upsert_patterns([ravelry_pattern(2)])
+
+        # Другой поток уже строит движок новой версии
+        with matching._engine_lock:
+            self.assertIs(matching.get_match_engine(), old)
+
+        engine = matching.get_match_engine()
+        self.assertEqual(engine.version, get_catalog_version())
+        self.assertEqual(len(engine), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FavoritesCacheTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('knitter', password='pass')
+        upsert_patterns([ravelry_pattern(1), ravelry_pattern(2), ravelry_pattern(3)])
+        self.patterns = {pattern.ravelry_id: pattern for pattern in Pattern.objects.all()}
+        for pattern in self.patterns.values():
+            add_favorite(self.user, pattern)
+
+    def test_cascade_delete_invalidates_cache(self):
+        self.assertEqual(len(get_favorite_ids(self.user)), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patterns['2'].delete()
+        self.assertEqual(get_favorite_ids(self.user), {self.patterns['1'].id, self.patterns['3'].id})
+
+    def test_queryset_delete_invalidates_cache(self):
+        self.assertEqual(len(get_favorite_ids(self.user)), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.filter(user=self.user, pattern__ravelry_id__in=['1', '3']).delete()
+        self.assertEqual(get_favorite_ids(self.user), {self.patterns['2'].id})
+
+    def test_toggle_updates_cached_set_without_reload(self):
+        expected = set(get_favorite_ids(self.user))
+        pattern = self.patterns['2']
+        with CaptureQueriesContext(connection) as queries:
+            ids = remove_favorite(self.user, pattern)
+            expected.discard(pattern.id)
+            self.assertEqual(ids, expected)
+            ids, created = add_favorite(self.user, pattern)
+            expected.add(pattern.id)
+            self.assertTrue(created)
+            self.assertEqual(ids, expected)
+            self.assertEqual(get_favorite_ids(self.user), expected)
+        reloads = [query['sql'] for query in queries if query['sql'].startswith('SELECT "yarn_app_favorite"."pattern_id"')]
+        self.assertEqual(reloads, [])
+
+    def test_write_through_needs_previous_version(self):
+        # Множество прежней версии вытеснено - новое берется из БД
+        cache.clear()
+        remove_favorite(self.user, self.patterns['1'])
+        self.assertEqual(get_favorite_ids(self.user), {self.patterns['2'].id, self.patterns['3'].id})
+
+    def test_versions_survive_cache_eviction(self):
+        catalog_version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.filter(user=self.user, pattern__ravelry_id='1').delete()
+        favorites_version = get_favorites_version(self.user.id)
+        # Три добавления в setUp и удаление
+        self.assertEqual(favorites_version, 4)
+        # Вытеснение записей кэша не должно откатывать версии (ETag)
+        cache.clear()
+        self.assertEqual(get_catalog_version(), catalog_version)
+        self.assertEqual(get_favorites_version(self.user.id), favorites_version)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StashSummaryConcurrencyTests(TransactionTestCase):
+
+    def test_older_rebuild_cannot_write_last(self):
+        """
+        Пересчет A посчитал сводку и задержался перед записью; тем временем
+        поток B меняет пряжу и пересчитывает. Итог должен быть по новым данным.
+        """
+        user = User.objects.create_user('knitter', password='pass')
+        yarn = UserYarn.objects.create(user=user, yarn_type='dk', color='red', amount=1, weight=50)
+        aggregated, resume = threading.Event(), threading.Event()
+        errors = []
+
+        def pause_after_aggregate(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('SELECT') and 'SUM(' in sql and not aggregated.is_set():
+                aggregated.set()
+                resume.wait(5)
+            return result
+
+        def run(target):
+            def wrapped():
+                try:
+                    target()
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    connection.close()
+            thread = threading.Thread(target=wrapped)
+            thread.start()
+            return thread
+
+        def rebuild_a():
+            with connection.execute_wrapper(pause_after_aggregate):
+                UserStashSummary.rebuild(user.id)
+
+        def change_and_rebuild_b():
+            UserYarn.objects.filter(id=yarn.id).update(amount=7)
+            UserStashSummary.rebuild(user.id)
+
+        thread_a = run(rebuild_a)
+        self.assertTrue(aggregated.wait(5))
+        thread_b = run(change_and_rebuild_b)
+        # B либо успевает целиком (без блокировки), либо ждет коммита A
+        thread_b.join(0.5)
+        resume.set()
+        thread_a.join()
+        thread_b.join()
+
+        self.assertEqual(errors, [])
+        summary = UserStashSummary.objects.get(user=user)
+        self.assertEqual(summary.total_motki, 7)
+        self.assertEqual(summary.by_type['dk']['skeins'], 7)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class DeductYarnConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    SKEINS_PER_PROJECT = 3
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def tearDown(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=DELETE')
+
+    def test_parallel_projects_never_overdraw(self):
+        user = User.objects.create_user('knitter', password='pass')
+        yarn = UserYarn.objects.create(user=user, yarn_type='dk', color='red', amount=10, weight=50)
+        affordable = yarn.amount // self.SKEINS_PER_PROJECT
+        start = threading.Barrier(self.THREADS)
+        created, short, errors = [], [], []
+
+        def create_project(number):
+            try:
+                start.wait(5)
+                project = create_project_with_yarn(
+                    user, {yarn.id: self.SKEINS_PER_PROJECT}, name=f'Project {number}'
+                )
+                created.append(project.id)
+            except InsufficientYarn:
+                short.append(number)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=create_project, args=(number,)) for number in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(created), affordable)
+        self.assertEqual(len(short), self.THREADS - affordable)
+        yarn.refresh_from_db()
+        self.assertEqual(yarn.amount, 10 - affordable * self.SKEINS_PER_PROJECT)
+        self.assertEqual(Project.objects.filter(user=user).count(), affordable)
+        self.assertEqual(ProjectYarn.objects.filter(user_yarn=yarn).count(), affordable)
+
+
+class FakeRavelry:
+    """Поиск Ravelry: page_count страниц по page_size схем"""
+
+    def __init__(self, page_count):
+        self.page_count = page_count
+        self.requested_pages = []
+        self.lock = threading.Lock()
+
+    def _make_request(self, endpoint, params=None):
+        page, size = params['page'], params['page_size']
+        with self.lock:
+            self.requested_pages.append(page)
+        first = (page - 1) * size + 1
+        return {
+            'patterns': [ravelry_pattern(pattern_id) for pattern_id in range(first, first + size)],
+            'paginator': {'page_count': self.page_count},
+        }
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CatalogImportJobTests(TransactionTestCase):
+    """Страницы сохраняет поток consumer AsyncRavelryAPI - нужны настоящие коммиты"""
+
+    def test_imports_requested_pages(self):
+        fake = FakeRavelry(page_count=10)
+        with mock.patch('yarn_app.ravelry_api.get_ravelry_client', return_value=fake):
+            job, _ = enqueue_refresh('catalog', 250)
+            run_job(claim_next_job())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done', job.message)
+        # 250 схем - 3 страницы по 100, а не все 10 страниц поиска
+        self.assertEqual(sorted(fake.requested_pages), [1, 2, 3])
+        self.assertEqual(job.result['inserted'], 300)
+        self.assertEqual(Pattern.objects.count(), 300)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ApiPatternsTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        upsert_patterns([
+            ravelry_pattern(1, yarn_weight={'name': 'DK'}),
+            ravelry_pattern(2, yarn_weight={'name': 'Worsted'}),
+            ravelry_pattern(3, yarn_weight={'name': 'Thread'}),
+        ])
+
+    def names(self, **params):
+        response = api_patterns(RequestFactory().get('/api/patterns/', params))
+        self.assertEqual(response.status_code, 200)
+        return sorted(pattern['name'] for pattern in json.loads(response.content)['patterns'])
+
+    def test_catalog_version_read_once_per_request(self):
+        self.names()  # снимок и фрагменты строятся при первом обращении
+        # ETag, Last-Modified и ответ - из одного снимка: один запрос версии
+        with self.assertNumQueries(1):
+            self.names()
+
+    def test_weight_filter(self):
+        self.assertEqual(self.names(yarn_weight='dk'), ['Pattern 1'])
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.names(per_page=0)), 1)
+        self.assertEqual(len(self.names(per_page=-3)), 1)
+        response = api_patterns(RequestFactory().get('/api/patterns/', {'per_page': 'many'}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_or_unknown_weight_is_not_filtered(self):
+        everything = ['Pattern 1', 'Pattern 2', 'Pattern 3']
+        self.assertEqual(self.names(), everything)
+        self.assertEqual(self.names(yarn_weight='other'), everything)
+        self.assertEqual(self.names(yarn_weight='mohair'), everything)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class EmptyCatalogTests(CatalogTestCase):
+
+    def test_empty_catalog_queues_import_instead_of_calling_ravelry(self):
+        with mock.patch('yarn_app.ravelry_api.get_ravelry_client') as get_client:
+            response = api_patterns(RequestFactory().get('/api/patterns/'))
+        get_client.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['patterns'], [])
+        self.assertTrue(RefreshJob.objects.filter(kind='ravelry', status='queued').exists())
+
+
+# Шаблоны ссылаются на статику, которой нет в манифесте до collectstatic
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+
+@override_settings(CACHES=LOCMEM_CACHE, STATICFILES_STORAGE=STATIC_STORAGE)
+class ProjectsWeightFilterTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('knitter', password='pass'))
+        upsert_patterns([
+            ravelry_pattern(1),
+            ravelry_pattern(2, yarn_weight={'name': 'DK / Sport'}),
+            ravelry_pattern(3, yarn_weight={'name': 'Thread'}),
+        ])
+
+    def names(self, **params):
+        response = self.client.get(reverse('projects'), params)
+        return response, sorted(pattern.name for pattern in response.context['patterns'])
+
+    def test_dropdown_offers_weight_codes(self):
+        response, _ = self.names()
+        self.assertEqual(response.context['yarn_weights'], [('dk', 'DK')])
+
+    def test_filter_by_code(self):
+        response, names = self.names(yarn_weight='dk')
+        self.assertEqual(names, ['Pattern 1', 'Pattern 2'])
+        self.assertEqual(response.context['yarn_weight_label'], 'DK')
+
+    def test_unknown_weight_is_not_a_filter(self):
+        # Раньше "Thread" превращался в 'other' и отдавал все прочие толщины
+        response, names = self.names(yarn_weight='Thread')
+        self.assertEqual(names, ['Pattern 1', 'Pattern 2', 'Pattern 3'])
+        self.assertEqual(response.context['yarn_weight_filter'], '')
+
+
+@override_settings(CACHES=LOCMEM_CACHE, STATICFILES_STORAGE=STATIC_STORAGE)
+class QueryCountTests(CatalogTestCase):
+    """Число SQL-запросов страниц не растет с числом строк (нет N+1)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser('admin', password='pass')
+        self.client.force_login(self.user)
+        upsert_patterns([ravelry_pattern(i, yardage=300 * i) for i in range(1, 61)])
+        self.patterns = list(Pattern.objects.all())
+        self.rows = 0
+
+    def add_rows(self, count):
+        """Пряжа, проекты со схемой и пряжей, избранное, задачи"""
+        for _ in range(count):
+            self.rows += 1
+            yarn = UserYarn.objects.create(
+                user=self.user, yarn_type='dk', color=f'c{self.rows}', amount=10, weight=50
+            )
+            pattern = self.patterns[self.rows]
+            project = Project.objects.create(user=self.user, name=f'Project {self.rows}', pattern=pattern)
+            ProjectYarn.objects.create(project=project, user_yarn=yarn, amount_used=1)
+            Favorite.objects.create(user=self.user, pattern=pattern)
+            RefreshJob.objects.create(kind='simple', status='done', requested_by=self.user)
+
+    def assertQueriesIndependentOfRows(self, fetch, expected):
+        for count in (1, 5):
+            self.add_rows(count)
+            fetch()  # сводки и кэши, которые строятся при первом обращении
+            with self.assertNumQueries(expected):
+                fetch()
+
+    def test_projects(self):
+        def fetch():
+            response = self.client.get(reverse('projects'))
+            self.assertEqual(response.status_code, 200)
+            # Шаблон пока не выводит проекты - обходим их, как это сделал бы он
+            for project in response.context['projects']:
+                self.assertTrue(project.pattern.name)
+                for project_yarn in project.project_yarns.all():
+                    self.assertTrue(project_yarn.user_yarn.color)
+
+        # Сессия, пользователь, версии каталога и избранного, проекты со
+        # схемами, пряжа проектов и ее моток
+        self.assertQueriesIndependentOfRows(fetch, 7)
+
+    def test_pattern_search(self):
+        # Шаблона pattern_search.html в проекте нет - проверяем запросы view
+        def render(request, template_name, context):
+            list(context['patterns'])
+            list(context['user_yarns'])
+            return HttpResponse()
+
+        def fetch():
+            with mock.patch('yarn_app.views.render', render):
+                self.assertEqual(self.client.get(reverse('pattern_search')).status_code, 200)
+
+        self.assertQueriesIndependentOfRows(fetch, 9)
+
+    def test_admin_changelists(self):
+        # Сессия, пользователь, варианты фильтра, два COUNT, строки страницы
+        # (у RefreshJob фильтров по связям и значениям нет)
+        expected = {'useryarn': 6, 'pattern': 6, 'project': 6, 'projectyarn': 6, 'favorite': 6, 'refreshjob': 5}
+        for model, queries in expected.items():
+            url = reverse(f'admin:yarn_app_{model}_changelist')
+            with self.subTest(model=model):
+                self.assertQueriesIndependentOfRows(
+                    lambda: self.assertEqual(self.client.get(url).status_code, 200), queries
+                )
+
+
+class ThumbnailUrlTests(TestCase):
+
+    def test_url_mirrors_file_layout(self):
+        # Веб-сервер отдает THUMBNAIL_URL прямо из THUMBNAIL_ROOT
+        photo_hash = 'ab' * 32
+        for size in settings.THUMBNAIL_SIZES:
+            relative = thumbnail_path(photo_hash, size).relative_to(settings.THUMBNAIL_ROOT)
+            self.assertEqual(thumbnail_url(photo_hash, size), settings.THUMBNAIL_URL + relative.as_posix())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RateLimiterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rate_limited_pause_is_shared(self):
+        # Лимитеры двух процессов: токены у каждого свои, пауза после 429 - общая
+        worker, web = RateLimiter(rate=5, capacity=1), RateLimiter(rate=5, capacity=1)
+        self.assertEqual(web.acquire(), 0)
+        self.assertGreater(web.acquire(), 0)
+        self.assertEqual(worker.acquire(), 0)
+
+        worker.record_rate_limited(retry_after=30)
+        self.assertGreater(web.acquire(), 25)
+        self.assertGreater(web.status()['blocked_for'], 25)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class WeightCodeTests(CatalogTestCase):
+
+    def test_compound_weight_uses_first_code(self):
+        self.assertEqual(normalize_yarn_weight('DK / Sport'), 'dk')
+        self.assertEqual(normalize_yarn_weight('Aran / Worsted (8 wpi)'), 'aran')
+        self.assertEqual(normalize_yarn_weight('Light Fingering'), 'light fingering')
+        self.assertEqual(normalize_yarn_weight('Thread'), 'other')
+        self.assertEqual(normalize_yarn_weight(''), '')
+
+    def test_backfill_bumps_catalog_version(self):
+        upsert_patterns([ravelry_pattern(1, yarn_weight={'name': 'DK / Sport'})])
+        Pattern.objects.update(weight_code='other')
+        version = get_catalog_version()
+        call_command('backfill_weight_codes', stdout=io.StringIO())
+        self.assertEqual(Pattern.objects.get().weight_code, 'dk')
+        self.assertEqual(get_catalog_version(), version + 1)
+        self.assertTrue(RefreshJob.objects.filter(kind='recommendations', status='queued').exists())
+
+
+class QueryPlanTests(TestCase):
+    """Горячие запросы из view не сканируют таблицы целиком"""
+
+    def test_hot_queries_use_indexes(self):
+        with connection.cursor() as cursor:
+            for name, queryset in hot_queries().items():
+                with self.subTest(name):
+                    plan = query_plan(cursor, queryset)
+                    self.assertEqual(full_scans(plan), [])
+                    if name not in ALLOWED_TEMP_SORTS:
+                        self.assertEqual(temp_sorts(plan), [])
@@ -0,0 +1,175 @@
+# thumbnails.py
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image, ImageOps
+from .catalog import bump_catalog_version
+from .log import fields, sampled
+from .models import Pattern
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_TIMEOUT = 15
+HASH_LENGTH = 64
+
+_local = threading.local()
+
+
+def thumbnail_path(photo_hash, size):
+    """Файл миниатюры: каталоги по первым символам хэша, чтобы не было тысяч файлов в одном"""
+    return Path(settings.THUMBNAIL_ROOT) / photo_hash[:2] / f'{photo_hash}-{size}.webp'
+
+
+def _failed_key(url):
+    return 'thumbnails:failed:' + hashlib.sha1(url.encode()).hexdigest()
+
+
+def _session():
+    # requests.Session не потокобезопасна: своя у каждого потока пула
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers['User-Agent'] = 'KnitMatch/1.0 (thumbnails)'
+        _local.session = session
+    return session
+
+
+def download(url):
+    """Скачивает фото не больше THUMBNAIL_MAX_BYTES. Возвращает bytes"""
+    if not url.startswith(('http://', 'https://')):
+        raise ValueError('Неподдерживаемый адрес фото')
+    limit = settings.THUMBNAIL_MAX_BYTES
+    with _session().get(url, timeout=DOWNLOAD_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > limit:
+            raise ValueError('Фото слишком большое')
+        data = io.BytesIO()
+        for chunk in response.iter_content(64 * 1024):
+            data.write(chunk)
+            if data.tell() > limit:
+                raise ValueError('Фото слишком большое')
+    return data.getvalue()
+
+
+def _save_webp(image, path):
+    """Запись во временный файл и переименование: читатели не видят недописанный файл"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            image.save(tmp, 'WEBP', quality=settings.THUMBNAIL_QUALITY, method=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def make_thumbnails(data):
+    """
+    Миниатюры WebP всех размеров THUMBNAIL_SIZES из исходного фото.
+
+    Имя - sha256 содержимого: одинаковое фото у разных схем хранится один
+    раз, а готовые миниатюры повторно не пересчитываются.
+
+    Returns:
+        (хэш, байт записано)
+    """
+    photo_hash = hashlib.sha256(data).hexdigest()
+    missing = {
+        size: thumbnail_path(photo_hash, size)
+        for size in settings.THUMBNAIL_SIZES
+        if not thumbnail_path(photo_hash, size).exists()
+    }
+    if not missing:
+        return photo_hash, 0
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+        written = 0
+        # От большего размера к меньшему: каждый следующий уменьшается из предыдущего
+        for size, path in sorted(missing.items(), key=lambda item: -settings.THUMBNAIL_SIZES[item[0]]):
+            side = settings.THUMBNAIL_SIZES[size]
+            image = image.copy()
+            image.thumbnail((side, side), Image.LANCZOS)
+            _save_webp(image, path)
+            written += path.stat().st_size
+    return photo_hash, written
+
+
+def _process_url(url):
+    started = time.perf_counter()
+    data = download(url)
+    downloaded = time.perf_counter()
+    photo_hash, written = make_thumbnails(data)
+    logger.debug("Миниатюры фото готовы", extra=sampled(
+        'thumbnails.photo', url=url, bytes_in=len(data), bytes_out=written,
+        download_ms=round((downloaded - started) * 1000, 1),
+        resize_ms=round((time.perf_counter() - downloaded) * 1000, 1),
+    ))
+    return photo_hash, len(data), written
+
+
+def generate_thumbnails(patterns=None, limit=None, workers=None, retry_failed=False):
+    """
+    Делает миниатюры для схем без них (photo_hash пуст, photo_url задан).
+
+    Каждый адрес скачивается один раз, даже если фото у нескольких схем.
+    Загрузка и уменьшение идут в пуле из workers потоков (THUMBNAIL_WORKERS),
+    запись в БД - в вызывающем потоке. Неудачные адреса повторяются не
+    раньше чем через THUMBNAIL_RETRY_AFTER (retry_failed=True - сразу).
+
+    Args:
+        patterns: QuerySet схем (по умолчанию все)
+
+    Returns:
+        dict: processed, failed, skipped, bytes_in, bytes_out, duration_ms
+    """
+    started = time.perf_counter()
+    queryset = (patterns if patterns is not None else Pattern.objects.all()).filter(photo_hash='').exclude(photo_url='')
+    urls = list(queryset.order_by().values_list('photo_url', flat=True).distinct())
+    skipped = 0
+    if not retry_failed and urls:
+        failed_before = cache.get_many([_failed_key(url) for url in urls])
+        pending = [url for url in urls if _failed_key(url) not in failed_before]
+        skipped = len(urls) - len(pending)
+        urls = pending
+    if limit:
+        urls = urls[:limit]
+
+    stats = {'processed': 0, 'failed': 0, 'skipped': skipped, 'bytes_in': 0, 'bytes_out': 0}
+    weight_codes = set()
+    with ThreadPoolExecutor(max_workers=workers or settings.THUMBNAIL_WORKERS) as pool:
+        futures = {pool.submit(_process_url, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                photo_hash, bytes_in, bytes_out = future.result()
+            except (requests.RequestException, OSError, ValueError, Image.DecompressionBombError) as e:
+                stats['failed'] += 1
+                cache.set(_failed_key(url), 1, settings.THUMBNAIL_RETRY_AFTER)
+                logger.warning("Не удалось сделать миниатюры фото", extra=fields(url=url, error=str(e)))
+                continue
+            updated = queryset.filter(photo_url=url)
+            weight_codes.update(updated.values_list('weight_code', flat=True))
+            updated.update(photo_hash=photo_hash)
+            stats['processed'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+
+    if stats['processed']:
+        # Адреса фото в снимке каталога и JSON-фрагментах изменились
+        bump_catalog_version(weight_codes)
+    stats['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Миниатюры фото схем", extra=fields(**stats))
+    return stats
@@ -1,4 +1,5 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
 from django.contrib.auth import views as auth_views
 from . import views
 
@@ -36,5 +37,18 @@ urlpatterns = [
     path('patterns/refresh/', views.refresh_patterns, name='refresh_patterns'),
     path('patterns/refresh/simple/', views.refresh_patterns_simple, name='refresh_simple'),
     path('patterns/refresh/force/', views.refresh_patterns_force, name='refresh_force'),
+    path('patterns/refresh/status/<int:job_id>/', views.refresh_status, name='refresh_status'),
     path('toggle-favorite/<int:pattern_id>/', views.toggle_favorite, name='toggle_favorite'),
-]
\ No newline at end of file
+    
+    # Метрики производительности
+    path('metrics/', views.metrics_view, name='metrics'),
+]
+
+# Миниатюры в продакшене отдает веб-сервер из THUMBNAIL_ROOT (см. settings.py)
+if settings.DEBUG:
+    urlpatterns += [
+        re_path(
+            r'^thumbs/(?P<prefix>[0-9a-f]{2})/(?P<photo_hash>[0-9a-f]{64})-(?P<size>[a-z]+)\.webp$',
+            views.pattern_thumbnail, name='pattern_thumbnail',
+        ),
+    ]